@@ -1 +1,16 @@
-import better_auto_moderator.app
+from os import environ
+
+# With BAM_WORKERS set, this process just runs that many workers, which split the subreddits between them.
+# With BAM_EVALUATORS set, it runs a fetcher and that many evaluators, which split the items between them
+if int(environ.get('BAM_WORKERS', 1)) > 1:
+    from better_auto_moderator.log import setup_logging
+    from better_auto_moderator.sharding import run_workers
+    setup_logging(environ.get('BAM_LOG_LEVEL', 'INFO'), environ.get('BAM_LOG_FORMAT', 'json'))
+    run_workers(int(environ['BAM_WORKERS']), __file__)
+elif int(environ.get('BAM_EVALUATORS', 1)) > 1:
+    from better_auto_moderator.log import setup_logging
+    from better_auto_moderator.workqueue import run_pipeline
+    setup_logging(environ.get('BAM_LOG_LEVEL', 'INFO'), environ.get('BAM_LOG_FORMAT', 'json'))
+    run_pipeline(int(environ['BAM_EVALUATORS']), __file__)
+else:
+    import better_auto_moderator.app
@@ -0,0 +1,198 @@
+import sys
+import json
+import random
+import argparse
+import platform
+import subprocess
+import tracemalloc
+from time import perf_counter
+from better_auto_moderator.rule import Rule
+from better_auto_moderator.replay import ReplayClient, percentile
+from better_auto_moderator.snapshot import snapshot
+from better_auto_moderator.moderators.post_moderator import PostModerator
+
+# Benchmarks for the rule engine, over synthetic items and synthetic rule sets. Every rule is built
+# to miss, so each item is checked against the whole rule set (the worst, and most common, case).
+#
+#     python -m benchmarks.bench_rules --output results.json
+#     python -m benchmarks.bench_rules --compare results.json
+
+words = ['lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', 'adipiscing', 'elit', 'sed', 'do',
+    'eiusmod', 'tempor', 'incididunt', 'ut', 'labore', 'et', 'dolore', 'magna', 'aliqua']
+
+def synthetic_text(length, rng):
+    text = []
+    size = 0
+    while size < length:
+        word = rng.choice(words)
+        text.append(word)
+        size += len(word) + 1
+    return ' '.join(text)[:length]
+
+def synthetic_items(count, body_length, seed=0):
+    rng = random.Random(seed)
+    items = []
+    for i in range(count):
+        items.append({
+            'kind': 'submission',
+            'id': 'b%05d' % i,
+            'name': 't3_b%05d' % i,
+            'title': synthetic_text(80, rng),
+            'selftext': synthetic_text(body_length, rng),
+            'url': 'https://example%d.com/%d' % (i % 50, i),
+            'domain': 'example%d.com' % (i % 50),
+            'permalink': '/r/BAMBench/comments/b%05d/' % i,
+            'media': None,
+            'user_reports': [],
+            'mod_reports': [],
+            'approved': False,
+            'removed': False,
+            'edited': False,
+            'author': {'name': 'user%d' % i, 'id': 'u%d' % i, 'comment_karma': rng.randint(0, 5000),
+                'link_karma': rng.randint(0, 5000), 'created_utc': 1500000000 + rng.randint(0, 10 ** 8), 'is_gold': False},
+            'subreddit': {'name': 'BAMBench', 'users': {}}
+        })
+    return items
+
+# A rule for each comparator, built so that it never matches
+def comparator_rule(comparator, index, keywords):
+    misses = ['zz%dmiss%d' % (index, k) for k in range(keywords)]
+    if comparator == 'full_exact':
+        check = {'title (full-exact)': misses}
+    elif comparator == 'includes':
+        check = {'body (includes)': misses}
+    elif comparator == 'includes_word':
+        check = {'body': misses}
+    elif comparator == 'regex':
+        check = {'body (includes, regex)': ['zz%d[0-9]+miss%d' % (index, k) for k in range(keywords)]}
+    elif comparator == 'domain':
+        check = {'domain': ['zz%dmiss%d.com' % (index, k) for k in range(keywords)]}
+    elif comparator == 'numeric':
+        check = {'author': {'comment_karma': '> %d' % (10 ** 6 + index)}}
+    elif comparator == 'time':
+        check = {'author': {'account_age': '< %d minutes' % (index + 1)}}
+
+    check.update({'type': 'submission', 'action': 'remove', 'moderators_exempt': False})
+    return Rule(check)
+
+def run_scenario(name, rules, items, allocations=True):
+    client = ReplayClient(items)
+    latencies = []
+    snapshots = [snapshot(data, client) for data in items]
+    started_at = perf_counter()
+    for item in snapshots:
+        item_started_at = perf_counter()
+        PostModerator(item).moderate_all(rules)
+        latencies.append(perf_counter() - item_started_at)
+    elapsed = perf_counter() - started_at
+
+    # Measure memory in a second pass, since tracing slows everything down. Per item: the most memory
+    # in use at once while its rules ran, and how many blocks of memory they left allocated (from a
+    # block-count diff of tracemalloc snapshots, leaving out tracemalloc's own)
+    peaks = []
+    blocks = []
+    if allocations:
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        tracemalloc.start()
+        for item in snapshots:
+            before = tracemalloc.take_snapshot().filter_traces(ignore)
+            tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+            PostModerator(item).moderate_all(rules)
+            peaks.append(tracemalloc.get_traced_memory()[1] - current)
+            after = tracemalloc.take_snapshot().filter_traces(ignore)
+            blocks.append(sum(stat.count_diff for stat in after.compare_to(before, 'filename')))
+        tracemalloc.stop()
+
+    return {
+        'scenario': name,
+        'items': len(items),
+        'rules': len(rules),
+        'items_per_second': len(items) / elapsed if elapsed > 0 else 0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'peak_bytes_per_item': sum(peaks) / len(peaks) if peaks else None,
+        'blocks_kept_per_item': sum(blocks) / len(blocks) if blocks else None
+    }
+
+def scenarios(item_count, quick=False):
+    rule_counts = [10, 100] if quick else [10, 100, 1000]
+    items = synthetic_items(item_count, 500)
+
+    # How each comparator scales with the number of rules
+    for comparator in ['full_exact', 'includes', 'includes_word', 'regex', 'domain', 'numeric', 'time']:
+        for count in rule_counts:
+            rules = [comparator_rule(comparator, i, 1) for i in range(count)]
+            yield ("%s/rules=%d" % (comparator, count), rules, items)
+
+    # Keyword list size, for a fixed number of rules
+    for keywords in [1, 10, 100]:
+        rules = [comparator_rule('includes_word', i, keywords) for i in range(10)]
+        yield ("includes_word/keywords=%d" % keywords, rules, items)
+
+    # Body length
+    for length in [100, 10000] if quick else [100, 10000, 40000]:
+        long_items = synthetic_items(max(1, item_count // 10), length)
+        for comparator in ['includes_word', 'regex']:
+            rules = [comparator_rule(comparator, i, 1) for i in range(10)]
+            yield ("%s/body=%d" % (comparator, length), rules, long_items)
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# Compare against an earlier run; anything whose throughput dropped by more than `tolerance` is a regression
+def compare(results, baseline, tolerance):
+    before = dict([(result['scenario'], result) for result in baseline['results']])
+    regressions = []
+    for result in results['results']:
+        if result['scenario'] not in before or before[result['scenario']]['items_per_second'] == 0:
+            continue
+
+        ratio = result['items_per_second'] / before[result['scenario']]['items_per_second']
+        result['vs_baseline'] = ratio
+        if ratio < 1 - tolerance:
+            regressions.append(result['scenario'])
+
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark BAM's rule engine")
+    parser.add_argument('--items', type=int, default=200)
+    parser.add_argument('--quick', action='store_true', help="Skip the largest rule sets and bodies")
+    parser.add_argument('--no-allocations', action='store_true', help="Skip measuring allocations")
+    parser.add_argument('--output', help="Write results to this file, as well as stdout")
+    parser.add_argument('--compare', help="Results from an earlier run to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'results': []
+    }
+    for name, rules, items in scenarios(args.items, quick=args.quick):
+        result = run_scenario(name, rules, items, allocations=not args.no_allocations)
+        results['results'].append(result)
+        print("%-32s %10.1f items/sec  p50 %8.3fms  p99 %8.3fms" % (name, result['items_per_second'], result['p50_ms'], result['p99_ms']), file=sys.stderr)
+
+    regressions = []
+    if args.compare:
+        with open(args.compare) as baseline:
+            regressions = compare(results, json.load(baseline), args.tolerance)
+        results['regressions'] = regressions
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as out:
+            out.write(output)
+    print(output)
+
+    if len(regressions) > 0:
+        print("Regressions: %s" % ', '.join(regressions), file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,450 @@
+import re
+import json
+import random
+import argparse
+import threading
+from time import time, sleep
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# A local stand-in for the parts of reddit's API that BAM uses, for load testing the whole process
+# (streams, wiki config, enrichment and actions) without touching reddit. It generates submissions,
+# comments, edits and reports at a configurable rate, and can add latency and rate-limit headers.
+#
+# Point BAM at it with BAM_REDDIT_URL, then run it as usual:
+#
+#     python -m benchmarks.fake_reddit --rate 50 --rules rules.yaml
+#     BAM_REDDIT_URL=http://localhost:8080 python app.py
+#
+# GET /_stats reports items generated, requests by endpoint, actions and ingest-to-action lag.
+
+default_rules = """
+type: submission
+title (includes): spam
+action: remove
+---
+type: comment
+body (includes): spam
+action: remove
+---
+"""
+
+class FakeReddit:
+    def __init__(self, subreddit='BAMTest', rate=10.0, submission_ratio=0.2, spam_ratio=0.1, report_ratio=0.05,
+            edit_ratio=0.02, latency=0.0, jitter=0.0, ratelimit=600, ratelimit_window=600, rules=default_rules, config="", seed=0):
+        self.subreddit = subreddit
+        self.rate = rate
+        self.submission_ratio = submission_ratio
+        self.spam_ratio = spam_ratio
+        self.report_ratio = report_ratio
+        self.edit_ratio = edit_ratio
+        self.latency = latency
+        self.jitter = jitter
+        self.ratelimit = ratelimit
+        self.ratelimit_window = ratelimit_window
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+        self.items = [] # Oldest first
+        self.by_fullname = {}
+        self.modqueue = []
+        self.edited = []
+        self.users = {}
+        self.wiki = {
+            'better_auto_moderator': {'content_md': config, 'revision_date': time()},
+            'better_auto_moderator/rules': {'content_md': rules, 'revision_date': time()},
+            'config/automoderator': {'content_md': '', 'revision_date': time()}
+        }
+        self.next_id = 0
+        self.requests = {}
+        self.actions = {}
+        self.lags = []
+        self.window_started_at = time()
+        self.window_used = 0
+        self.started_at = time()
+
+    # Generating content
+
+    def user(self, name):
+        if name not in self.users:
+            self.users[name] = {
+                'name': name,
+                'id': 'u%d' % len(self.users),
+                'comment_karma': self.rng.randint(0, 5000),
+                'link_karma': self.rng.randint(0, 5000),
+                'created_utc': time() - self.rng.randint(0, 10 ** 8),
+                'is_gold': False,
+                'is_banned': self.rng.random() < 0.01,
+                'flair_text': None,
+                'flair_css_class': None
+            }
+        return self.users[name]
+
+    def new_id(self):
+        self.next_id += 1
+        return "f%x" % self.next_id
+
+    def generate(self):
+        with self.lock:
+            author = self.user("user%d" % self.rng.randint(0, 999))
+            spam = self.rng.random() < self.spam_ratio
+            text = "buy cheap spam now" if spam else "just a regular thing to say"
+            id = self.new_id()
+            submissions = [item for item in self.items[-200:] if item['kind'] == 't3']
+            common = {
+                'id': id,
+                'author': author['name'],
+                'author_fullname': 't2_%s' % author['id'],
+                'author_premium': author['is_gold'],
+                'author_flair_text': author['flair_text'],
+                'author_flair_css_class': author['flair_css_class'],
+                'author_flair_template_id': None,
+                'subreddit': self.subreddit,
+                'subreddit_id': 't5_fake',
+                'subreddit_name_prefixed': 'r/%s' % self.subreddit,
+                'created_utc': time(),
+                'edited': False,
+                'approved': False,
+                'removed': False,
+                'user_reports': [],
+                'mod_reports': [],
+                'num_reports': 0,
+                'stickied': False,
+                'locked': False,
+                'distinguished': None
+            }
+
+            if len(submissions) == 0 or self.rng.random() < self.submission_ratio:
+                item = dict(common)
+                item.update({
+                    'kind': 't3',
+                    'name': 't3_%s' % id,
+                    'title': "A %s post" % text,
+                    'selftext': "Here is a %s" % text,
+                    'is_self': True,
+                    'url': 'https://www.reddit.com/r/%s/comments/%s/' % (self.subreddit, id),
+                    'domain': 'self.%s' % self.subreddit,
+                    'permalink': '/r/%s/comments/%s/' % (self.subreddit, id),
+                    'media': None,
+                    'link_flair_text': None,
+                    'link_flair_css_class': None,
+                    'over_18': False,
+                    'spoiler': False,
+                    'is_original_content': False
+                })
+            else:
+                submission = self.rng.choice(submissions)
+                item = dict(common)
+                item.update({
+                    'kind': 't1',
+                    'name': 't1_%s' % id,
+                    'body': "This is %s" % text,
+                    'link_id': submission['name'],
+                    'parent_id': submission['name'],
+                    'link_author': submission['author'],
+                    'is_submitter': submission['author'] == author['name'],
+                    'permalink': '/r/%s/comments/%s/_/%s/' % (self.subreddit, submission['id'], id),
+                    'depth': 0
+                })
+
+            self.items.append(item)
+            self.by_fullname[item['name']] = item
+
+            if self.rng.random() < self.report_ratio:
+                item['user_reports'] = [["This is spam", 1]]
+                item['num_reports'] = 1
+                self.modqueue.append(item)
+
+            if len(self.items) > 1 and self.rng.random() < self.edit_ratio:
+                target = self.rng.choice(self.items[-100:])
+                target['edited'] = time()
+                self.edited.append(target)
+
+    def run_generator(self):
+        while True:
+            self.generate()
+            sleep(1.0 / self.rate)
+
+    # Serving requests
+
+    def thing(self, item):
+        data = dict(item)
+        kind = data.pop('kind')
+        return {'kind': kind, 'data': data}
+
+    def listing(self, items, params):
+        # `items` is oldest first, listings are newest first
+        limit = min(int(params.get('limit', 25)), 100)
+        before = params.get('before')
+        after = params.get('after')
+        fullnames = [item['name'] for item in items]
+
+        if before and before in fullnames:
+            newer = items[fullnames.index(before) + 1 :]
+            page = list(reversed(newer[:limit]))
+        else:
+            older = items
+            if after and after in fullnames:
+                older = items[: fullnames.index(after)]
+            page = list(reversed(older[-limit:])) if limit > 0 else []
+
+        return {'kind': 'Listing', 'data': {
+            'after': page[-1]['name'] if len(page) == limit and len(page) > 0 else None,
+            'before': None,
+            'dist': len(page),
+            'children': [self.thing(item) for item in page]
+        }}
+
+    def user_list(self, name, test):
+        children = []
+        if name in self.users and test(self.users[name]):
+            children.append({'name': name, 'id': 't2_%s' % self.users[name]['id'], 'date': time(), 'rel_id': 'rb_1'})
+        return {'kind': 'Listing', 'data': {'after': None, 'before': None, 'children': children}}
+
+    def count(self, table, key):
+        table[key] = table.get(key, 0) + 1
+
+    # Returns (status, headers) for the rate limit, and whether the request is allowed
+    def use_ratelimit(self):
+        with self.lock:
+            now = time()
+            if now - self.window_started_at > self.ratelimit_window:
+                self.window_started_at = now
+                self.window_used = 0
+            self.window_used += 1
+            remaining = self.ratelimit - self.window_used
+            headers = {
+                'x-ratelimit-used': str(self.window_used),
+                'x-ratelimit-remaining': str(max(0, remaining)),
+                'x-ratelimit-reset': str(int(self.ratelimit_window - (now - self.window_started_at)))
+            }
+        return headers, remaining >= 0
+
+    def action(self, name, fullname):
+        with self.lock:
+            self.count(self.actions, name)
+            item = self.by_fullname.get(fullname)
+            if item is not None:
+                self.lags.append(time() - item['created_utc'])
+                if name == 'remove':
+                    item['removed'] = True
+                elif name == 'approve':
+                    item['approved'] = True
+                    item['removed'] = False
+                if name in ['remove', 'approve'] and item in self.modqueue:
+                    self.modqueue.remove(item)
+
+    def stats(self):
+        with self.lock:
+            elapsed = time() - self.started_at
+            lags = sorted(self.lags)
+            return {
+                'seconds': elapsed,
+                'items': len(self.items),
+                'items_per_second': len(self.items) / elapsed if elapsed > 0 else 0,
+                'modqueue': len(self.modqueue),
+                'requests': dict(self.requests),
+                'actions': dict(self.actions),
+                'lag_p50': lags[len(lags) // 2] if lags else None,
+                'lag_p99': lags[min(len(lags) - 1, int(len(lags) * 0.99))] if lags else None
+            }
+
+    def route(self, method, path, params):
+        sub = self.subreddit.lower()
+        path = path.rstrip('/')
+        path = re.sub(r'\.json$', '', path)
+        lowered = path.lower()
+
+        if path == '/_stats':
+            return 'stats', self.stats()
+        if path == '/api/v1/access_token':
+            return 'access_token', {'access_token': 'fake', 'token_type': 'bearer', 'expires_in': 3600, 'scope': '*'}
+        if path == '/api/v1/me':
+            return 'me', {'name': 'bam_bot', 'id': 'bot', 'created_utc': 0}
+
+        match = re.match(r'^/r/([^/]+)(/.*)?$', path)
+        if match:
+            rest = match.group(2) or ''
+            with self.lock:
+                if rest == '/new':
+                    return 'new', self.listing([item for item in self.items if item['kind'] == 't3'], params)
+                if rest == '/comments':
+                    return 'comments', self.listing([item for item in self.items if item['kind'] == 't1'], params)
+                if rest == '/about/modqueue':
+                    return 'modqueue', self.listing(list(self.modqueue), params)
+                if rest == '/about/edited':
+                    only = {'comments': 't1', 'links': 't3'}.get(params.get('only'))
+                    edited = sorted(set([item['name'] for item in self.edited]), key=lambda name: self.by_fullname[name]['edited'])
+                    items = [self.by_fullname[name] for name in edited if only is None or self.by_fullname[name]['kind'] == only]
+                    return 'edited', self.listing(items, params)
+                if rest == '/about':
+                    return 'about', {'kind': 't5', 'data': {'display_name': self.subreddit, 'name': 't5_fake', 'id': 'fake', 'over18': False}}
+                if rest == '/wiki/pages':
+                    return 'wiki_pages', {'kind': 'wikipagelisting', 'data': list(self.wiki.keys())}
+                if rest.startswith('/wiki/settings'):
+                    return 'wiki_settings', {'kind': 'wikipagesettings', 'data': {'permlevel': 2, 'editors': [], 'listed': True}}
+                if rest.startswith('/wiki/'):
+                    page = self.wiki.get(rest[len('/wiki/'):], {'content_md': '', 'revision_date': 0})
+                    return 'wiki', {'kind': 'wikipage', 'data': {
+                        'content_md': page['content_md'],
+                        'content_html': '',
+                        'revision_date': page['revision_date'],
+                        'revision_by': {'kind': 't2', 'data': {'name': 'bam_bot'}},
+                        'revision_id': 'r1',
+                        'may_revise': True
+                    }}
+                if rest == '/api/wiki/edit':
+                    self.wiki[params.get('page')] = {'content_md': params.get('content', ''), 'revision_date': time()}
+                    return 'wiki_edit', {}
+                if rest == '/api/flairlist':
+                    user = self.users.get(params.get('name'), {})
+                    return 'flairlist', {'users': [{'user': params.get('name'), 'flair_text': user.get('flair_text'), 'flair_css_class': user.get('flair_css_class')}]}
+                if rest == '/api/flairselector':
+                    return 'flairselector', {'current': {}, 'choices': []}
+                if rest == '/api/flair' or rest == '/api/selectflair':
+                    self.count(self.actions, 'flair')
+                    return 'flair', {'json': {'errors': []}}
+                if rest == '/about/banned':
+                    return 'banned', self.user_list(params.get('user'), lambda user: user['is_banned'])
+                if rest == '/about/contributors':
+                    return 'contributors', self.user_list(params.get('user'), lambda user: False)
+                if rest == '/about/moderators':
+                    return 'moderators', {'kind': 'UserList', 'data': {'children': []}}
+                if rest == '/api/compose' or rest == '/message/compose':
+                    self.count(self.actions, 'message')
+                    return 'compose', {'json': {'errors': []}}
+
+        match = re.match(r'^/user/([^/]+)/(about|moderated_subreddits)$', path)
+        if match:
+            with self.lock:
+                user = self.user(match.group(1))
+            if match.group(2) == 'moderated_subreddits':
+                return 'moderated', {'kind': 'ModeratedList', 'data': []}
+            return 'user_about', {'kind': 't2', 'data': {
+                'name': user['name'], 'id': user['id'], 'comment_karma': user['comment_karma'],
+                'link_karma': user['link_karma'], 'created_utc': user['created_utc'], 'is_gold': user['is_gold']}}
+
+        match = re.match(r'^/comments/([^/]+)', path)
+        if match:
+            with self.lock:
+                item = self.by_fullname.get('t3_%s' % match.group(1))
+                submission = self.listing([item] if item else [], {'limit': 1})
+                comments = self.listing([entry for entry in self.items if entry.get('link_id') == 't3_%s' % match.group(1)], {'limit': 100})
+            return 'submission', [submission, comments]
+
+        if path == '/api/info':
+            with self.lock:
+                items = [self.by_fullname[name] for name in params.get('id', '').split(',') if name in self.by_fullname]
+            return 'info', {'kind': 'Listing', 'data': {'after': None, 'before': None, 'children': [self.thing(item) for item in items]}}
+
+        if path == '/api/user_data_by_account_ids':
+            with self.lock:
+                by_id = dict([('t2_%s' % user['id'], user) for user in self.users.values()])
+                ids = [id for id in params.get('ids', '').split(',') if id in by_id]
+            return 'user_data', dict([(id, {'name': by_id[id]['name'], 'created_utc': by_id[id]['created_utc'],
+                'link_karma': by_id[id]['link_karma'], 'comment_karma': by_id[id]['comment_karma']}) for id in ids])
+
+        action = re.match(r'^/api/(remove|approve|report|lock|unlock|distinguish|ignore_reports|unignore_reports|marknsfw|unmarknsfw|spoiler|unspoiler|set_contest_mode|set_suggested_sort|set_original_content|comment|mod/conversations)$', path)
+        if action:
+            self.action(action.group(1), params.get('id') or params.get('thing_id'))
+            if action.group(1) == 'comment':
+                id = self.new_id()
+                return 'comment', {'json': {'errors': [], 'data': {'things': [{'kind': 't1', 'data': {
+                    'id': id, 'name': 't1_%s' % id, 'body': params.get('text', ''), 'author': 'bam_bot',
+                    'link_id': params.get('thing_id'), 'parent_id': params.get('thing_id'), 'subreddit': self.subreddit}}]}}}
+            return action.group(1), {'json': {'errors': []}}
+
+        return None, None
+
+def handler(reddit):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def respond(self, method):
+            url = urlparse(self.path)
+            params = dict([(key, values[-1]) for key, values in parse_qs(url.query).items()])
+            if method == 'POST':
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length).decode('utf-8') if length else ''
+                params.update(dict([(key, values[-1]) for key, values in parse_qs(body).items()]))
+
+            if reddit.latency or reddit.jitter:
+                sleep(reddit.latency + reddit.rng.random() * reddit.jitter)
+
+            endpoint, response = reddit.route(method, url.path, params)
+            headers, allowed = reddit.use_ratelimit()
+            status = 200
+            if endpoint is None:
+                status, response = 404, {'message': 'Not Found', 'error': 404}
+                endpoint = 'not_found'
+            elif not allowed and endpoint != 'stats':
+                status, response = 429, {'message': 'Too Many Requests', 'error': 429}
+
+            with reddit.lock:
+                reddit.count(reddit.requests, endpoint)
+
+            body = json.dumps(response).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=UTF-8')
+            self.send_header('Content-Length', str(len(body)))
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            self.respond('GET')
+
+        def do_POST(self):
+            self.respond('POST')
+
+    return Handler
+
+def serve(reddit, host='127.0.0.1', port=8080, generate=True):
+    server = ThreadingHTTPServer((host, port), handler(reddit))
+    if generate:
+        threading.Thread(target=reddit.run_generator, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local stand-in for reddit's API, for load testing BAM")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--subreddit', default='BAMTest')
+    parser.add_argument('--rate', type=float, default=10.0, help="Items generated per second")
+    parser.add_argument('--submission-ratio', type=float, default=0.2)
+    parser.add_argument('--spam-ratio', type=float, default=0.1)
+    parser.add_argument('--report-ratio', type=float, default=0.05)
+    parser.add_argument('--edit-ratio', type=float, default=0.02)
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Up to this many extra seconds, at random")
+    parser.add_argument('--ratelimit', type=int, default=600, help="Requests allowed per window")
+    parser.add_argument('--ratelimit-window', type=int, default=600)
+    parser.add_argument('--rules', help="A file to serve as the better_auto_moderator/rules wiki page")
+    parser.add_argument('--config', help="A file to serve as the better_auto_moderator wiki page")
+    args = parser.parse_args()
+
+    rules = default_rules
+    if args.rules:
+        with open(args.rules) as rules_file:
+            rules = rules_file.read()
+    config = ""
+    if args.config:
+        with open(args.config) as config_file:
+            config = config_file.read()
+
+    reddit = FakeReddit(subreddit=args.subreddit, rate=args.rate, submission_ratio=args.submission_ratio,
+        spam_ratio=args.spam_ratio, report_ratio=args.report_ratio, edit_ratio=args.edit_ratio, latency=args.latency,
+        jitter=args.jitter, ratelimit=args.ratelimit, ratelimit_window=args.ratelimit_window, rules=rules, config=config)
+    server = serve(reddit, args.host, args.port)
+    print("Fake reddit listening on http://%s:%d, generating %.1f items/sec" % (args.host, args.port, args.rate))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
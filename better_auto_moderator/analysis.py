@@ -0,0 +1,270 @@
+import re
+import argparse
+from better_auto_moderator.rule import Rule
+from better_auto_moderator.prefetch import profile_checks
+from better_auto_moderator.moderators.moderator import Moderator, ModeratorChecks, ModeratorActions, ModeratorAuthorChecks, ModeratorAuthorActions
+from better_auto_moderator.moderators.post_moderator import PostModeratorChecks, PostModeratorActions, ModeratorCrosspostSubredditChecks
+from better_auto_moderator.moderators.comment_moderator import CommentModeratorChecks, CommentModeratorActions, ModeratorCommentAuthorChecks
+from better_auto_moderator.moderators.modqueue_moderator import ModqueueModerator
+from better_auto_moderator.moderators.modmail_moderator import ModmailModerator, ModmailModeratorChecks, ModmailModeratorActions
+from better_auto_moderator.log import logger
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:
+    import sre_parse, sre_constants
+
+# Rules are only checked when they run, and anything `Moderator.check` doesn't recognize is skipped
+# without a word. This looks over the rules as they're loaded instead, and reports what's likely
+# to be a mistake, or slow.
+
+# Keys that change how a rule behaves, rather than being checks or actions
+modifiers = ['name', 'priority', 'type', 'action_reason', 'report_reason', 'moderators_exempt', 'satisfy_any_threshold',
+    'ignore_blockquotes', 'overwrite_flair', 'comment_stickied', 'comment_locked', 'comment_internal', 'modmail_subject',
+    'message_subject', 'standard', 'bam']
+
+# The checks and actions available to each type of rule
+rule_classes = {
+    'submission': (PostModeratorChecks, PostModeratorActions),
+    'comment': (CommentModeratorChecks, CommentModeratorActions),
+    'modqueue': (ModeratorChecks, ModeratorActions),
+    'modmail': (ModmailModeratorChecks, ModmailModeratorActions)
+}
+
+# The checks and actions available inside each sub-group, like `author: {...}`
+def group_classes(type, name):
+    if name == 'author':
+        return (ModeratorCommentAuthorChecks if type == 'comment' else ModeratorAuthorChecks, ModeratorAuthorActions)
+    if name == 'crosspost_author':
+        return (ModeratorAuthorChecks, ModeratorAuthorActions)
+    if name == 'crosspost_subreddit':
+        return (ModeratorCrosspostSubredditChecks, None)
+    if name == 'parent_submission':
+        return (PostModeratorChecks, PostModeratorActions)
+    if name == 'parent_comment':
+        return (CommentModeratorChecks, CommentModeratorActions)
+
+    return (None, None)
+
+# Roughly what each kind of check costs per item, in milliseconds. Requests dwarf everything else
+cost_ms = {
+    'field': 0.002,
+    'text': 0.01,
+    'regex': 0.05,
+    'batched': 5,
+    'request': 150
+}
+
+# Checks that make a request of their own for every item, and those that are fetched in batches
+request_checks = ['is_contributor', 'is_moderator', 'is_banned', 'is_top_level', 'crosspost_author', 'crosspost_subreddit']
+batched_checks = profile_checks + ['parent_submission', 'parent_comment']
+text_checks = ['body', 'title', 'url', 'domain', 'report_reasons', 'flair_text', 'flair_css_class', 'name',
+    'media_author', 'media_author_url', 'media_title', 'media_description', 'poll_option_text', 'crosspost_title', 'subject']
+
+# Split a config key into its check names, options and whether it's negated: `~body+title (regex)`
+def parse_key(key):
+    options = []
+    names = key
+    options_re = re.search(r'.*\(([a-z, \-]+)\)', key)
+    if options_re is not None:
+        options = [option.strip() for option in options_re.group(1).split(',')]
+        names = re.search(r'([^\s]*)\s?\(', key).group(1)
+
+    negated = names.startswith('~')
+    return names.lstrip('~').split('+'), options, negated
+
+def kind_of(name, options):
+    if name in request_checks:
+        return 'request'
+    if name in batched_checks:
+        return 'batched'
+    if 'regex' in options:
+        return 'regex'
+    if name in text_checks:
+        return 'text'
+
+    return 'field'
+
+# Whether a regex can backtrack catastrophically: a repeated group that can match the same text in
+# more than one way, like `(\w+\s?)+` or `(a|aa)+`. Returns a description of the problem, or None
+def backtracking(pattern):
+    try:
+        parsed = sre_parse.parse(pattern)
+    except (re.error, TypeError):
+        return None
+
+    return risky(list(parsed), False)
+
+def risky(items, repeated):
+    repeats = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT)
+    for op, av in items:
+        if op in repeats:
+            low, high, sub = av
+            if repeated and high > 1 and low != high:
+                return "a repeat inside a repeat"
+            problem = risky(list(sub), repeated or high > 1)
+            if problem is not None:
+                return problem
+        elif op is sre_constants.SUBPATTERN:
+            problem = risky(list(av[-1]), repeated)
+            if problem is not None:
+                return problem
+        elif op is sre_constants.BRANCH:
+            branches = [list(branch) for branch in av[1]]
+            firsts = [branch[0] for branch in branches if len(branch) > 0]
+            if repeated and (len(firsts) < len(branches) or len(set(map(repr, firsts))) < len(firsts)):
+                return "overlapping alternatives inside a repeat"
+            for branch in branches:
+                problem = risky(branch, repeated)
+                if problem is not None:
+                    return problem
+
+    return None
+
+class Finding:
+    def __init__(self, rule, problem):
+        self.rule = rule
+        self.problem = problem
+
+    def __str__(self):
+        return "Rule %s: %s" % (self.rule.label(), self.problem)
+
+class RuleAnalysis:
+    # What's known about one rule: its problems, what its checks are, and what it's likely to cost
+    def __init__(self, rule):
+        self.rule = rule
+        self.findings = []
+        self.cost = 0
+        # Each check in the order it runs, as (name, kind)
+        self.checks = []
+        # The rule's top level checks, as they'd have to match, for spotting shadowed rules
+        self.conditions = set()
+
+    def add(self, problem):
+        self.findings.append(Finding(self.rule, problem))
+
+def analyze_group(analysis, type, config, checks_class, actions_class, path=''):
+    for key, value in config.items():
+        names, options, negated = parse_key(key)
+        values = value if isinstance(value, list) else [value]
+        if path == '' and all(checks_class is not None and hasattr(checks_class, name) for name in names):
+            analysis.conditions.add((key, repr(value)))
+
+        for name in names:
+            # Some keys, like `author`, are both a check and an action
+            if checks_class is None or not hasattr(checks_class, name):
+                if name not in modifiers and (actions_class is None or not hasattr(actions_class, name)):
+                    analysis.add("`%s%s` isn't a check BAM has for %s rules, so it's ignored" % (path, name, type))
+                continue
+
+            kind = kind_of(name, options)
+            # Groups like `author` cost whatever their own checks do
+            if not isinstance(value, dict) or kind != 'field':
+                analysis.checks.append((path + name, kind))
+                analysis.cost += cost_ms[kind] * (1 if kind in ('batched', 'request') else len(values))
+
+            if isinstance(value, dict):
+                sub_checks, sub_actions = group_classes(type, name)
+                analyze_group(analysis, type, value, sub_checks, sub_actions, "%s%s." % (path, name))
+
+            if 'regex' in options:
+                for pattern in values:
+                    problem = backtracking(pattern) if isinstance(pattern, str) else None
+                    if problem is not None:
+                        analysis.add("the regex `%s` in `%s%s` has %s, and can take a very long time on long text" % (pattern, path, key, problem))
+
+def analyze_rule(rule):
+    analysis = RuleAnalysis(rule)
+    # Streams are only opened for these types, so rules without one (`any`) never see an item
+    if rule.type == 'any':
+        analysis.add("BAM only runs rules with a `type` (%s), so this rule never runs" % ', '.join(rule_classes.keys()))
+        return analysis
+    if rule.type not in rule_classes:
+        analysis.add("BAM doesn't read `%s` items, so this rule never runs" % rule.type)
+        return analysis
+
+    checks_class, actions_class = rule_classes[rule.type]
+    analyze_group(analysis, rule.type, rule.config, checks_class, actions_class)
+
+    kinds = [kind for name, kind in analysis.checks]
+    if len(kinds) > 0 and kinds[0] == 'request':
+        analysis.add("`%s` makes a request for every item, before any cheaper check can rule the item out" % analysis.checks[0][0])
+
+    # Removal rules skip moderators, which means looking up the author's moderated subreddits first.
+    # That costs a request, but there's no reordering it, so it isn't reported as a problem
+    if exempts_moderators(rule):
+        analysis.checks.insert(0, ('moderators_exempt', 'request'))
+        analysis.cost += cost_ms['request']
+
+    return analysis
+
+def exempts_moderators(rule):
+    moderator = {'modqueue': ModqueueModerator, 'modmail': ModmailModerator}.get(rule.type, Moderator)
+    return moderator(None).are_moderators_exempt(rule)
+
+# Rules run in order until one takes action. If an earlier rule's checks are a subset of a later
+# one's, everything the later rule matches, the earlier one already acted on
+def find_shadowed(analyses):
+    for index, later in enumerate(analyses):
+        if later.rule.config.get('satisfy_any_threshold'):
+            continue
+        for earlier in analyses[:index]:
+            if 'action' not in earlier.rule.config or earlier.rule.config.get('satisfy_any_threshold'):
+                continue
+            if exempts_moderators(earlier.rule) and not exempts_moderators(later.rule):
+                continue
+            if earlier.conditions <= later.conditions:
+                later.add("it's shadowed by rule %s, which checks for less and acts first, so it will likely never take action" % earlier.rule.label())
+                break
+
+# Analyze a set of rules, in the order they run for each type of item
+def analyze(rules):
+    analyses = []
+    by_type = {}
+    for rule in rules:
+        by_type.setdefault(rule.type, []).append(rule)
+
+    for type, typed in by_type.items():
+        typed = [analyze_rule(rule) for rule in Rule.sort_rules(typed)]
+        find_shadowed(typed)
+        analyses += typed
+
+    return analyses
+
+def log_analysis(analyses, subreddit=None):
+    for analysis in analyses:
+        label = analysis.rule.label()
+        for finding in analysis.findings:
+            logger.warning("%s", finding, extra={'rule': label, 'subreddit': subreddit})
+        logger.debug("Rule %s costs about %.2fms per item", label, analysis.cost, extra={'rule': label, 'cost_ms': analysis.cost})
+
+# A markdown report, for the wiki
+def report(analyses):
+    lines = ["# BAM rule report", "", "Rules in the order they run, with their estimated cost per item.", "",
+        "Rule | Type | Checks | Cost (ms) | Problems", "---|---|---|---|---"]
+    for analysis in analyses:
+        checks = ', '.join("%s (%s)" % (name, kind) for name, kind in analysis.checks)
+        problems = '<br>'.join(finding.problem for finding in analysis.findings) or 'None'
+        lines.append("%s | %s | %s | %.2f | %s" % (analysis.rule.label(), analysis.rule.type, checks, analysis.cost, problems))
+
+    return '\n'.join(lines) + '\n'
+
+def main():
+    parser = argparse.ArgumentParser(description="Look over a set of rules for mistakes and slow checks")
+    parser.add_argument('rules', help="A file in the same format as the better_auto_moderator/rules wiki page")
+    parser.add_argument('config', nargs='?', help="A file in the same format as the better_auto_moderator wiki page")
+    args = parser.parse_args()
+
+    from better_auto_moderator.config import parse_configs
+    with open(args.rules) as rules_file:
+        yaml_rules = rules_file.read()
+    yaml_config = ""
+    if args.config:
+        with open(args.config) as config_file:
+            yaml_config = config_file.read()
+
+    rules, config = parse_configs(yaml_rules, yaml_config)
+    print(report(analyze(rules)))
+
+if __name__ == '__main__':
+    main()
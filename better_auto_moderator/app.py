@@ -1,15 +1,81 @@
 import praw
+import sys
+import atexit
+import signal
 import better_auto_moderator.config as config
-from better_auto_moderator.reddit import subreddit, reddit
+from better_auto_moderator.reddit import subreddit, subreddits, subreddit_names, reddit, checkpoint_name
 from better_auto_moderator.reddit import post_edit_stream, comment_edit_stream
+from better_auto_moderator.reddit import submission_stream, comment_stream, modqueue_stream, modmail_stream, created_at
+from better_auto_moderator.catchup import catch_up
 from better_auto_moderator.moderators.comment_moderator import CommentModerator
 from better_auto_moderator.moderators.modqueue_moderator import ModqueueModerator
+from better_auto_moderator.moderators.modmail_moderator import ModmailModerator
 from better_auto_moderator.moderators.post_moderator import PostModerator
 from better_auto_moderator.rule import Rule
-from time import sleep
+from better_auto_moderator.dedup import SeenItems
+from better_auto_moderator.prefetch import Prefetcher, plan
+from better_auto_moderator.routing import rules_for, all_rules, fair_order
+from better_auto_moderator.sharding import LeaseTable
+from better_auto_moderator.workqueue import WorkQueue, unpack
+from better_auto_moderator.metrics import metrics, items_ingested, items_skipped, cache_hits, cache_misses, collect_cache
+from better_auto_moderator.tracing import tracer
+from better_auto_moderator.log import logger, setup_logging
+from better_auto_moderator.template import compile_template
+from better_auto_moderator.threshold import parse_threshold, parse_time_threshold
+from better_auto_moderator.regex_pool import compile_pattern
+from better_auto_moderator.time_budget import budgets
+from better_auto_moderator.analysis import analyze, log_analysis, report
+from better_auto_moderator.shadow import Shadow, ShadowStore
+from better_auto_moderator.listing import subreddit_name
+from better_auto_moderator.compact import compact
+from os import environ
+from time import time, sleep
+
+setup_logging(environ.get('BAM_LOG_LEVEL', 'INFO'), environ.get('BAM_LOG_FORMAT', 'json'))
 
 n = 0
 streams = []
+# Rules and config for each subreddit, by name
+rule_sets = {}
+# Draft rules being shadowed for each subreddit, the comparison so far, and when it was last reported
+draft_sets = {}
+shadows = {}
+shadow_reported_at = {}
+# With sharding on, the subreddits are split between workers, and we only moderate those we hold leases on
+leases = None
+owned = set(subreddits.keys())
+if environ.get('BAM_SHARDING') or int(environ.get('BAM_WORKERS', 1)) > 1:
+    leases = LeaseTable(environ.get('BAM_LEASE_PATH') or environ.get('BAM_STATE_PATH', 'bam_state.sqlite3'),
+        worker_id=environ.get('BAM_WORKER_ID'), ttl=int(environ.get('BAM_LEASE_TTL', 120)))
+    atexit.register(leases.release)
+    # Exit cleanly when stopped (like on a restart), so our leases are released for the others straight away
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    owned = set()
+
+# For one busy subreddit, a fetcher can read the streams and queue items up for several evaluators,
+# which each run the rules on their partition of the queue
+role = environ.get('BAM_ROLE')
+if role is not None:
+    work = WorkQueue(environ.get('BAM_QUEUE_PATH', 'bam_queue.sqlite3'), partitions=int(environ.get('BAM_PARTITIONS', 1)))
+    shadow_store = ShadowStore(work.path)
+    partition = int(environ.get('BAM_PARTITION', 0))
+    streams_by_name = {}
+# Every process reads the rules, but only one writes back to the wiki: the fetcher, if there is one
+writes_wiki = role != 'evaluator'
+seen_items = SeenItems()
+
+def collect_seen_items():
+    cache_hits.set(seen_items.hits, cache='seen_items')
+    cache_misses.set(seen_items.misses, cache='seen_items')
+
+metrics.collect(collect_seen_items)
+collect_cache('templates', compile_template)
+collect_cache('thresholds', parse_threshold)
+collect_cache('time_thresholds', parse_time_threshold)
+collect_cache('regexes', compile_pattern)
+if environ.get('BAM_METRICS_PORT'):
+    metrics.serve(int(environ['BAM_METRICS_PORT']))
+metrics_interval = int(environ.get('BAM_METRICS_INTERVAL', 0))
 
 print("""
 
@@ -19,82 +85,287 @@ under the /better_auto_moderator path. Have a good one!
 
 """)
 
+# We have to open separate streams for each type of content. `rules_by_type` has each type's rules,
+# keyed by subreddit, and items are routed to their own subreddit's rules. Any draft rules being
+# shadowed go alongside, in `shadow_by_type`
+def open_streams(sub, rules_by_type, shadow_by_type={}):
+    streams = []
+
+    # Whatever either set of rules needs is fetched up front, so the draft rules reuse it
+    def prefetcher(type):
+        return Prefetcher(plan(all_rules(rules_by_type[type]) + all_rules(shadow_by_type.get(type, []))))
+
+    if "submission" in rules_by_type:
+        logger.info("Listening to submission stream for r/%s...", sub.display_name)
+        rules = rules_by_type['submission']
+        streams.append({
+            'stream': submission_stream(pause_after=-1, sub=sub),
+            'name': 'submissions',
+            'checkpoint': checkpoint_name('submissions', sub),
+            'listing': sub.new,
+            'timestamp': created_at,
+            'type': 'submission',
+            'rules': rules,
+            'shadow_rules': shadow_by_type.get('submission', {}),
+            'prefetcher': prefetcher('submission'),
+            'moderator': PostModerator
+        })
+        streams.append({
+            'stream': post_edit_stream(pause_after=-1, sub=sub),
+            'name': 'submissions_edited',
+            'type': 'submission',
+            'rules': rules,
+            'shadow_rules': shadow_by_type.get('submission', {}),
+            'prefetcher': prefetcher('submission'),
+            'moderator': PostModerator
+        })
+
+    if "comment" in rules_by_type:
+        logger.info("Listening to comment stream for r/%s...", sub.display_name)
+        rules = rules_by_type['comment']
+        streams.append({
+            'stream': comment_stream(pause_after=-1, sub=sub),
+            'name': 'comments',
+            'checkpoint': checkpoint_name('comments', sub),
+            'listing': sub.comments,
+            'timestamp': created_at,
+            'type': 'comment',
+            'rules': rules,
+            'shadow_rules': shadow_by_type.get('comment', {}),
+            'prefetcher': prefetcher('comment'),
+            'moderator': CommentModerator
+        })
+        streams.append({
+            'stream': comment_edit_stream(pause_after=-1, sub=sub),
+            'name': 'comments_edited',
+            'type': 'comment',
+            'rules': rules,
+            'shadow_rules': shadow_by_type.get('comment', {}),
+            'prefetcher': prefetcher('comment'),
+            'moderator': CommentModerator
+        })
+
+
+    if "modqueue" in rules_by_type:
+        logger.info("Listenin to modqueue stream for r/%s...", sub.display_name)
+        rules = rules_by_type['modqueue']
+        streams.append({
+            'stream': modqueue_stream(pause_after=-1, sub=sub),
+            'name': 'modqueue',
+            'type': 'modqueue',
+            'rules': rules,
+            'shadow_rules': shadow_by_type.get('modqueue', {}),
+            'prefetcher': prefetcher('modqueue'),
+            'moderator': ModqueueModerator
+        })
+
+    if "modmail" in rules_by_type:
+        logger.info("Listening to modmail for r/%s...", sub.display_name)
+        streams.append({
+            'stream': modmail_stream(pause_after=-1, sub=sub),
+            'name': 'modmail',
+            'type': 'modmail',
+            'rules': rules_by_type['modmail'],
+            'shadow_rules': shadow_by_type.get('modmail', {}),
+            'prefetcher': prefetcher('modmail'),
+            'moderator': ModmailModerator
+        })
+
+    return streams
+
+# Each type's rules (or `draft` rules) for the given subreddits, keyed by subreddit
+def group_rules(names, draft=False):
+    rules_by_type = {}
+    for name in names:
+        for rule in (draft_sets.get(name, []) if draft else rule_sets[name][0]):
+            rules_by_type.setdefault(rule.type, {}).setdefault(name, []).append(rule)
+
+    for type in rules_by_type:
+        for name in rules_by_type[type]:
+            rules_by_type[type][name] = Rule.sort_rules(rules_by_type[type][name])
+
+    return rules_by_type
+
+# Whether we may act on an item. When sharding, its subreddit's lease is renewed as we go, and
+# checked before every item, so a subreddit that's moved on is never moderated by two workers
+def owns(item):
+    if leases is None or leases.holds(subreddit_name(item)):
+        return True
+
+    logger.debug("Skipping %s, its subreddit has moved to another worker", item, extra={'worker': leases.worker_id})
+    return False
+
+def evaluate(stream, item):
+    if not owns(item):
+        return
+
+    logger.debug("Processing %s %s", type(item).__name__, item, extra={'stream': stream['name']})
+    with tracer.item(item, stream=stream['name']):
+        mod = stream['moderator'](item)
+        # Once a rule takes action, no additional rules are applied for this item
+        rule = mod.moderate_all(rules_for(stream, item))
+
+        # Then see what the draft rules would have done with it, if they're being shadowed
+        draft = rules_for(stream, item, 'shadow_rules')
+        if len(draft) > 0:
+            with tracer.span('shadow'):
+                shadows[subreddit_name(item)].compare(stream['moderator'], item, draft, mod, rule)
+
 while True:
+    # When sharding, find out which of the subreddits are ours this time around. Workers joining or
+    # leaving move subreddits between workers, and we reopen our streams when they do
+    rebalanced = False
+    if leases is not None:
+        claimed = leases.claim(list(subreddits.keys()))
+        if claimed != owned:
+            logger.info("Now moderating %s", ', '.join(sorted(claimed)) or 'nothing', extra={'worker': leases.worker_id})
+            owned = claimed
+            rebalanced = True
+
     # Each iteration we do `n = (n + 1) % 5`... so every 5th iteration we check for new wiki rules
-    if n == 0:
-        print("Checking for new rules...")
-        rules, config_rules = config.get_configs()
+    if n == 0 or rebalanced:
+        logger.info("Checking for new rules...")
+        # Each subreddit has its own rules and config, in its own wiki
+        changed = rebalanced
+        for name in owned:
+            # Rules for a subreddit we've moderated before are still current, unless they've changed since
+            rules, config_rules = config.get_configs(subreddits[name])
+            reloaded = rules is not None and config_rules is not None
+            if reloaded:
+                if config_rules.get('overwrite_automoderator'):
+                    if writes_wiki:
+                        config.push_rules(rules, subreddits[name])
+                    rules = config.get_bam_rules(rules)
+
+                # Look the rules over for mistakes and slow checks, before they run
+                analyses = analyze(rules)
+                log_analysis(analyses, name)
+                if config_rules.get('rule_report') and writes_wiki:
+                    config.push_report(report(analyses), subreddits[name])
+
+                rule_sets[name] = (rules, config_rules)
+                changed = True
 
-        if rules is None or config is None:
-            print("Old rules still apply!")
+            # Draft rules run alongside the live ones, without taking action. New live rules start a new comparison
+            if name in rule_sets and rule_sets[name][1].get('shadow_rules'):
+                draft = config.get_draft_rules(subreddits[name], force=reloaded or name not in draft_sets)
+                if draft is not None:
+                    # Like the live rules, anything AutoModerator can run is left to it
+                    if rule_sets[name][1].get('overwrite_automoderator'):
+                        draft = config.get_bam_rules(draft)
+                    logger.info("Shadowing the live rules with %d draft rules", len(draft), extra={'subreddit': name})
+                    draft_sets[name] = draft
+                    shadows[name] = Shadow()
+                    shadow_reported_at[name] = time()
+                    changed = True
+            elif name in draft_sets:
+                del draft_sets[name]
+                del shadows[name]
+                changed = True
+
+            # Every so often, say how the draft rules are comparing. Evaluators each hand their share in,
+            # and the fetcher reports on all of them
+            shadow = shadows.get(name)
+            if shadow is not None and time() - shadow_reported_at[name] >= rule_sets[name][1].get('shadow_report_interval', 600):
+                generation = "%s/%s/%s" % (config.rules_last_update_at.get(name), config.config_last_update_at.get(name),
+                    config.draft_last_update_at.get(name))
+                if role == 'evaluator':
+                    shadow_store.save(name, partition, generation, shadow)
+                    shadow_reported_at[name] = time()
+                else:
+                    if role == 'fetcher':
+                        shadow = shadow_store.load(name, generation)
+                    if shadow.items > 0:
+                        shadow.log(name)
+                        config.push_report(shadow.report(), subreddits[name], "better_auto_moderator/shadow_report")
+                        shadow_reported_at[name] = time()
+
+        if not changed:
+            logger.info("Old rules still apply!")
         else:
-            print("Applying new rules...")
-
-            if config_rules.get('overwrite_automoderator'):
-                config.push_rules(rules)
-                rules = config.get_bam_rules(rules)
-
-            streams = []
-            # We have to open separate streams for each type of content, so separate them out now
-            rules_by_type = {}
-            for rule in rules:
-                if rule.type not in rules_by_type:
-                    rules_by_type[rule.type] = []
-
-                rules_by_type[rule.type].append(rule)
-
-            if "submission" in rules_by_type:
-                print("Listening to submission stream...")
-                rules = Rule.sort_rules(rules_by_type['submission'])
-                streams.append({
-                    'stream': subreddit.stream.submissions(pause_after=-1, skip_existing=True),
-                    'rules': rules,
-                    'moderator': PostModerator
-                })
-                streams.append({
-                    'stream': post_edit_stream(pause_after=-1),
-                    'rules': rules,
-                    'moderator': PostModerator
-                })
-
-            if "comment" in rules_by_type:
-                print("Listening to comment stream...")
-                rules = Rule.sort_rules(rules_by_type['comment'])
-                streams.append({
-                    'stream': subreddit.stream.comments(pause_after=-1, skip_existing=True),
-                    'rules': rules,
-                    'moderator': CommentModerator
-                })
-                streams.append({
-                    'stream': comment_edit_stream(pause_after=-1),
-                    'rules': rules,
-                    'moderator': CommentModerator
-                })
-
-
-            if "modqueue" in rules_by_type:
-                print("Listenin to modqueue stream...")
-                rules = Rule.sort_rules(rules_by_type['modqueue'])
-                streams.append({
-                    'stream': subreddit.mod.stream.modqueue(pause_after=-1, skip_existing=True),
-                    'rules': rules,
-                    'moderator': ModqueueModerator
-                })
-
-    # Loop through each of the streams, jumping to the next one when one comes up empty
-    for stream in streams:
-        for item in stream['stream']:
-            # If we don't get any items from the stream, break and start the next stream
-            if item is None:
+            logger.info("Applying new rules...")
+            names = [name for name in subreddits if name in owned and name in rule_sets]
+            # Settings for the process as a whole (like dedup and catch up) come from the first subreddit's config
+            config_rules = rule_sets[names[0]][1] if len(names) > 0 else {}
+
+            budgets.configure(config_rules)
+
+            # New rules may decide differently, so forget what we've already evaluated
+            seen_items = SeenItems(config_rules.get('dedup_size', 10000), config_rules.get('dedup_bloom_size', 0))
+
+            if leases is None:
+                # Listings on all of our subreddits at once, one request per stream
+                streams = open_streams(subreddit, group_rules(names), group_rules(names, draft=True))
+            else:
+                # Each subreddit on its own, so its checkpoints go with it when it moves to another worker
+                streams = []
+                for name in names:
+                    streams += open_streams(subreddits[name], group_rules([name]), group_rules([name], draft=True))
+
+            streams_by_name = dict((stream['name'], stream) for stream in streams)
+
+            # If we've been down for a while, chew through the backlog in bulk before streaming again.
+            # With a fetcher and evaluators, the evaluators share that work through the queue instead
+            if role is None:
+                catch_up(streams, seen_items,
+                    workers=config_rules.get('catch_up_workers', 4),
+                    actions_per_minute=config_rules.get('catch_up_actions_per_minute', 30),
+                    catch_up_after=config_rules.get('catch_up_after', 300),
+                    owns=owns)
+
+    if role == 'evaluator':
+        # Work through our partition of the queue, in the order the fetcher pushed items. Stop after a few
+        # batches even if there's more, so we still check for new rules under a steady flow of items
+        for round in range(10):
+            rows = work.peek(partition)
+            if len(rows) == 0:
                 break
 
-            print("Processing %s %s" % (type(item).__name__, item))
-            mod = stream['moderator'](item)
-            for rule in stream['rules']:
-                ran = mod.moderate(rule)
-                if ran:
-                    # If the rule passes, don't apply any additional rules for this item
-                    break
+            entries = []
+            for id, name, packed in rows:
+                # Items from streams our rules no longer read are dropped
+                if name in streams_by_name:
+                    entries.append((streams_by_name[name], unpack(packed, reddit)))
+
+            for stream in streams:
+                stream['prefetcher'].prefetch([item for entry_stream, item in entries if entry_stream is stream])
+            for stream, item in entries:
+                evaluate(stream, item)
+            work.ack([row[0] for row in rows])
+    else:
+        # Loop through each of the streams, jumping to the next one when one comes up empty
+        for stream in streams:
+            paused = False
+            while not paused:
+                # Read items in batches of up to a page, so whatever the rules need can be fetched for all of them at once
+                batch = []
+                for item in stream['stream']:
+                    # If we don't get any items from the stream, break and start the next stream
+                    if item is None:
+                        paused = True
+                        break
+
+                    items_ingested.inc(stream=stream['name'])
+                    # From here on, only what the rules read is kept
+                    item = compact(item)
+                    # Skip items we've already evaluated against these rules, unless they've since changed
+                    if seen_items.seen(stream['type'], item):
+                        items_skipped.inc(stream=stream['name'])
+                        continue
+
+                    batch.append(item)
+                    if len(batch) >= 100:
+                        break
+
+                if role == 'fetcher':
+                    # Leave the rules to the evaluators
+                    work.push(stream['name'], batch)
+                    continue
+
+                stream['prefetcher'].prefetch(batch)
+                for item in fair_order(batch):
+                    evaluate(stream, item)
 
+    metrics.dump_every(metrics_interval)
     n = (n + 1) % 5
     sleep(0.5) # Sleep just a bit each time, to avoid hitting our rate limit
@@ -0,0 +1,123 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import time, sleep
+from better_auto_moderator.reddit import checkpoints, client as new_client
+from better_auto_moderator.metrics import items_ingested
+from better_auto_moderator.tracing import tracer
+from better_auto_moderator.routing import rules_for
+from better_auto_moderator.compact import compact
+from better_auto_moderator.prefetch import Prefetcher
+from better_auto_moderator.workqueue import pack, unpack
+from better_auto_moderator.log import logger
+
+class ActionBudget:
+    # A token bucket for moderation actions. Catching up evaluates lots of items at once, and we
+    # don't want a backlog of matches to burn through our rate limit in one go.
+    def __init__(self, per_minute, burst=None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst if burst is not None else max(1, per_minute // 6)
+        self.tokens = self.capacity
+        self.updated_at = time()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens) / self.rate
+
+            sleep(wait)
+
+# Page back through a listing (newest first) until we pass `since`. Listings without a timestamp,
+# like the modqueue, are read in full.
+def page_back(listing, since, timestamp, stop_at=None):
+    items = []
+    for item in listing(limit=None):
+        if stop_at is not None and item.fullname == stop_at:
+            break
+        if since is not None and timestamp is not None and timestamp(item) < since:
+            break
+        items.append(item)
+
+    # Oldest first, so we moderate in the order things were posted
+    items.reverse()
+    return items
+
+# `owns(item)`, when given, says whether we may still act on an item (see `LeaseTable.holds`).
+# `client()` makes a reddit client for each worker
+def catch_up(streams, seen_items, workers=4, batch_size=100, actions_per_minute=30, catch_up_after=300, owns=None, client=new_client):
+    # Only streams with a listing to page through (new and comments), that have been
+    # quiet for longer than `catch_up_after` seconds, need catching up
+    behind = []
+    for stream in streams:
+        if 'listing' not in stream:
+            continue
+
+        age = checkpoints.age(stream['checkpoint'])
+        if age is not None and age > catch_up_after:
+            behind.append(stream)
+
+    if len(behind) == 0:
+        return 0
+
+    backlog = []
+    for stream in behind:
+        fullname, since = checkpoints.get(stream['checkpoint'])
+        logger.info("Catching up on %s stream...", stream['checkpoint'])
+        items = page_back(stream['listing'], since, stream['timestamp'], stop_at=fullname)
+        # Only what the rules read is kept while the backlog waits its turn
+        backlog.extend([(stream, compact(item)) for item in items])
+
+    total = len(backlog)
+    logger.info("Catching up on %d items with %d workers", total, workers)
+
+    budget = ActionBudget(actions_per_minute)
+    # praw isn't thread-safe, so each worker talks to reddit on a client of its own. Its share of a
+    # batch is moved onto that client the way items cross over to evaluator processes, and what the
+    # rules will need is fetched there too
+    clients = [client() for worker in range(workers)]
+    def evaluate(work):
+        worker_client, entries = work
+        entries = [(stream, unpack(pack(item), worker_client)) for stream, item in entries]
+        for stream in behind:
+            if 'prefetcher' in stream:
+                Prefetcher(stream['prefetcher'].needs, client=worker_client).prefetch([item for owner, item in entries if owner is stream])
+
+        for stream, item in entries:
+            if owns is not None and not owns(item):
+                continue
+
+            with tracer.item(item, stream=stream.get('name', stream['type'])):
+                mod = stream['moderator'](item, budget=budget)
+                mod.moderate_all(rules_for(stream, item))
+
+    started_at = time()
+    done = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for start in range(0, total, batch_size):
+            batch = backlog[start : start + batch_size]
+            for stream, item in batch:
+                items_ingested.inc(stream=stream.get('name', stream['type']))
+            # Dedup on this thread, then split the batch between the workers
+            fresh = [(stream, item) for stream, item in batch if not seen_items.seen(stream['type'], item)]
+            list(pool.map(evaluate, [(clients[worker], fresh[worker::workers]) for worker in range(workers)]))
+
+            for stream, item in batch:
+                timestamp = None if stream['timestamp'] is None else stream['timestamp'](item)
+                checkpoints.update(stream['checkpoint'], item.fullname, timestamp)
+            checkpoints.flush()
+
+            done += len(batch)
+            elapsed = time() - started_at
+            rate = done / elapsed if elapsed > 0 else 0
+            eta = (total - done) / rate if rate > 0 else 0
+            logger.info("Caught up on %d/%d items (%.1f items/sec, about %ds left)", done, total, rate, eta)
+
+    logger.info("Caught up! Switching back to live streams")
+    return total
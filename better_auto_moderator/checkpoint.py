@@ -0,0 +1,66 @@
+import sqlite3
+from time import time
+
+class CheckpointStore:
+    # Remembers the last item each stream processed (its fullname and timestamp) in a local
+    # SQLite file, so a restart or rule reload can pick up where the last run left off.
+    # Updates are buffered in memory and written with `flush`, once per stream round.
+    def __init__(self, path):
+        self.path = path
+        self.pending = {}
+        self._db = None
+
+    @property
+    def db(self):
+        # Connect lazily, so importing BAM doesn't create a state file
+        if self._db is None:
+            self._db = sqlite3.connect(self.path)
+            self._db.execute("""CREATE TABLE IF NOT EXISTS checkpoints (
+                stream TEXT PRIMARY KEY,
+                fullname TEXT NOT NULL,
+                timestamp REAL,
+                updated_at REAL
+            )""")
+            self._db.commit()
+        return self._db
+
+    def get(self, stream):
+        if stream in self.pending:
+            return self.pending[stream]
+
+        row = self.db.execute("SELECT fullname, timestamp FROM checkpoints WHERE stream = ?", (stream,)).fetchone()
+        if row is None:
+            return None
+
+        return (row[0], row[1])
+
+    # How many seconds since the stream last made progress, or None if it never has
+    def age(self, stream):
+        if stream in self.pending:
+            return 0
+
+        row = self.db.execute("SELECT updated_at FROM checkpoints WHERE stream = ?", (stream,)).fetchone()
+        if row is None or row[0] is None:
+            return None
+
+        return time() - row[0]
+
+    def update(self, stream, fullname, timestamp=None):
+        self.pending[stream] = (fullname, timestamp)
+
+    def flush(self):
+        if len(self.pending) == 0:
+            return
+
+        now = time()
+        self.db.executemany(
+            "INSERT OR REPLACE INTO checkpoints (stream, fullname, timestamp, updated_at) VALUES (?, ?, ?, ?)",
+            [(stream, fullname, timestamp, now) for stream, (fullname, timestamp) in self.pending.items()])
+        self.db.commit()
+        self.pending = {}
+
+    def close(self):
+        self.flush()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,148 @@
+import praw
+from better_auto_moderator.snapshot import item_fields, submission_fields, comment_fields
+
+# praw items carry their whole listing payload (a hundred or so fields for a submission) and the
+# machinery to lazily fetch more, for as long as BAM holds on to them: in a batch, in the catch up
+# backlog, on a moderator. Compact items keep only the listing fields rules actually read, in
+# slots. Anything else, like taking an action, goes to a live praw object made on first use. Making
+# one is free: praw only fetches when asked for a field it doesn't have, and actions just need the id.
+
+# Fields kept on top of those recording keeps. `author` and `subreddit` are (lazy) praw objects
+shared_fields = ('subreddit', 'author', 'num_reports')
+
+class CompactItem:
+    __slots__ = ('_reddit', '_live')
+    fields = ()
+    kind = None
+    model = None
+
+    def __init__(self, reddit, data):
+        self._reddit = reddit
+        self._live = None
+        for field in self.fields:
+            if field in data:
+                setattr(self, field, data[field])
+
+    # Fields the listing didn't have raise AttributeError, just like praw (without fetching the item
+    # to find out). Anything that isn't a listing field is read from the live praw object
+    def __getattr__(self, name):
+        if name in self.fields or name.startswith('_'):
+            raise AttributeError(name)
+
+        return getattr(self.live, name)
+
+    @property
+    def live(self):
+        if self._live is None:
+            self._live = self.model(self._reddit, id=self.id)
+        return self._live
+
+    @property
+    def fullname(self):
+        return self.name
+
+    def __str__(self):
+        return self.id
+
+    def __repr__(self):
+        return "%s(id=%r)" % (type(self).__name__, self.id)
+
+    def __eq__(self, other):
+        return getattr(other, 'fullname', None) == self.fullname
+
+    def __hash__(self):
+        return hash(self.fullname)
+
+    # Compact items read like the dict of listing data they were made from, so `listing_data` can return them as is
+    def __contains__(self, field):
+        return field in self.fields and hasattr(self, field)
+
+    def __getitem__(self, field):
+        if field not in self:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def get(self, field, default=None):
+        return getattr(self, field) if field in self else default
+
+    def items(self):
+        return [(field, getattr(self, field)) for field in self.fields if hasattr(self, field)]
+
+class CompactSubmission(CompactItem):
+    fields = tuple(dict.fromkeys(item_fields + submission_fields + ['poll_data'] + list(shared_fields)))
+    __slots__ = fields
+    kind = 'submission'
+    model = praw.models.Submission
+
+class CompactComment(CompactItem):
+    fields = tuple(dict.fromkeys(item_fields + comment_fields + list(shared_fields)))
+    __slots__ = fields + ('_submission',)
+    kind = 'comment'
+    model = praw.models.Comment
+
+    def __init__(self, reddit, data):
+        super().__init__(reddit, data)
+        self._submission = data.get('_submission')
+
+    # The submission the comment is on. It's lazy, unless it's been prefetched
+    @property
+    def submission(self):
+        if self._submission is None:
+            self._submission = self._reddit.submission(self.link_id.split('_', 1)[1])
+        return self._submission
+
+    # The comment (or submission) this replied to, from the prefetched comments if it's there
+    def parent(self):
+        if self.parent_id == self.link_id:
+            return self.submission
+        if self.parent_id in self.submission._comments_by_id:
+            return self.submission._comments_by_id[self.parent_id]
+
+        return praw.models.Comment(self._reddit, id=self.parent_id.split('_', 1)[1])
+
+class CompactModmailMessage(CompactItem):
+    # One message in a modmail conversation. Actions (replying, archiving) go to the conversation
+    fields = ('id', 'name', 'body', 'subject', 'author', 'subreddit', 'created_utc', 'is_internal', 'conversation_id')
+    __slots__ = fields + ('_conversation',)
+    kind = 'modmail'
+    model = praw.models.ModmailConversation
+
+    def __init__(self, reddit, data, conversation=None):
+        super().__init__(reddit, data)
+        self._conversation = conversation
+
+    @property
+    def conversation(self):
+        if self._conversation is None:
+            self._conversation = self.model(self._reddit, id=self.conversation_id)
+        return self._conversation
+
+    @property
+    def live(self):
+        return self.conversation
+
+# A compact copy of a praw submission or comment. Anything else is left as it is
+def compact(item):
+    if isinstance(item, praw.models.Comment):
+        return CompactComment(item._reddit, vars(item))
+    if isinstance(item, praw.models.Submission):
+        return CompactSubmission(item._reddit, vars(item))
+
+    return item
+
+# A compact item from plain listing data (like an item off the work queue), where the author and
+# subreddit are just names
+def from_data(data, reddit):
+    data = dict(data)
+    author = data.get('author')
+    if isinstance(author, str):
+        data['author'] = None if author == '[deleted]' else praw.models.Redditor(reddit, name=author)
+    if isinstance(data.get('subreddit'), str):
+        data['subreddit'] = praw.models.Subreddit(reddit, display_name=data['subreddit'])
+
+    if data.get('name', '').startswith('t1_'):
+        return CompactComment(reddit, data)
+    if data.get('name', '').startswith('modmail_'):
+        return CompactModmailMessage(reddit, data)
+
+    return CompactSubmission(reddit, data)
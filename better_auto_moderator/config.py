@@ -5,16 +5,25 @@ from ruamel import yaml
 from better_auto_moderator.rule import Rule
 from better_auto_moderator.reddit import subreddit, update_automod_config
 from better_auto_moderator.util import to_yaml_string
+from better_auto_moderator.log import logger
 
-config_last_update_at = 0
-rules_last_update_at = 0
+# When each subreddit's rules and config pages were last changed, keyed by subreddit name
+config_last_update_at = {}
+rules_last_update_at = {}
+draft_last_update_at = {}
 
-def get_configs():
-    yaml_rules, yaml_config = get_config_from_wiki()
+# Rules and config from a subreddit's wiki (by default, the only one we moderate), or (None, None)
+# if neither page has changed since we last read them
+def get_configs(sub=None):
+    yaml_rules, yaml_config = get_config_from_wiki(sub or subreddit)
     if yaml_rules is None:
         return (None, None)
 
-    config = yaml.load(yaml_config.strip(), Loader=yaml.SafeLoader)
+    return parse_configs(yaml_rules, yaml_config)
+
+# Parse the rules and config pages (as YAML strings) into Rules and the global config
+def parse_configs(yaml_rules, yaml_config):
+    config = yaml.load(yaml_config.strip(), Loader=yaml.SafeLoader) or {}
 
     # We are loading variables separately from config, and we need to insert
     # them into the YAML loader context. This special anchored_loader
@@ -51,16 +60,17 @@ def get_configs():
         if loaded is None:
             continue
 
-        rules.append(Rule(loaded, config))
+        rule = Rule(loaded, config)
+        rule.index = len(rules)
+        rules.append(rule)
     return (rules, config)
 
 # Read the rules out the subreddit's wiki, in the /better_auto_moderator
-def get_config_from_wiki():
-    global rules_last_update_at
-    global config_last_update_at
+def get_config_from_wiki(sub):
+    name = sub.display_name.lower()
     rules = None
     config = None
-    for page in subreddit.wiki:
+    for page in sub.wiki:
         if page.name == "better_auto_moderator":
             config = page
         if page.name == "better_auto_moderator/rules":
@@ -70,24 +80,52 @@ def get_config_from_wiki():
             break
 
     if not rules:
-        rules = create_bam_pages(not bool(config))
-        config = subreddit.wiki['better_auto_moderator']
+        rules = create_bam_pages(not bool(config), sub)
+        config = sub.wiki['better_auto_moderator']
 
-    if rules.revision_date <= rules_last_update_at and config.revision_date <= config_last_update_at:
+    if rules.revision_date <= rules_last_update_at.get(name, 0) and config.revision_date <= config_last_update_at.get(name, 0):
         return (None, None)
     else:
-        rules_last_update_at = rules.revision_date
-        config_last_update_at = config.revision_date
+        rules_last_update_at[name] = rules.revision_date
+        config_last_update_at[name] = config.revision_date
+
+    return (page_text(rules), page_text(config))
+
+# Strip out the four leading spaces from each line
+def page_text(page):
+    return '\n'.join([re.sub(r'^    ', '', line) for line in page.content_md.split('\n')])
+
+# Draft rules from the better_auto_moderator/rules_draft wiki page, to shadow the live rules with.
+# Returns None if there's no draft, or it hasn't changed since we last read it (unless `force`d,
+# like when the config's variables might have changed). Drafts are works in progress, so one that
+# doesn't parse is logged and ignored like an unchanged draft, rather than stopping the live rules
+def get_draft_rules(sub=None, force=False):
+    sub = sub or subreddit
+    name = sub.display_name.lower()
+    draft = None
+    for page in sub.wiki:
+        if page.name == "better_auto_moderator/rules_draft":
+            draft = page
+            break
 
-    # Strip out the four leading spaces from each line
-    rules = '\n'.join([re.sub(r'^    ', '', line) for line in rules.content_md.split('\n')])
-    config = '\n'.join([re.sub(r'^    ', '', line) for line in config.content_md.split('\n')])
+    if draft is None:
+        draft_last_update_at.pop(name, None)
+        return None
+    if not force and draft.revision_date <= draft_last_update_at.get(name, 0):
+        return None
 
-    return (rules, config)
+    draft_last_update_at[name] = draft.revision_date
+    try:
+        rules, config = parse_configs(page_text(draft), page_text(sub.wiki['better_auto_moderator']))
+    except Exception as error:
+        logger.warning("Couldn't read the new draft rules, so they're ignored: %s", error, extra={'subreddit': name})
+        return None
 
+    return rules
 
-def create_bam_pages(create_config):
-    print('creating bam rules')
+
+def create_bam_pages(create_config, sub):
+    logger.info('creating bam rules')
     if create_config:
         content = """
     # This is a page created by [BetterAutoModerator](https://github.com/josephwegner/better-auto-moderator)
@@ -101,7 +139,7 @@ def create_bam_pages(create_config):
     # It should be saved in revisions, but be safe.
     overwrite_automoderator: false
         """
-        page = subreddit.wiki.create("better_auto_moderator", content, reason="BAM Setup")
+        page = sub.wiki.create("better_auto_moderator", content, reason="BAM Setup")
         page.mod.update(True, 2) # Lock the page to mods only
 
     content = """
@@ -117,7 +155,7 @@ def create_bam_pages(create_config):
 
     ---
     """
-    page = subreddit.wiki.create("better_auto_moderator/rules", content, reason="BAM Setup")
+    page = sub.wiki.create("better_auto_moderator/rules", content, reason="BAM Setup")
     page.mod.update(True, 2) # Lock the page to mods only
 
     return page
@@ -138,7 +176,7 @@ def get_automod_rules(rules):
             automod_rules.append(rule)
     return automod_rules
 
-def push_rules(rules):
+def push_rules(rules, sub=None):
     rules_for_reddit = []
     for rule in get_automod_rules(rules):
         rules_for_reddit.append(rule.to_reddit())
@@ -150,4 +188,10 @@ def push_rules(rules):
 # existing rules, please go to the better_auto_moderator/rules wiki page and work there. Changes will get moved here automatically.
 
 %s""" % full_yaml
-    update_automod_config(config)
+    update_automod_config(config, sub)
+
+# Write the rule analysis report to the wiki, next to the rules it's about
+def push_report(report, sub=None, page_name="better_auto_moderator/report"):
+    sub = sub or subreddit
+    page = sub.wiki.create(page_name, report, reason="BAM rule report")
+    page.mod.update(True, 2) # Lock the page to mods only
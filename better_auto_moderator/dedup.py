@@ -0,0 +1,68 @@
+from collections import OrderedDict
+from hashlib import blake2b
+from better_auto_moderator.listing import listing_data
+from better_auto_moderator.modqueue import report_state
+
+class BloomFilter:
+    # A fixed-size bit array that remembers keys long after they've fallen out of the LRU,
+    # at the cost of the occasional false positive
+    def __init__(self, size, hashes=4):
+        self.size = size
+        self.hashes = hashes
+        self.bits = bytearray((size + 7) // 8)
+
+    def indexes(self, key):
+        digest = blake2b(repr(key).encode('utf-8'), digest_size=self.hashes * 4).digest()
+        for i in range(self.hashes):
+            yield int.from_bytes(digest[i * 4 : (i + 1) * 4], 'little') % self.size
+
+    def add(self, key):
+        for index in self.indexes(key):
+            self.bits[index // 8] |= 1 << (index % 8)
+
+    def __contains__(self, key):
+        for index in self.indexes(key):
+            if not self.bits[index // 8] & (1 << (index % 8)):
+                return False
+        return True
+
+class SeenItems:
+    # The same item can come through the submission, edited and modqueue streams. We only need to
+    # evaluate it again when something rules care about has changed, so items are keyed by
+    # (fullname, edited timestamp, reports: how many and why), per group of rules. Recent keys live
+    # in an LRU; if `bloom_size` is set, keys evicted from the LRU are remembered in a Bloom filter.
+    def __init__(self, size=10000, bloom_size=0):
+        self.size = size
+        self.recent = OrderedDict()
+        self.bloom = BloomFilter(bloom_size) if bloom_size else None
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(group, item):
+        # Read the listing data directly, so building the key never triggers a lazy fetch
+        # Reports are compared like the modqueue compares them, so an item reported again for a
+        # different reason (with the same count) is evaluated again too
+        data = listing_data(item)
+        return (group, data.get('name') or item.fullname, data.get('edited') or False, report_state(item))
+
+    # Returns True if this item was already evaluated in the same state, and remembers it otherwise
+    def seen(self, group, item):
+        key = self.key(group, item)
+        if key in self.recent:
+            self.recent.move_to_end(key)
+            self.hits += 1
+            return True
+
+        if self.bloom is not None and key in self.bloom:
+            self.hits += 1
+            return True
+
+        self.misses += 1
+        self.recent[key] = True
+        if len(self.recent) > self.size:
+            evicted, _ = self.recent.popitem(last=False)
+            if self.bloom is not None:
+                self.bloom.add(evicted)
+
+        return False
@@ -0,0 +1,104 @@
+from better_auto_moderator.snapshot import Snapshot
+from better_auto_moderator.compact import CompactItem
+from better_auto_moderator.metrics import fetches_avoided, fetches_needed
+
+# praw objects are lazy: reading an attribute that wasn't in the listing fetches the whole object.
+# A lot of what checks want is already in the listing under another name though (the author's id
+# is `author_fullname`, their flair in this subreddit is `author_flair_text`, and so on). These
+# read from the listing first, and only fall back to praw (and a fetch) when it really isn't there.
+
+missing = object()
+
+# The item's fields as they came in the listing. Reading these never triggers a fetch
+def listing_data(item):
+    if isinstance(item, Snapshot):
+        return item.data
+    if isinstance(item, CompactItem):
+        return item
+
+    try:
+        return vars(item)
+    except TypeError:
+        return {}
+
+# The first of `fields` that's in the item's listing data, or `missing`
+def from_listing(item, *fields):
+    data = listing_data(item)
+    for field in fields:
+        if field in data:
+            return data[field]
+
+    return missing
+
+# Read `name` from the item. If praw would have to fetch it, try `field` from the listing first
+def resolve(item, name, field, convert=bool):
+    data = listing_data(item)
+    if name in data:
+        return data[name]
+
+    if field in data:
+        fetches_avoided.inc(attribute=name)
+        return convert(data[field])
+
+    fetches_needed.inc(attribute=name)
+    return getattr(item, name)
+
+# Read an attribute of the item's author. If the author hasn't been fetched, try `field` from the
+# item's listing first, and only fetch the author if that's missing too
+def resolve_author(item, name, field, convert=lambda value: value):
+    author = item.author
+    if author is not None and name in listing_data(author):
+        return listing_data(author)[name]
+
+    value = from_listing(item, field)
+    if value is not missing:
+        fetches_avoided.inc(attribute="author.%s" % name)
+        return convert(value)
+
+    fetches_needed.inc(attribute="author.%s" % name)
+    return getattr(author, name)
+
+def author_id(item):
+    return resolve_author(item, 'id', 'author_fullname', lambda fullname: fullname.split('_', 1)[1])
+
+def author_is_gold(item):
+    return resolve_author(item, 'is_gold', 'author_premium')
+
+# The author's flair in this subreddit, as of when the item was posted. `name` is one of flair_text,
+# flair_css_class or flair_template_id. Returns `missing` when the listing doesn't say, and the
+# caller should ask the subreddit instead
+def author_flair(item, name):
+    value = from_listing(item, 'author_%s' % name)
+    if value is not missing:
+        fetches_avoided.inc(attribute="author.%s" % name)
+    else:
+        fetches_needed.inc(attribute="author.%s" % name)
+
+    return value
+
+# Whether a comment's author also wrote the submission. Comment listings include `is_submitter`,
+# and failing that `link_author`, so neither the author nor the submission needs fetching
+def is_submitter(comment):
+    value = from_listing(comment, 'is_submitter')
+    if value is not missing:
+        fetches_avoided.inc(attribute='is_submitter')
+        return value
+
+    link_author = from_listing(comment, 'link_author')
+    if link_author is not missing and comment.author is not None:
+        fetches_avoided.inc(attribute='is_submitter')
+        return link_author == comment.author.name
+
+    fetches_needed.inc(attribute='is_submitter')
+    return comment.author.id == comment.submission.author.id
+
+# The (lowercased) name of the subreddit an item was posted in
+def subreddit_name(item):
+    sub = listing_data(item).get('subreddit')
+    if sub is None:
+        sub = item.subreddit
+
+    if isinstance(sub, dict):
+        return str(sub.get('name')).lower()
+
+    return str(getattr(sub, 'display_name', sub)).lower()
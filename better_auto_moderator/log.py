@@ -0,0 +1,50 @@
+import sys
+import json
+import queue
+import atexit
+import logging
+from logging.handlers import QueueHandler, QueueListener
+
+logger = logging.getLogger('bam')
+
+# Every attribute a plain LogRecord has. Anything else on a record was passed in `extra`, and becomes a field
+reserved_fields = set(vars(logging.LogRecord('', 0, '', 0, '', None, None)).keys()) | {'message', 'asctime'}
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            'time': record.created,
+            'level': record.levelname.lower(),
+            'message': record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in reserved_fields:
+                data[key] = value
+
+        return json.dumps(data, default=str)
+
+class Listener(QueueListener):
+    # Stopping twice (say, once by hand and again at exit) is harmless
+    def stop(self):
+        if self._thread is not None:
+            super().stop()
+
+# Log records are put on a queue by whichever thread logs them, and written out on a background
+# thread, so a slow stdout (like Heroku's, under a burst) doesn't hold up moderation
+def setup_logging(level='INFO', format='json', stream=None):
+    handler = logging.StreamHandler(stream or sys.stdout)
+    if format == 'json':
+        handler.setFormatter(JSONFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(levelname)s %(message)s'))
+
+    records = queue.SimpleQueue()
+    listener = Listener(records, handler)
+    logger.handlers = [QueueHandler(records)]
+    logger.setLevel(level.upper())
+    logger.propagate = False
+    listener.start()
+    # Write out anything still queued when we exit
+    atexit.register(listener.stop)
+
+    return listener
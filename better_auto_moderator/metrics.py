@@ -0,0 +1,194 @@
+import re
+import threading
+from time import time
+from urllib.parse import urlparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from prawcore import Requestor
+from better_auto_moderator.tracing import tracer
+from better_auto_moderator.log import logger
+
+# Counters and histograms for the moderation loop, rendered in the Prometheus text format. They can be
+# served over HTTP (BAM_METRICS_PORT) or logged every so often (BAM_METRICS_INTERVAL), for hosts
+# like Heroku workers that don't expose a port.
+
+latency_buckets = [0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5]
+lag_buckets = [1, 5, 10, 30, 60, 300, 600, 1800, 3600]
+
+def format_labels(labels):
+    if len(labels) == 0:
+        return ''
+
+    pairs = ['%s="%s"' % (key, str(value).replace('\\', '\\\\').replace('"', '\\"')) for key, value in labels]
+    return '{%s}' % ','.join(pairs)
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[tuple(sorted(labels.items()))] = value
+
+    def get(self, **labels):
+        return self.values.get(tuple(sorted(labels.items())), 0)
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, labels, value) for labels, value in self.values.items()]
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, buckets=latency_buckets):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            if key not in self.values:
+                self.values[key] = {'counts': [0] * len(self.buckets), 'count': 0, 'sum': 0}
+            entry = self.values[key]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry['counts'][index] += 1
+            entry['count'] += 1
+            entry['sum'] += value
+
+    def get(self, **labels):
+        return self.values.get(tuple(sorted(labels.items())))
+
+    def samples(self):
+        samples = []
+        with self.lock:
+            for labels, entry in self.values.items():
+                for bound, count in zip(self.buckets, entry['counts']):
+                    samples.append((self.name + '_bucket', labels + (('le', bound),), count))
+                samples.append((self.name + '_bucket', labels + (('le', '+Inf'),), entry['count']))
+                samples.append((self.name + '_count', labels, entry['count']))
+                samples.append((self.name + '_sum', labels, entry['sum']))
+        return samples
+
+class Metrics:
+    def __init__(self):
+        self.metrics = []
+        # Functions run before rendering, for values that are read rather than counted (like cache stats)
+        self.collectors = []
+        self.dumped_at = time()
+
+    def counter(self, name, help):
+        metric = Counter(name, help)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, buckets=latency_buckets):
+        metric = Histogram(name, help, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def collect(self, collector):
+        self.collectors.append(collector)
+
+    def render(self):
+        for collector in self.collectors:
+            collector()
+
+        lines = []
+        for metric in self.metrics:
+            lines.append('# HELP %s %s' % (metric.name, metric.help))
+            lines.append('# TYPE %s %s' % (metric.name, metric.kind))
+            for name, labels, value in metric.samples():
+                lines.append('%s%s %s' % (name, format_labels(labels), value))
+
+        return '\n'.join(lines) + '\n'
+
+    # Log everything every `interval` seconds. Called from the main loop, so it costs nothing in between,
+    # and the logger writes it out on its own thread, so a slow stdout doesn't hold the loop up either
+    def dump_every(self, interval):
+        if interval and time() - self.dumped_at >= interval:
+            self.dumped_at = time()
+            logger.info("Metrics:\n%s", self.render())
+
+    def serve(self, port, host='0.0.0.0'):
+        metrics = self
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+metrics = Metrics()
+items_ingested = metrics.counter('bam_items_ingested_total', "Items read from each stream")
+items_skipped = metrics.counter('bam_items_skipped_total', "Items skipped because they were already evaluated")
+rule_seconds = metrics.histogram('bam_rule_evaluation_seconds', "Time spent evaluating each rule against an item")
+api_requests = metrics.counter('bam_api_requests_total', "Requests made to reddit, by endpoint")
+cache_hits = metrics.counter('bam_cache_hits_total', "Cache hits, by cache")
+cache_misses = metrics.counter('bam_cache_misses_total', "Cache misses, by cache")
+actions_taken = metrics.counter('bam_actions_total', "Actions taken, by type")
+fetches_avoided = metrics.counter('bam_fetches_avoided_total', "Attributes read from listing data that would otherwise have been fetched, by attribute")
+fetches_needed = metrics.counter('bam_fetches_needed_total', "Attributes that weren't in listing data, so may have been fetched, by attribute")
+prefetched = metrics.counter('bam_prefetched_total', "Authors and parents fetched in batches ahead of evaluation")
+regex_offloaded = metrics.counter('bam_regex_offloaded_total', "Regex checks on long text that were matched in the process pool")
+budget_overruns = metrics.counter('bam_budget_overruns_total', "Rules abandoned for going over a time budget, by budget and rule")
+rules_quarantined = metrics.counter('bam_rules_quarantined_total', "Rules quarantined for repeatedly going over their time budgets")
+action_lag = metrics.histogram('bam_ingest_to_action_seconds', "Time from an item being posted (or edited) to BAM acting on it", lag_buckets)
+
+# Record an lru_cache's stats under `name`, every time metrics are rendered
+def collect_cache(name, cached):
+    def collector():
+        info = cached.cache_info()
+        cache_hits.set(info.hits, cache=name)
+        cache_misses.set(info.misses, cache=name)
+    metrics.collect(collector)
+
+# Collapse ids and names out of request paths, so every endpoint is one label
+endpoint_patterns = [
+    (re.compile(r'/$'), ''),
+    (re.compile(r'^/r/[^/]+'), '/r/{subreddit}'),
+    (re.compile(r'^/(user|u)/[^/]+'), '/user/{name}'),
+    (re.compile(r'/comments/[^/]+(/[^/]*(/[^/]+)?)?'), '/comments/{id}'),
+    (re.compile(r'/wiki/(?!pages$|settings/).+$'), '/wiki/{page}'),
+    (re.compile(r'/wiki/settings/.+$'), '/wiki/settings/{page}')
+]
+
+def endpoint(url):
+    path = urlparse(url).path
+    for pattern, replacement in endpoint_patterns:
+        path = pattern.sub(replacement, path)
+
+    return path or '/'
+
+class InstrumentedRequestor(Requestor):
+    # Every HTTP request praw makes goes through here, including the lazy fetches triggered by
+    # reading attributes, so this counts (and traces) all of them
+    def request(self, *args, **kwargs):
+        method = args[0] if len(args) > 0 else kwargs.get('method')
+        url = args[1] if len(args) > 1 else kwargs.get('url', '')
+        method = str(method).upper()
+        path = endpoint(url)
+        api_requests.inc(method=method, endpoint=path)
+        with tracer.request(method, path):
+            return super().request(*args, **kwargs)
@@ -1,8 +1,7 @@
 from functools import cached_property
 from better_auto_moderator.moderators.moderator import Moderator, ModeratorChecks, ModeratorAuthorChecks, ModeratorActions, comparator
 from better_auto_moderator.moderators.post_moderator import PostModeratorChecks, PostModeratorActions
-from better_auto_moderator.rule import Rule
-from better_auto_moderator.reddit import reddit
+from better_auto_moderator.listing import is_submitter
 
 def comment_depth(comment):
     if (hasattr(comment, 'depth')):
@@ -22,25 +21,30 @@ class CommentModerator(Moderator):
         return CommentModeratorChecks(self)
 
 class CommentModeratorChecks(ModeratorChecks):
-    def author(self, value, rule, options):
-        author_checks = ModeratorCommentAuthorChecks(self.moderator)
-        author_rule = Rule(value)
-        return self.moderator.check(author_rule, checks=author_checks)
+    @cached_property
+    def _author_checks(self):
+        return ModeratorCommentAuthorChecks(self.moderator)
 
-    def parent_submission(self, value, rule, options):
+    @cached_property
+    def _submission_checks(self):
         post_checks = PostModeratorChecks(self.moderator)
         post_checks.item = self.item.submission
-        post_rule = Rule(value)
-        return self.moderator.check(post_rule, checks=post_checks)
+        return post_checks
+
+    @cached_property
+    def _parent_checks(self):
+        comment_checks = CommentModeratorChecks(self.moderator)
+        comment_checks.item = self.item.parent()
+        return comment_checks
+
+    def parent_submission(self, value, rule, options):
+        return self.moderator.check(rule.sub_rule(value), checks=self._submission_checks)
 
     def parent_comment(self, value, rule, options):
         if comment_depth(self.item) == 0:
             return None
 
-        comment_checks = CommentModeratorChecks(self.moderator)
-        comment_checks.item = self.item.parent()
-        comment_rule = Rule(value)
-        return self.moderator.check(comment_rule, checks=comment_checks)
+        return self.moderator.check(rule.sub_rule(value), checks=self._parent_checks)
 
     @comparator(default='bool')
     def is_top_level(self, rule, options):
@@ -49,20 +53,26 @@ class CommentModeratorChecks(ModeratorChecks):
 class ModeratorCommentAuthorChecks(ModeratorAuthorChecks):
     @comparator(default='bool')
     def is_submitter(self, rule, options):
-        return self.item.author.id == self.item.submission.author.id
+        return is_submitter(self.item)
 
 class CommentModeratorActions(ModeratorActions):
-    def parent_submission(self, rule, value):
+    @cached_property
+    def _submission_actions(self):
         post_actions = PostModeratorActions(self.moderator)
         post_actions.item = self.item.submission
-        post_rule = Rule(value)
-        return self.moderator.action(post_rule, actions=post_actions)
+        return post_actions
+
+    @cached_property
+    def _parent_actions(self):
+        comment_actions = CommentModeratorActions(self.moderator)
+        comment_actions.item = self.item.parent()
+        return comment_actions
+
+    def parent_submission(self, rule, value):
+        return self.moderator.action(rule.sub_rule(value), actions=self._submission_actions)
 
     def parent_comment(self, rule, value):
         if comment_depth(self.item) == 0:
             return None
 
-        comment_actions = CommentModeratorActions(self.moderator)
-        comment_actions.item = self.item.parent()
-        comment_rule = Rule(value)
-        return self.moderator.action(comment_rule, actions=comment_actions)
+        return self.moderator.action(rule.sub_rule(value), actions=self._parent_actions)
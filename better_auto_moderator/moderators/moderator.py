@@ -2,10 +2,19 @@ import re
 import praw
 from urllib.parse import urlparse
 from functools import cached_property, wraps
-from better_auto_moderator.rule import Rule
-from better_auto_moderator.reddit import reddit
+from better_auto_moderator.rule import threshold_checks
+from better_auto_moderator.template import Template, compile_template
+from better_auto_moderator.snapshot import Snapshot
+from better_auto_moderator.compact import CompactItem
+from better_auto_moderator.threshold import parse_threshold, parse_time_threshold
+from better_auto_moderator.metrics import rule_seconds, actions_taken, action_lag, budget_overruns
+from better_auto_moderator.time_budget import budgets, OverBudget
+from better_auto_moderator.tracing import tracer
+from better_auto_moderator.log import logger
+from better_auto_moderator.regex_pool import regex_pool
+from better_auto_moderator.listing import listing_data, resolve, author_id, author_is_gold, author_flair, missing
 from datetime import datetime
-from dateutil.relativedelta import relativedelta
+from time import time, perf_counter
 
 class Moderator:
     moderators_exempt_actions = [
@@ -15,9 +24,17 @@ class Moderator:
         'filter'
     ]
 
-    def __init__(self, item):
+    def __init__(self, item, budget=None, dry_run=False):
         self.item = item
         self.matches = {}
+        # Optional ActionBudget, which throttles how quickly matching rules can take action
+        self.budget = budget
+        # A dry run checks rules as usual, but stops at the first match instead of taking its actions
+        self.dry_run = dry_run
+        # How long each rule took on this item, in seconds, keyed by rule label
+        self.timings = {}
+        # When the rule being checked has to be done by, if rules have a time budget
+        self.rule_deadline = None
 
     def set_match(self, match, value):
         self.matches[match] = value
@@ -44,14 +61,82 @@ class Moderator:
 
     def moderate(self, rule):
         if self.are_moderators_exempt(rule):
-            if self.item.subreddit in self.item.author.moderated():
-                return False
+            with tracer.span('check', check='moderators_exempt'):
+                if self.item.subreddit in self.item.author.moderated():
+                    return False
 
         # Run all of the checks in this rule to see if the item matches
         if not self.check(rule):
             return False
 
-        return self.action(rule)
+        if self.dry_run:
+            return True
+
+        if self.budget is not None:
+            self.budget.acquire()
+
+        started_at = perf_counter()
+        ran = self.action(rule)
+        if ran:
+            fields = {'rule': rule.label(), 'item': self.item_name(), 'ms': (perf_counter() - started_at) * 1000}
+            posted_at = self.posted_at()
+            if posted_at is not None:
+                fields['lag'] = time() - posted_at
+                action_lag.observe(fields['lag'])
+
+            logger.info("Took action on %s (rule %s)", fields['item'], fields['rule'], extra=fields)
+
+        return ran
+
+    # Run each rule in order, stopping at the first one that takes action. Returns that rule, if any
+    def moderate_all(self, rules):
+        item_deadline = budgets.item_deadline()
+        for index, rule in enumerate(rules):
+            if budgets.is_quarantined(rule):
+                continue
+
+            if item_deadline is not None and perf_counter() > item_deadline:
+                budget_overruns.inc(budget='item', rule=rule.label())
+                logger.warning("Ran out of time on %s, so %d rules were skipped", self.item_name(), len(rules) - index,
+                    extra={'item': self.item_name(), 'budget': 'item'})
+                return None
+
+            label = rule.label()
+            started_at = perf_counter()
+            self.rule_deadline = budgets.rule_deadline()
+            try:
+                with tracer.span('rule', rule=label):
+                    ran = self.moderate(rule)
+            except OverBudget as exceeded:
+                budgets.overrun(rule, exceeded)
+                ran = False
+            self.timings[label] = perf_counter() - started_at
+            # Dry runs (like draft rules being shadowed) keep out of the live rules' metrics
+            if not self.dry_run:
+                rule_seconds.observe(self.timings[label], rule=label)
+            if ran:
+                return rule
+
+        return None
+
+    # When the item was posted (or last edited)
+    def posted_at(self):
+        data = listing_data(self.item)
+        return data.get('edited') or data.get('created_utc')
+
+    def item_name(self):
+        return listing_data(self.item).get('name') or str(self.item)
+
+    # Fill in the placeholders of a config value, using the template compiled when the rule was loaded
+    def render(self, rule, key, item=None):
+        if item is None:
+            item = self.item
+
+        value = rule.templates[key]
+        if isinstance(value, Template):
+            return value.render(ModeratorPlaceholders, item, self)
+
+        return value
 
     # actions can be set specifically here, if you want to run tests on a sub-group, like "author"
     # If it's not defined, we'll use whatever is defined in the `actions` method
@@ -62,9 +147,11 @@ class Moderator:
         ran = False
         for key in rule.config.keys():
             if hasattr(actions, key):
-                value = ModeratorPlaceholders.replace(rule.config[key], self.item, self)
-                if getattr(actions, key)(rule, value):
-                    ran = True
+                value = self.render(rule, key)
+                with tracer.span('action', action=key):
+                    if getattr(actions, key)(rule, value):
+                        actions_taken.inc(action=value if key == 'action' else key)
+                        ran = True
 
         return ran
 
@@ -76,13 +163,6 @@ class Moderator:
 
         satisfy_any_threshold = rule.config.get('satisfy_any_threshold')
         satisfied_threshold = False
-        threshold_checks = [
-            'comment_karma',
-            'post_karma',
-            'combined_karma',
-            'account_age',
-            'satisfy_any_threshold']
-
         for key in rule.config:
             check_name = key
             # Search for options, like (regex) or (case-sensitive)
@@ -109,22 +189,24 @@ class Moderator:
             for name in check_names:
                 check = getattr(checks, name)
                 if callable(check):
-                    values = rule.config[key]
-                    # Multiple values can be passed in, as an array. We should force single values
-                    # into an "array", just so the code runs in a similar way regardless
-                    # of inputs
-                    if not isinstance(values, list):
-                        values = [values]
-
-                    for val in values:
-                        if isinstance(val, str):
-                            val = ModeratorPlaceholders.replace(val, self.item, self)
-
-                        check_val = check(val, rule, options)
-                        if check_val is None:
-                            return False
-                        elif check_val is True:
-                            passed = check_truthiness
+                    started_at = perf_counter()
+                    check_val = False
+                    with budgets.checking(self.rule_deadline), tracer.span('check', check=name):
+                        # Multiple values can be passed in, as an array. Rules store every value
+                        # as a list of precompiled templates, so single values and arrays run the same way
+                        for val in rule.values[key]:
+                            if isinstance(val, Template):
+                                val = val.render(ModeratorPlaceholders, self.item, self)
+
+                            check_val = check(val, rule, options)
+                            if check_val is None:
+                                break
+                            elif check_val is True:
+                                passed = check_truthiness
+
+                    budgets.enforce(name, started_at, self.rule_deadline)
+                    if check_val is None:
+                        return False
 
             if not passed and (not satisfy_any_threshold or check_name not in threshold_checks):
                 return False
@@ -145,11 +227,7 @@ class Moderator:
         values = [value for value in values if value is not None]
 
         if 'regex' in options:
-            for value in values:
-                if re.fullmatch(test, value) is not None:
-                    return True
-
-            return False
+            return regex_pool.match(test, values, full=True)
 
         if not 'case-sensitive' in options:
             values = [value.lower() for value in values]
@@ -190,11 +268,7 @@ class Moderator:
         values = [value for value in values if value is not None]
 
         if 'regex' in options:
-            for value in values:
-                if re.search(test, value) is not None:
-                    return True
-
-            return False
+            return regex_pool.match(test, values)
 
         if not 'case-sensitive' in options:
             values = [value.lower() for value in values]
@@ -234,37 +308,13 @@ class Moderator:
         chars = value[: length]
         return cls.full_exact(chars, test, options)
 
-    @staticmethod
-    def time(value, test, options):
-        number = float(re.search(r'[0-9\-.]+', test).group(0))
-        delta = None
-
-        if 'minutes' in test:
-            delta = relativedelta(minutes=number) # Do nothing, unit is minutes
-        elif 'hours' in test:
-            delta = relativedelta(hours=number)
-        elif 'weeks' in test:
-            delta = relativedelta(weeks=number)
-        elif 'years' in test:
-            delta = relativedelta(years=number)
-        elif 'months' in test:
-            delta = relativedelta(months=number)
-        else: # Default is days
-            delta = relativedelta(days=number)
-
-        comparison_time = value + delta
-        now = datetime.utcfromtimestamp(datetime.today().timestamp())
-
-        if '>=' in test or 'greater-than-equal' in options:
-            return now >= comparison_time
-        elif '<=' in test or 'less-than-equal' in options:
-            return now <= comparison_time
-        if '>' in test or 'greater-than' in options:
-            return now > comparison_time
-        elif '<' in test or 'less-than' in options:
-            return now < comparison_time
-        else:
-            return now == comparison_time
+    # The clock used by time comparators, captured once per item so every check agrees on "now"
+    @cached_property
+    def now(self):
+        return datetime.utcfromtimestamp(datetime.today().timestamp())
+
+    def time(self, value, test, options):
+        return parse_time_threshold(test).matches(value, self.now, options)
 
     @classmethod
     def full_text(cls, value, test, options):
@@ -274,19 +324,8 @@ class Moderator:
 
     @staticmethod
     def numeric(value, test, options):
-        test = str(test)
-        # Pull the numeric value out of the test string
-        number = float(re.search(r'[0-9\-.]+', test).group(0))
-        if '>=' in test or 'greater-than-equal' in options:
-            return value >= number
-        elif '<=' in test or 'less-than-equal' in options:
-            return value <= number
-        if '>' in test or 'greater-than' in options:
-            return value > number
-        elif '<' in test or 'less-than' in options:
-            return value < number
-        else:
-            return value == number
+        # Thresholds like `> 100` are parsed once and cached, so this is a single comparison
+        return parse_threshold(test).matches(value, options)
 
     @staticmethod
     def bool(value, test, options):
@@ -358,14 +397,17 @@ class ModeratorChecks(AbstractChecks):
     @comparator(default='includes')
     def url(self, rule, options):
         if hasattr(self.item, 'crosspost_parent'):
-            return reddit.submission(self.item.crosspost_parent.split('_')[1]).url
+            return self.item._reddit.submission(self.item.crosspost_parent.split('_')[1]).url
 
         return self.item.url
 
+    # Checks for sub-groups are made once per item, and shared by every rule with the group
+    @cached_property
+    def _author_checks(self):
+        return ModeratorAuthorChecks(self.moderator)
+
     def author(self, value, rule, options):
-        author_checks = ModeratorAuthorChecks(self.moderator)
-        author_rule = Rule(value)
-        return self.moderator.check(author_rule, checks=author_checks)
+        return self.moderator.check(rule.sub_rule(value), checks=self._author_checks)
 
     @comparator(default='contains')
     def report_reasons(self, rule, options):
@@ -399,7 +441,7 @@ class ModeratorAuthorChecks(AbstractChecks):
 
     @comparator(default='full-exact')
     def id(self, rule, options):
-        return self.item.author.id
+        return author_id(self.item)
 
     @comparator(default='includes-word')
     def name(self, rule, options):
@@ -407,8 +449,12 @@ class ModeratorAuthorChecks(AbstractChecks):
 
     @comparator(default='full-exact')
     def flair_template_id(self, rule, options):
+        flair = author_flair(self.item, 'flair_template_id')
+        if flair is not missing:
+            return flair or ''
+
         url = "r/%s/api/flairselector?name=%s" % (self.item.subreddit.name, self.item.author.name)
-        flair = reddit.post(url)['current']
+        flair = self.item._reddit.post(url)['current']
         if 'flair_template_id' in flair:
             return flair['flair_template_id']
         else:
@@ -416,10 +462,18 @@ class ModeratorAuthorChecks(AbstractChecks):
 
     @comparator(default='full-exact')
     def flair_text(self, rule, options):
+        flair = author_flair(self.item, 'flair_text')
+        if flair is not missing:
+            return flair
+
         return next(self.item.subreddit.flair(self.item.author.name))['flair_text']
 
     @comparator(default='full-exact')
     def flair_css_class(self, rule, options):
+        flair = author_flair(self.item, 'flair_css_class')
+        if flair is not missing:
+            return flair
+
         return next(self.item.subreddit.flair(self.item.author.name))['flair_css_class']
 
     @comparator(default='time')
@@ -428,7 +482,7 @@ class ModeratorAuthorChecks(AbstractChecks):
 
     @comparator(default='bool')
     def is_gold(self, rule, options):
-        return self.item.author.is_gold
+        return author_is_gold(self.item)
 
     @comparator(default='bool')
     def is_contributor(self, rule, options):
@@ -448,22 +502,24 @@ class AbstractActions:
         self.item = moderator.item
 
 class ModeratorActions(AbstractActions):
+    @cached_property
+    def _author_actions(self):
+        return ModeratorAuthorActions(self.moderator)
+
     def author(self, rule, value):
-        author_actions = ModeratorAuthorActions(self.moderator)
-        author_rule = Rule(value)
-        return self.moderator.action(author_rule, actions=author_actions)
+        return self.moderator.action(rule.sub_rule(value), actions=self._author_actions)
 
     def ignore_reports(self, rule, value):
-        print("Ingoring reports on %s %s" % (type(self.item).__name__, self.item.id))
+        logger.debug("Ingoring reports on %s %s", type(self.item).__name__, self.item.id)
         self.item.mod.ignore_reports()
         return True
 
     def log(self, rule, value):
-        print(value)
+        logger.info(value, extra={'rule': rule.label(), 'item': self.moderator.item_name()})
         return True
 
     def comment(self, rule, value):
-        print("Replying to %s %s" % (type(self.item).__name__, self.item.id))
+        logger.debug("Replying to %s %s", type(self.item).__name__, self.item.id)
         comment = self.item.reply(value)
 
         if rule.config.get('comment_locked'):
@@ -474,7 +530,7 @@ class ModeratorActions(AbstractActions):
     def message(self, rule, value):
         subject = "BetterAutoModerator notification"
         if 'message_subject' in rule.config:
-            subject = ModeratorPlaceholders.replace(rule.config['message_subject'], self.item, self.moderator)
+            subject = self.moderator.render(rule, 'message_subject', self.item)
 
         message = """%s
 
@@ -487,7 +543,7 @@ class ModeratorActions(AbstractActions):
     def modmail(self, rule, value):
         subject = "BetterAutoModerator notification"
         if 'modmail_subject' in rule.config:
-            subject = ModeratorPlaceholders.replace(rule.config['modmail_subject'], self.item, self.moderator)
+            subject = self.moderator.render(rule, 'modmail_subject', self.item)
 
         message = """%s
 
@@ -499,39 +555,39 @@ class ModeratorActions(AbstractActions):
 
     def action(self, rule, value):
         if 'action_reason' in rule.config and value != 'report':
-            print("Note: action_reason cannot be attached to rules enforced by BAM. Logging instead: %s" % rule.config['action_reason'])
+            logger.warning("Note: action_reason cannot be attached to rules enforced by BAM. Logging instead: %s", rule.config['action_reason'], extra={'rule': rule.label()})
 
         if value == 'approve':
-            if self.item.removed:
+            if resolve(self.item, 'removed', 'banned_by'):
                 return False
 
-            if self.item.approved and 'reports' not in rule.config:
+            if resolve(self.item, 'approved', 'approved_by') and 'reports' not in rule.config:
                 return False
 
-            print("Approving %s %s" % (type(self.item).__name__, self.item.id))
+            logger.debug("Approving %s %s", type(self.item).__name__, self.item.id)
             self.item.mod.approve()
             return True
 
         elif value == 'remove':
-            if self.item.approved:
+            if resolve(self.item, 'approved', 'approved_by'):
                 return False
 
-            print("Removing %s %s" % (type(self.item).__name__, self.item.id))
+            logger.debug("Removing %s %s", type(self.item).__name__, self.item.id)
             self.item.mod.remove()
             return True
 
         elif value == 'spam':
-            print("Marking %s %s as spam" % (type(self.item).__name__, self.item.id))
+            logger.debug("Marking %s %s as spam", type(self.item).__name__, self.item.id)
             self.item.mod.remove(spam=True)
             return True
 
         elif value == 'report':
-            print("Reporting %s %s" % (type(self.item).__name__, self.item.id))
+            logger.debug("Reporting %s %s", type(self.item).__name__, self.item.id)
             reason = None
             if 'report_reason' in rule.config:
-                reason = ModeratorPlaceholders.replace(rule.config['report_reason'], self.item, self.moderator)
+                reason = self.moderator.render(rule, 'report_reason', self.item)
             elif 'action_reason' in rule.config:
-                reason = ModeratorPlaceholders.replace(rule.config['action_reason'], self.item, self.moderator)
+                reason = self.moderator.render(rule, 'action_reason', self.item)
 
             self.item.report(reason)
             return True
@@ -540,20 +596,20 @@ class ModeratorActions(AbstractActions):
 
     def set_sticky(self, rule, value):
         if value:
-            print("Setting %s %s to sticky" % (type(self.item).__name__, self.item.id))
+            logger.debug("Setting %s %s to sticky", type(self.item).__name__, self.item.id)
             self.item.mod.distinguish("yes", sticky=True)
         else:
-            print("Setting %s %s to not sticky" % (type(self.item).__name__, self.item.id))
+            logger.debug("Setting %s %s to not sticky", type(self.item).__name__, self.item.id)
             self.item.mod.distinguish("no", sticky=False)
 
         return True
 
     def set_locked(self, rule, value):
         if value:
-            print("Locking %s %s" % (type(self.item).__name__, self.item.id))
+            logger.debug("Locking %s %s", type(self.item).__name__, self.item.id)
             self.item.mod.lock()
         else:
-            print("Unlocking %s %s" % (type(self.item).__name__, self.item.id))
+            logger.debug("Unlocking %s %s", type(self.item).__name__, self.item.id)
             self.item.mod.unlock()
 
         return True
@@ -564,7 +620,7 @@ class ModeratorAuthorActions(AbstractActions):
         flair_text = check.flair_text.__wrapped__(check, rule, [])
 
         if(flair_text is None or rule.config.get('overwrite_flair')):
-            print("Setting flair for user %s" % self.item.author.name)
+            logger.debug("Setting flair for user %s", self.item.author.name)
             if isinstance(value, str):
                 self.item.subreddit.flair.set(self.item.author, text=value)
                 return True
@@ -586,33 +642,24 @@ class ModeratorPlaceholders():
         if not isinstance(val, str):
             return val
 
-        # Find anything like {{word}} in the string
-        matches = re.findall(r'{{(.*?)}}', val)
-        if len(matches) == 0:
-            return val
-
-        replaced = val
-        for group in matches:
-            inject = None
-            if group[:5] == 'match':
-                key = group[6:]
-                if key == '':
-                    key = None
-                inject = cls.match(mod, key=key)
-            elif hasattr(cls, group): # If a placeholder exists, use it!
-                inject = getattr(cls, group)(item)
+        # Templates are compiled (and cached) once, anything like {{word}} is resolved on render
+        return compile_template(val).render(cls, item, mod)
 
-            if inject is not None:
-                replaced = replaced.replace("{{%s}}" % group, inject)
+    # Templates bind their placeholders to these resolvers once, so rendering skips the name lookup
+    @classmethod
+    def match_resolver(cls, key):
+        return lambda item, mod: cls.match(mod, key=key)
 
-        return replaced
+    @staticmethod
+    def item_resolver(placeholder):
+        return lambda item, mod: placeholder(item)
 
     @staticmethod
     def match(mod, key=None):
         if key is None:
             if len(mod.matches.keys()) == 0:
                 return None
-            key = mod.matches.keys()[0]
+            key = next(iter(mod.matches.keys()))
 
         if key in mod.matches:
             return mod.matches[key]
@@ -625,16 +672,28 @@ class ModeratorPlaceholders():
 
     @staticmethod
     def author_flair_text(item):
+        flair = author_flair(item, 'flair_text')
+        if flair is not missing:
+            return flair
+
         return next(item.subreddit.flair(item.author.name))['flair_text']
 
     @staticmethod
     def author_flair_css_class(item):
+        flair = author_flair(item, 'flair_css_class')
+        if flair is not missing:
+            return flair
+
         return next(item.subreddit.flair(item.author.name))['flair_css_class']
 
     @staticmethod
     def author_flair_template_id(item):
+        flair = author_flair(item, 'flair_template_id')
+        if flair is not missing:
+            return flair or ''
+
         url = "r/%s/api/flairselector?name=%s" % (item.subreddit.name, item.author.name)
-        flair = reddit.post(url)['current']
+        flair = item._reddit.post(url)['current']
         if 'flair_template_id' in flair:
             return flair['flair_template_id']
         else:
@@ -645,7 +704,7 @@ class ModeratorPlaceholders():
         if hasattr(item, 'body'):
             return item.body
         elif hasattr(item, 'crosspost_parent'):
-            return reddit.submission(item.crosspost_parent.split('_')[1]).selftext
+            return item._reddit.submission(item.crosspost_parent.split('_')[1]).selftext
         elif hasattr(item, 'selftext'):
             return item.body
 
@@ -665,6 +724,8 @@ class ModeratorPlaceholders():
             return 'comment'
         elif isinstance(item, praw.models.SubredditMessage):
             return 'modmail'
+        elif isinstance(item, (Snapshot, CompactItem)):
+            return item.kind
 
         return None
 
@@ -0,0 +1,75 @@
+from functools import cached_property
+from better_auto_moderator.moderators.moderator import Moderator, AbstractChecks, AbstractActions, ModeratorChecks, ModeratorActions, comparator
+from better_auto_moderator.log import logger
+
+# Rules with `type: modmail` run on each new modmail message
+class ModmailModerator(Moderator):
+    @cached_property
+    def actions(self):
+        return ModmailModeratorActions(self)
+
+    @cached_property
+    def checks(self):
+        return ModmailModeratorChecks(self)
+
+    # Messages aren't removed, so moderators are only exempt when a rule says so
+    def are_moderators_exempt(self, rule):
+        exempt = False
+        if 'moderators_exempt' in rule.config:
+            exempt = rule.config['moderators_exempt']
+
+        return exempt
+
+class ModmailModeratorChecks(AbstractChecks):
+    # The checks every item has that make sense for a message
+    id = ModeratorChecks.id
+    body = ModeratorChecks.body
+    body_longer_than = ModeratorChecks.body_longer_than
+    body_shorter_than = ModeratorChecks.body_shorter_than
+    _author_checks = ModeratorChecks._author_checks
+    author = ModeratorChecks.author
+
+    @comparator(default='includes-word')
+    def subject(self, rule, options):
+        return self.item.subject
+
+    @comparator(default='bool')
+    def is_internal(self, rule, options):
+        return self.item.is_internal
+
+class ModmailModeratorActions(AbstractActions):
+    log = ModeratorActions.log
+    _author_actions = ModeratorActions._author_actions
+    author = ModeratorActions.author
+
+    # Reply in the conversation. `comment_internal: true` makes it a private moderator note instead
+    def comment(self, rule, value):
+        logger.debug("Replying to modmail conversation %s", self.item.conversation_id)
+        self.item.conversation.reply(body=value, internal=bool(rule.config.get('comment_internal')))
+        return True
+
+    def archive(self, rule, value):
+        if value:
+            logger.debug("Archiving modmail conversation %s", self.item.conversation_id)
+            self.item.conversation.archive()
+            return True
+
+        return False
+
+    def highlight(self, rule, value):
+        if value:
+            logger.debug("Highlighting modmail conversation %s", self.item.conversation_id)
+            self.item.conversation.highlight()
+            return True
+
+        return False
+
+    # `mute: true` mutes the user for 3 days, or set it to 7 or 28 days
+    def mute(self, rule, value):
+        if value:
+            days = value if value in (3, 7, 28) else 3
+            logger.debug("Muting the user in modmail conversation %s for %d days", self.item.conversation_id, days)
+            self.item.conversation.mute(num_days=days)
+            return True
+
+        return False
@@ -1,8 +1,8 @@
 import re
 from functools import cached_property
 from better_auto_moderator.moderators.moderator import Moderator, ModeratorChecks, ModeratorActions, AbstractChecks, comparator, ModeratorPlaceholders
-from better_auto_moderator.reddit import reddit
-from better_auto_moderator.rule import Rule
+from better_auto_moderator.moderators.moderator import ModeratorAuthorChecks, ModeratorAuthorActions
+from better_auto_moderator.log import logger
 
 class PostModerator(Moderator):
     @cached_property
@@ -22,28 +22,33 @@ class PostModerator(Moderator):
         return cls.ends_with(value, domain, options)
 
 class PostModeratorChecks(ModeratorChecks):
+    @cached_property
+    def _crosspost_author_checks(self):
+        author_checks = ModeratorAuthorChecks(self.moderator)
+        author_checks.item = self.item._reddit.submission(self.item.crosspost_parent.split('_')[1])
+        return author_checks
+
+    @cached_property
+    def _crosspost_subreddit_checks(self):
+        return ModeratorCrosspostSubredditChecks(self.moderator)
+
     def crosspost_author(self, value, rule, options):
         if not hasattr(self.item, 'crosspost_parent'):
             return None
 
-        author_checks = ModeratorAuthorChecks(self.moderator)
-        author_checks.item = reddit.submission(self.item.crosspost_parent.split('_')[1])
-        author_rule = Rule(value)
-        return self.moderator.check(author_rule, checks=author_checks)
+        return self.moderator.check(rule.sub_rule(value), checks=self._crosspost_author_checks)
 
     def crosspost_subreddit(self, value, rule, options):
         if not hasattr(self.item, 'crosspost_parent'):
             return None
 
-        sub_checks = ModeratorCrosspostSubredditChecks(self.moderator)
-        sub_rule = Rule(value)
-        return self.moderator.check(sub_rule, checks=sub_checks)
+        return self.moderator.check(rule.sub_rule(value), checks=self._crosspost_subreddit_checks)
 
     @comparator(default='includes-word')
     def body(self,rule, options):
         body = ""
         if hasattr(self.item, 'crosspost_parent'):
-            body = reddit.submission(self.item.crosspost_parent.split('_')[1]).selftext
+            body = self.item._reddit.submission(self.item.crosspost_parent.split('_')[1]).selftext
         else:
             body = self.item.selftext
 
@@ -61,7 +66,7 @@ class PostModeratorChecks(ModeratorChecks):
     @comparator(default='domain')
     def domain(self, rule, options):
         if hasattr(self.item, 'crosspost_parent'):
-            return reddit.submission(self.item.crosspost_parent.split('_')[1]).domain
+            return self.item._reddit.submission(self.item.crosspost_parent.split('_')[1]).domain
 
         return self.item.domain
 
@@ -106,7 +111,7 @@ class PostModeratorChecks(ModeratorChecks):
     @comparator(default='includes-word', skip_if=None)
     def crosspost_title(self, rule, options):
         if hasattr(self.item, 'crosspost_parent'):
-            return reddit.submission(self.item.crosspost_parent.split('_')[1]).title
+            return self.item._reddit.submission(self.item.crosspost_parent.split('_')[1]).title
         else:
             return None
 
@@ -166,7 +171,7 @@ class PostModeratorChecks(ModeratorChecks):
 class ModeratorCrosspostSubredditChecks(AbstractChecks):
     @cached_property
     def parent(self):
-        return reddit.submission(self.item.crosspost_parent.split('_')[1])
+        return self.item._reddit.submission(self.item.crosspost_parent.split('_')[1])
 
     @comparator(default='includes-word')
     def name(self, rule, options):
@@ -177,18 +182,21 @@ class ModeratorCrosspostSubredditChecks(AbstractChecks):
         return self.parent.subreddit.over18
 
 class PostModeratorActions(ModeratorActions):
+    @cached_property
+    def _crosspost_author_actions(self):
+        author_actions = ModeratorAuthorActions(self.moderator)
+        author_actions.item = self.item._reddit.submission(self.item.crosspost_parent.split('_')[1])
+        return author_actions
+
     def crosspost_author(self, rule, value):
         if not hasattr(self.item, 'crosspost_parent'):
             return None
 
-        author_actions = ModeratorAuthorActions(self.moderator)
-        author_actions.item = reddit.submission(self.item.crosspost_parent.split('_')[1])
-        author_rule = Rule(value)
-        return self.moderator.action(author_rule, actions=author_actions)
+        return self.moderator.action(rule.sub_rule(value), actions=self._crosspost_author_actions)
 
     def set_flair(self, rule, value):
         if(self.item.link_flair_text is None or rule.config.get('overwrite_flair')):
-            print("Setting flair for user %s" % self.item.author.name)
+            logger.debug("Setting flair for user %s", self.item.author.name)
             if isinstance(value, str):
                 self.item.mod.flair(text=value)
                 return True
@@ -206,40 +214,40 @@ class PostModeratorActions(ModeratorActions):
 
     def set_nsfw(self, rule, value):
         if value:
-            print("Setting %s %s as nsfw" % (type(self.item).__name__, self.item.id))
+            logger.debug("Setting %s %s as nsfw", type(self.item).__name__, self.item.id)
             self.item.mod.nsfw()
         else:
-            print("Setting %s %s as sfw" % (type(self.item).__name__, self.item.id))
+            logger.debug("Setting %s %s as sfw", type(self.item).__name__, self.item.id)
             self.item.mod.sfw()
 
         return True
 
     def set_spoiler(self, rule, value):
         if value:
-            print("Setting %s %s as spoiler" % (type(self.item).__name__, self.item.id))
+            logger.debug("Setting %s %s as spoiler", type(self.item).__name__, self.item.id)
             self.item.mod.spoiler()
         else:
-            print("Removing spoiler tag from %s %s" % (type(self.item).__name__, self.item.id))
+            logger.debug("Removing spoiler tag from %s %s", type(self.item).__name__, self.item.id)
             self.item.mod.unspoiler()
 
         return True
 
     def set_contest_mode(self, rule, value):
-        print("Setting contest mode on %s %s" % (type(self.item).__name__, self.item.id))
+        logger.debug("Setting contest mode on %s %s", type(self.item).__name__, self.item.id)
         self.item.mod.contest_mode((value is True))
         return True
 
     def set_original_content(self, rule, value):
         if value:
-            print("Setting %s %s as original content" % (type(self.item).__name__, self.item.id))
+            logger.debug("Setting %s %s as original content", type(self.item).__name__, self.item.id)
             self.item.mod.set_original_content()
         else:
-            print("Unsetting %s %s as original content" % (type(self.item).__name__, self.item.id))
+            logger.debug("Unsetting %s %s as original content", type(self.item).__name__, self.item.id)
             self.item.mod.unset_original_content()
 
         return True
 
     def set_suggested_sort(self, rule, value):
-        print("Setting suggested sort on %s %s to %s" % (type(self.item).__name__, self.item.id, rule.config['set_suggested_sort']))
+        logger.debug("Setting suggested sort on %s %s to %s", type(self.item).__name__, self.item.id, rule.config['set_suggested_sort'])
         self.item.mod.suggested_sort(value)
         return True
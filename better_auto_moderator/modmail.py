@@ -0,0 +1,110 @@
+from datetime import datetime
+from time import time
+from better_auto_moderator.compact import CompactModmailMessage
+from better_auto_moderator.log import logger
+
+# Modmail comes as conversations, listed most recently updated first, each with the time of its last
+# message. The modmail stream's checkpoint is the last update it's read, so each poll only reads the
+# conversations updated since (paging back, up to `limit` of them, until it reaches the checkpoint),
+# and only yields their messages from since then. Conversations come with their messages when there
+# are only a few; longer ones are fetched, once per update.
+
+def timestamp(iso):
+    return datetime.fromisoformat(iso).timestamp()
+
+# A message as an item for rules, with what it needs from its conversation
+def message_item(conversation, message):
+    data = vars(conversation)
+    return CompactModmailMessage(conversation._reddit, {
+        'id': message.id,
+        'name': "modmail_%s" % message.id,
+        'body': message.body_markdown,
+        'subject': data.get('subject'),
+        'author': message.author,
+        'subreddit': data.get('owner'),
+        'created_utc': timestamp(message.date),
+        'is_internal': message.is_internal,
+        'conversation_id': conversation.id
+    }, conversation)
+
+class ModmailStream:
+    # `names` are the subreddits whose modmail to read. Messages from `ignore_author` (our own
+    # replies) are skipped, so a rule can't keep answering itself
+    def __init__(self, name, reddit, names, checkpoints, interval=15, limit=1000, ignore_author=None):
+        self.name = name
+        self.reddit = reddit
+        self.names = names
+        self.checkpoints = checkpoints
+        self.interval = interval
+        self.limit = limit
+        self.ignore_author = (ignore_author or '').lower()
+        self.polled_at = 0
+
+    # Most recently updated first. Pages are only fetched as they're read
+    def conversations(self):
+        modmail = self.reddit.subreddit(self.names[0]).modmail
+        return modmail.conversations(other_subreddits=self.names[1:], sort='recent', state='all', limit=self.limit)
+
+    # New messages, oldest conversation first, as (conversation id, when it was updated, messages)
+    def poll(self):
+        self.polled_at = time()
+        cursor = self.checkpoints.get(self.name)
+        since = cursor[1] if cursor is not None else None
+
+        # Like the other streams, the first time modmail is read we only start from what's there
+        if since is None:
+            latest = next(iter(self.conversations()), None)
+            if latest is None:
+                self.checkpoints.update(self.name, '', time())
+            else:
+                self.checkpoints.update(self.name, latest.id, timestamp(vars(latest)['last_updated']))
+            self.checkpoints.flush()
+            return []
+
+        updated = []
+        reached = False
+        for conversation in self.conversations():
+            updated_at = timestamp(vars(conversation)['last_updated'])
+            if updated_at <= since:
+                reached = True
+                break
+            updated.append((updated_at, conversation))
+
+        # If we ran out of conversations before reaching the checkpoint, anything older is a gap we accept
+        if not reached and len(updated) >= self.limit:
+            logger.info("Stream %s is more than %d conversations behind its checkpoint, older updates are skipped", self.name, self.limit)
+
+        fetched = 0
+        changes = []
+        for updated_at, conversation in reversed(updated):
+            messages = vars(conversation).get('messages')
+            if messages is None:
+                # Not all of its messages came with the listing
+                messages = conversation.messages
+                fetched += 1
+
+            items = []
+            for message in messages:
+                if timestamp(message.date) <= since:
+                    continue
+                if message.author is not None and str(message.author).lower() == self.ignore_author:
+                    continue
+                items.append(message_item(conversation, message))
+            changes.append((conversation.id, updated_at, items))
+
+        if len(updated) > 0:
+            logger.debug("Read %d updated modmail conversations, fetching %d", len(updated), fetched,
+                extra={'stream': self.name, 'conversations': len(updated), 'fetched': fetched})
+        return changes
+
+    # Yields new messages, and None whenever there's nothing more for now, like a praw stream with
+    # `pause_after=-1`. Conversations are checkpointed once the caller has asked for the next item
+    # after their messages, and written to disk when the caller comes back after a pause
+    def stream(self):
+        while True:
+            if time() - self.polled_at >= self.interval:
+                for id, updated_at, items in self.poll():
+                    yield from items
+                    self.checkpoints.update(self.name, id, updated_at)
+            yield None
+            self.checkpoints.flush()
@@ -0,0 +1,130 @@
+import json
+import sqlite3
+from time import time
+from better_auto_moderator.listing import listing_data
+from better_auto_moderator.log import logger
+
+# praw's streams only yield items they haven't seen before, so an item that was already in the
+# modqueue never comes back through when it's reported again, and rules like `reports: 5` never see
+# it reach 5. Instead, the modqueue is scanned every so often and compared with what it looked like
+# last time, and only items that are new to the queue, or whose reports have changed, are yielded.
+
+# What an item's reports look like: how many, and for what. Read from the listing, so it never fetches
+def report_state(item):
+    data = listing_data(item)
+    user_reports = sorted([list(map(str, report)) for report in data.get('user_reports') or []])
+    mod_reports = sorted([list(map(str, report)) for report in data.get('mod_reports') or []])
+    return json.dumps([data.get('num_reports'), user_reports, mod_reports], separators=(',', ':'))
+
+class ModqueueState:
+    # The report state of each item in each modqueue as of its last scan, in a local SQLite file (the
+    # checkpoints' file, by default), so a restart only picks up what's changed since
+    def __init__(self, path):
+        self.path = path
+        self._db = None
+
+    @property
+    def db(self):
+        # Connect lazily, so importing BAM doesn't create a state file
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, timeout=30)
+            self._db.execute("""CREATE TABLE IF NOT EXISTS modqueue_items (
+                queue TEXT NOT NULL,
+                fullname TEXT NOT NULL,
+                reports TEXT NOT NULL,
+                PRIMARY KEY (queue, fullname)
+            )""")
+            self._db.execute("""CREATE TABLE IF NOT EXISTS modqueue_scans (
+                queue TEXT PRIMARY KEY,
+                scanned_at REAL NOT NULL
+            )""")
+            self._db.commit()
+        return self._db
+
+    # Each item's report state as of the queue's last scan, or None if it's never been scanned
+    def load(self, queue):
+        if self.db.execute("SELECT 1 FROM modqueue_scans WHERE queue = ?", (queue,)).fetchone() is None:
+            return None
+
+        return dict(self.db.execute("SELECT fullname, reports FROM modqueue_items WHERE queue = ?", (queue,)).fetchall())
+
+    def save(self, queue, changed, removed):
+        self.db.executemany("INSERT OR REPLACE INTO modqueue_items (queue, fullname, reports) VALUES (?, ?, ?)",
+            [(queue, fullname, reports) for fullname, reports in changed.items()])
+        self.db.executemany("DELETE FROM modqueue_items WHERE queue = ? AND fullname = ?", [(queue, fullname) for fullname in removed])
+        self.db.execute("INSERT OR REPLACE INTO modqueue_scans (queue, scanned_at) VALUES (?, ?)", (queue, time()))
+        self.db.commit()
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+class ModqueueTracker:
+    # Scans `listing` (like subreddit.mod.modqueue) at most every `interval` seconds. Like praw's
+    # streams, the very first scan of a queue only takes note of what's already in it. What's been
+    # scanned is only saved (see `save`) once the items that changed have been evaluated, so a
+    # restart in between scans them again instead of losing them
+    def __init__(self, name, listing, state, interval=30):
+        self.name = name
+        self.listing = listing
+        self.state = state
+        self.interval = interval
+        self.known = None
+        self.scanned_at = 0
+        # Report states scanned since the last save, and items that have left the queue since
+        self.changed = {}
+        self.removed = set()
+        self.unsaved = False
+
+    # The items that are new to the queue, or whose reports have changed, oldest first
+    def scan(self):
+        if self.known is None:
+            self.known = self.state.load(self.name)
+        first = self.known is None
+        known = self.known or {}
+
+        current = {}
+        changed = []
+        for item in self.listing(limit=None):
+            reports = report_state(item)
+            current[item.fullname] = reports
+            if known.get(item.fullname) != reports:
+                changed.append(item)
+        removed = [fullname for fullname in known if fullname not in current]
+
+        for fullname in removed:
+            self.changed.pop(fullname, None)
+            self.removed.add(fullname)
+        for item in changed:
+            self.changed[item.fullname] = current[item.fullname]
+            self.removed.discard(item.fullname)
+        self.unsaved = True
+        self.known = current
+        self.scanned_at = time()
+        logger.debug("Scanned the %s modqueue: %d items, %d changed, %d gone", self.name, len(current), len(changed), len(removed),
+            extra={'stream': self.name, 'items': len(current), 'changed': len(changed), 'removed': len(removed)})
+
+        if first:
+            return []
+
+        # The queue is listed newest first
+        changed.reverse()
+        return changed
+
+    def save(self):
+        if self.unsaved:
+            self.state.save(self.name, self.changed, self.removed)
+            self.changed = {}
+            self.removed = set()
+            self.unsaved = False
+
+    # Yields changed items, and None whenever there's nothing more for now, like a praw stream with
+    # `pause_after=-1`. Like checkpoints, scans are saved when the caller comes back after a pause,
+    # by which time it's evaluated the items it batched up before it
+    def stream(self):
+        while True:
+            if time() - self.scanned_at >= self.interval:
+                yield from self.scan()
+            yield None
+            self.save()
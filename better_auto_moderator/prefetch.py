@@ -0,0 +1,102 @@
+import re
+from better_auto_moderator.reddit import reddit
+from better_auto_moderator.listing import listing_data
+from better_auto_moderator.metrics import prefetched
+
+# Checks that need the author's profile, which isn't in the listing
+profile_checks = ['comment_karma', 'post_karma', 'combined_karma', 'account_age']
+
+# The check names used by a rule's config (or a sub-group of it), with their values.
+# `~body+title (regex)` uses both body and title
+def check_names(config):
+    for key, value in config.items():
+        name = re.sub(r'\s*\(.*\)$', '', key).lstrip('~')
+        for part in name.split('+'):
+            yield part, value
+
+# Work out, from the rules, what every item is going to need beyond its listing data:
+#   author:     the author's profile (karma and account age)
+#   submission: the submission a comment is on
+#   parent:     the comment a comment replied to
+def plan(rules):
+    needs = set()
+    for rule in rules:
+        for name, value in check_names(rule.config):
+            if name == 'author' and isinstance(value, dict):
+                if any(check in profile_checks for check, _ in check_names(value)):
+                    needs.add('author')
+            elif name == 'parent_submission':
+                needs.add('submission')
+            elif name == 'parent_comment':
+                needs.add('parent')
+
+    return needs
+
+def chunks(values, size):
+    for start in range(0, len(values), size):
+        yield values[start : start + size]
+
+class Prefetcher:
+    # Fetches what a batch of items will need, a hundred at a time, before any rules are run. Without
+    # this, each item discovers what it needs one lazy attribute (and one request) at a time
+    def __init__(self, needs, client=None, batch_size=100):
+        self.needs = needs
+        self.client = client or reddit
+        self.batch_size = batch_size
+
+    def prefetch(self, items):
+        if len(items) == 0:
+            return
+
+        # One after the other, since they share a client, and praw isn't thread-safe
+        if 'author' in self.needs:
+            self.authors(items)
+        if 'submission' in self.needs or 'parent' in self.needs:
+            self.parents(items)
+
+    def authors(self, items):
+        by_fullname = {}
+        for item in items:
+            data = listing_data(item)
+            author = data.get('author')
+            fullname = data.get('author_fullname')
+            if author is None or fullname is None or 'comment_karma' in listing_data(author):
+                continue
+            by_fullname.setdefault(fullname, []).append(author)
+
+        for fullnames in chunks(list(by_fullname.keys()), self.batch_size):
+            profiles = self.client.get('/api/user_data_by_account_ids', params={'ids': ','.join(fullnames)})
+            for fullname, profile in profiles.items():
+                for author in by_fullname.get(fullname, []):
+                    # Straight into the attributes praw reads from, as if they'd come from the author's profile
+                    vars(author).update({
+                        'id': fullname.split('_', 1)[1],
+                        'created_utc': profile['created_utc'],
+                        'link_karma': profile['link_karma'],
+                        'comment_karma': profile['comment_karma']
+                    })
+            prefetched.inc(len(profiles), enrichment='author')
+
+    def parents(self, items):
+        comments = [item for item in items if 'link_id' in listing_data(item)]
+        wanted = set()
+        for comment in comments:
+            data = listing_data(comment)
+            if 'submission' in self.needs and comment._submission is None:
+                wanted.add(data['link_id'])
+            if 'parent' in self.needs and data.get('parent_id', '').startswith('t1_'):
+                wanted.add(data['parent_id'])
+
+        fetched = {}
+        for fullnames in chunks(sorted(wanted), self.batch_size):
+            for thing in self.client.info(fullnames=fullnames):
+                fetched[thing.fullname] = thing
+        prefetched.inc(len(fetched), enrichment='parent')
+
+        # Hand them to praw where it looks for them: a comment's submission, and the comments on that submission
+        for comment in comments:
+            data = listing_data(comment)
+            if data['link_id'] in fetched and comment._submission is None:
+                comment._submission = fetched[data['link_id']]
+            if data.get('parent_id') in fetched and data['parent_id'].startswith('t1_'):
+                comment.submission._comments_by_id[data['parent_id']] = fetched[data['parent_id']]
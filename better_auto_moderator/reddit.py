@@ -1,21 +1,149 @@
+import re
 import praw
 from os import environ
+from praw.models.util import stream_generator
+from better_auto_moderator.checkpoint import CheckpointStore
+from better_auto_moderator.modqueue import ModqueueState, ModqueueTracker
+from better_auto_moderator.modmail import ModmailStream
+from better_auto_moderator.metrics import InstrumentedRequestor
+from better_auto_moderator.log import logger
 
-reddit = praw.Reddit(client_id=environ.get('REDDIT_CLIENT_ID'),
-                     client_secret=environ.get('REDDIT_CLIENT_SECRET'),
-                     user_agent="ATS Dev",
-                     username=environ.get('REDDIT_USERNAME'),
-                     password=environ.get('REDDIT_PASSWORD'))
-subreddit = reddit.subreddit(environ.get('REDDIT_SUBREDDIT'))
+# BAM_REDDIT_URL points BAM at a stand-in for reddit, like benchmarks/fake_reddit.py, for both
+# logging in and the API. praw only reads these from praw.ini, or from here
+endpoints = {}
+if environ.get('BAM_REDDIT_URL'):
+    endpoints = {'oauth_url': environ['BAM_REDDIT_URL'], 'reddit_url': environ['BAM_REDDIT_URL']}
 
-def update_automod_config(new_yaml):
-    print("Updating automod config...")
-    subreddit.wiki["config/automoderator"].edit(new_yaml, "BetterAutoModerator push")
+# praw isn't thread-safe, so threads that talk to reddit side by side each need a client of their own
+def client():
+    return praw.Reddit(client_id=environ.get('REDDIT_CLIENT_ID'),
+                       client_secret=environ.get('REDDIT_CLIENT_SECRET'),
+                       user_agent="ATS Dev",
+                       username=environ.get('REDDIT_USERNAME'),
+                       password=environ.get('REDDIT_PASSWORD'),
+                       requestor_class=InstrumentedRequestor,
+                       **endpoints)
 
-def comment_edit_stream(pause_after=-1):
-    edited = subreddit.mod.edited
-    return praw.models.util.stream_generator(edited, pause_after=pause_after, only="comments", skip_existing=True)
+reddit = client()
+# REDDIT_SUBREDDIT can list several subreddits, like `a+b+c`. `subreddit` is all of them as one:
+# listings on a combined subreddit cover every one of them in a single request
+subreddit_names = [name for name in re.split(r'[+,\s]+', environ.get('REDDIT_SUBREDDIT') or '') if name]
+subreddit = reddit.subreddit('+'.join(subreddit_names))
+# And each of them on their own, for what can't be combined, like wiki pages. Keyed by lowercased name
+subreddits = dict([(name.lower(), reddit.subreddit(name)) for name in subreddit_names])
 
-def post_edit_stream(pause_after=-1):
-    edited = subreddit.mod.edited
-    return praw.models.util.stream_generator(edited, pause_after=pause_after, only="submissions", skip_existing=True)
+# Stream cursors, so restarts catch up on what was posted while we were down instead of skipping it
+checkpoints = CheckpointStore(environ.get('BAM_STATE_PATH', 'bam_state.sqlite3'))
+# The most items a stream will page back through when catching up from its checkpoint
+backfill_limit = int(environ.get('BAM_BACKFILL_LIMIT', 1000))
+# What each modqueue looked like when it was last scanned, and how often to scan it
+modqueue_state = ModqueueState(environ.get('BAM_STATE_PATH', 'bam_state.sqlite3'))
+modqueue_interval = int(environ.get('BAM_MODQUEUE_INTERVAL', 30))
+# How often to check modmail for new messages
+modmail_interval = int(environ.get('BAM_MODMAIL_INTERVAL', 15))
+
+def update_automod_config(new_yaml, sub=None):
+    sub = sub or subreddit
+    logger.info("Updating automod config for r/%s...", sub.display_name)
+    sub.wiki["config/automoderator"].edit(new_yaml, "BetterAutoModerator push")
+
+def created_at(item):
+    return item.created_utc
+
+def edited_at(item):
+    return item.edited or item.created_utc
+
+# Stream `function` (a listing, like subreddit.new), resuming from the stream's checkpoint.
+# On the first ever run there's nothing to resume, so we skip existing items like praw does.
+# Otherwise we page back (up to backfill_limit items) until we reach the checkpointed item, replay
+# everything newer oldest-first, and then carry on streaming. `timestamp` reads the time the
+# listing is ordered by; pass None for listings that aren't ordered by time, like the modqueue.
+def checkpointed_stream(name, function, timestamp=created_at, pause_after=-1, **kwargs):
+    cursor = checkpoints.get(name)
+    if cursor is None:
+        stream = stream_generator(function, pause_after=pause_after, skip_existing=True, **kwargs)
+        yield from record_progress(name, stream, timestamp)
+        return
+
+    fullname, since = cursor
+    backlog = []
+    for item in function(limit=backfill_limit, **kwargs):
+        if item.fullname == fullname:
+            break
+        if since is not None and timestamp is not None and timestamp(item) < since:
+            break
+        backlog.append(item)
+
+    if len(backlog) > 0:
+        logger.info("Catching up on %d items from %s stream", len(backlog), name)
+
+    # If we ran out of backfill before reaching the checkpoint, anything older is a gap we accept
+    if len(backlog) >= backfill_limit and timestamp is not None:
+        logger.info("Stream %s is more than %d items behind its checkpoint, older items are skipped", name, backfill_limit)
+        since = timestamp(backlog[-1])
+
+    # The backlog's progress is written out with the live stream's, at its first pause
+    yield from record_progress(name, reversed(backlog), timestamp)
+
+    # The first page of the live stream overlaps with what we just caught up on
+    seen = set([item.fullname for item in backlog])
+    seen.add(fullname)
+    stream = stream_generator(function, pause_after=pause_after, skip_existing=False, **kwargs)
+    for item in record_progress(name, stream, timestamp):
+        if item is None:
+            seen = None
+        elif seen is not None:
+            if item.fullname in seen:
+                continue
+            if since is not None and timestamp is not None and timestamp(item) < since:
+                continue
+
+        yield item
+
+# Items are checkpointed once the caller asks for the next one, which means they were processed.
+# Checkpoints are written to disk when the caller comes back after a pause, so items it batched up
+# before the pause have been processed by then too.
+def record_progress(name, stream, timestamp):
+    for item in stream:
+        yield item
+
+        if item is None:
+            checkpoints.flush()
+        else:
+            checkpoints.update(name, item.fullname, None if timestamp is None else timestamp(item))
+
+# Streams over all of our subreddits keep plain checkpoint names. Streams over any other set of
+# subreddits get checkpoints of their own, named after them
+def checkpoint_name(name, sub=None):
+    if sub is None or sub is subreddit:
+        return name
+
+    return "%s/%s" % (sub.display_name.lower(), name)
+
+def submission_stream(pause_after=-1, sub=None):
+    sub = sub or subreddit
+    return checkpointed_stream(checkpoint_name('submissions', sub), sub.new, pause_after=pause_after)
+
+def comment_stream(pause_after=-1, sub=None):
+    sub = sub or subreddit
+    return checkpointed_stream(checkpoint_name('comments', sub), sub.comments, pause_after=pause_after)
+
+# Items that are new to the modqueue, or have been reported again. The modqueue is always scanned
+# in full, so there's no checkpoint to catch up from: the first scan after a restart catches up
+def modqueue_stream(pause_after=-1, sub=None):
+    sub = sub or subreddit
+    return ModqueueTracker(checkpoint_name('modqueue', sub), sub.mod.modqueue, modqueue_state, modqueue_interval).stream()
+
+# New modmail messages, other than our own, resuming from the stream's checkpoint
+def modmail_stream(pause_after=-1, sub=None):
+    sub = sub or subreddit
+    return ModmailStream(checkpoint_name('modmail', sub), reddit, sub.display_name.split('+'), checkpoints,
+        modmail_interval, limit=backfill_limit, ignore_author=environ.get('REDDIT_USERNAME')).stream()
+
+def comment_edit_stream(pause_after=-1, sub=None):
+    sub = sub or subreddit
+    return checkpointed_stream(checkpoint_name('comments_edited', sub), sub.mod.edited, timestamp=edited_at, pause_after=pause_after, only="comments")
+
+def post_edit_stream(pause_after=-1, sub=None):
+    sub = sub or subreddit
+    return checkpointed_stream(checkpoint_name('submissions_edited', sub), sub.mod.edited, timestamp=edited_at, pause_after=pause_after, only="submissions")
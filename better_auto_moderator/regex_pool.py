@@ -0,0 +1,113 @@
+import re
+import threading
+import multiprocessing
+from os import environ
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, TimeoutError, CancelledError
+from concurrent.futures.process import BrokenProcessPool
+from better_auto_moderator.metrics import regex_offloaded
+from better_auto_moderator.time_budget import remaining, OverBudget
+
+# `(regex)` checks compile their pattern once, and reuse it for every item
+@lru_cache(maxsize=1024)
+def compile_pattern(test):
+    return re.compile(test)
+
+# Whether any of `values` matches `pattern`, all of it (`full`) or anywhere in it. Runs in the pool,
+# where the pattern arrives pickled, and is compiled again (once, thanks to re's own cache)
+def match_any(pattern, values, full):
+    match = pattern.fullmatch if full else pattern.search
+    for value in values:
+        if match(value) is not None:
+            return True
+
+    return False
+
+# A multiprocessing context that remembers the processes it starts, so a pool's workers can be
+# stopped mid-regex (ProcessPoolExecutor can only shut down once its workers are idle)
+def tracking_context(processes):
+    base = multiprocessing.get_context()
+
+    class Process(base.Process):
+        def start(self):
+            super().start()
+            processes.append(self)
+
+    context = type(base)()
+    context.Process = Process
+    return context
+
+class RegexPool:
+    # Regexes hold the GIL while they run, so a slow pattern on a huge self-post stalls every thread
+    # in the process: prefetching, catching up, logging and metrics. Text at least `min_length` long
+    # is matched in a pool of processes instead, and the calling thread releases the GIL while it
+    # waits. Shorter text is matched in place, where it's cheaper than the trip to the pool.
+    def __init__(self, workers=0, min_length=10000):
+        self.workers = workers
+        self.min_length = min_length
+        self._pool = None
+        # The processes each pool has started
+        self.processes = {}
+        # Threads share the pool, and any of them may stop it and start another
+        self.lock = threading.RLock()
+
+    @property
+    def pool(self):
+        # Start the processes on first use, so importing BAM doesn't fork
+        with self.lock:
+            if self._pool is None:
+                processes = []
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=tracking_context(processes))
+                self.processes[self._pool] = processes
+            return self._pool
+
+    def match(self, test, values, full=False):
+        pattern = compile_pattern(test)
+        if self.workers > 0 and sum(len(value) for value in values) >= self.min_length:
+            regex_offloaded.inc()
+            # When another thread's regex runs out of time, the pool is stopped under this one too.
+            # Try again in the fresh pool, and if that goes the same way, match here after all
+            for attempt in range(2):
+                try:
+                    return self.offload(pattern, values, full)
+                except (BrokenProcessPool, CancelledError):
+                    continue
+
+        return match_any(pattern, values, full)
+
+    def offload(self, pattern, values, full):
+        # Unlike a regex in this process, one in the pool can be given up on when its check's time is up
+        timeout = remaining()
+        with self.lock:
+            pool = self.pool
+            future = pool.submit(match_any, pattern, values, full)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            self.kill(pool)
+            raise OverBudget('check', 'regex', timeout)
+
+    # Stop a pool's processes mid-regex (the current pool, by default). A fresh pool is started on next use
+    def kill(self, pool=None):
+        with self.lock:
+            pool = pool or self._pool
+            if pool is None:
+                return
+            if pool is self._pool:
+                self._pool = None
+            processes = self.processes.pop(pool, [])
+
+        # The pool sees its processes stop, and fails every match still waiting on it with
+        # BrokenProcessPool, queued or not. (Unlike `cancel_futures`, this works on Python 3.8 too)
+        for process in processes:
+            process.terminate()
+        pool.shutdown(wait=False)
+
+    def close(self):
+        with self.lock:
+            pool, self._pool = self._pool, None
+            self.processes.pop(pool, None)
+        if pool is not None:
+            pool.shutdown()
+
+regex_pool = RegexPool(int(environ.get('BAM_REGEX_WORKERS', 0)), int(environ.get('BAM_REGEX_MIN_LENGTH', 10000)))
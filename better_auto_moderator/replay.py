@@ -0,0 +1,148 @@
+import re
+import json
+import argparse
+import statistics
+from time import perf_counter
+from better_auto_moderator.rule import Rule
+from better_auto_moderator.snapshot import record, snapshot
+from better_auto_moderator.moderators.comment_moderator import CommentModerator
+from better_auto_moderator.moderators.modqueue_moderator import ModqueueModerator
+from better_auto_moderator.moderators.post_moderator import PostModerator
+
+# Record items to a JSON lines file, one snapshot per line. `source` is the stream the item came
+# from (submission, comment or modqueue), which decides which rules it's replayed against.
+def record_items(items, path, source):
+    count = 0
+    with open(path, 'a') as out:
+        for item in items:
+            data = record(item)
+            data['source'] = source
+            out.write(json.dumps(data) + "\n")
+            count += 1
+
+    return count
+
+def load_recording(path):
+    with open(path) as recording:
+        return [json.loads(line) for line in recording if line.strip()]
+
+class ReplayClient:
+    # Stands in for the praw Reddit instance while replaying: crosspost parents and selected flair
+    # are served from the recording, and every action is logged instead of sent to reddit
+    def __init__(self, recordings):
+        self.actions = []
+        self.current = None
+        self.submissions = {}
+        self.flair_templates = {}
+        for data in recordings:
+            if 'crosspost' in data:
+                self.submissions[data['crosspost']['id']] = data['crosspost']
+            for name, relations in data.get('subreddit', {}).get('users', {}).items():
+                self.flair_templates[name] = relations.get('flair_template_id', '')
+
+    def log(self, target, action, *args, **kwargs):
+        self.actions.append({
+            'item': self.current,
+            'target': str(target),
+            'action': action,
+            'args': [str(arg) for arg in args],
+            'kwargs': dict([(key, str(value)) for key, value in kwargs.items()])
+        })
+
+    def submission(self, id):
+        return snapshot(self.submissions[id], self)
+
+    def post(self, url):
+        name = re.search(r'name=(.*)$', url).group(1)
+        return {'current': {'flair_template_id': self.flair_templates.get(name, '')}}
+
+moderators = {
+    'submission': PostModerator,
+    'comment': CommentModerator,
+    'modqueue': ModqueueModerator
+}
+
+def percentile(values, percent):
+    if len(values) == 0:
+        return 0
+
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+# Feed recorded items through the moderators with no network, and report throughput, per-rule
+# latency and the actions that would have been taken
+def replay(recordings, rules):
+    client = ReplayClient(recordings)
+    rules_by_type = {}
+    for index, rule in enumerate(rules):
+        # Rules that didn't come from a wiki page are labelled by their place in `rules` instead
+        if rule.index is None:
+            rule.index = index
+        rules_by_type.setdefault(rule.type, []).append(rule)
+    for type in rules_by_type:
+        rules_by_type[type] = Rule.sort_rules(rules_by_type[type])
+
+    # Each item goes through its rules just like it would in app.py, which times every rule it runs
+    timings = {}
+    started_at = perf_counter()
+    for data in recordings:
+        source = data.get('source', data['kind'])
+        item = snapshot(data, client)
+        client.current = item.fullname
+        mod = moderators[source](item)
+        mod.moderate_all(rules_by_type.get(source, []))
+        for label, seconds in mod.timings.items():
+            timings.setdefault(label, []).append(seconds)
+    elapsed = perf_counter() - started_at
+
+    return {
+        'items': len(recordings),
+        'seconds': elapsed,
+        'items_per_second': len(recordings) / elapsed if elapsed > 0 else 0,
+        'rules': dict([(label, {
+            'evaluations': len(times),
+            'mean_ms': statistics.mean(times) * 1000,
+            'p50_ms': percentile(times, 50) * 1000,
+            'p99_ms': percentile(times, 99) * 1000
+        }) for label, times in timings.items()]),
+        'actions': client.actions
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Record items from reddit, or replay recorded items through BAM's rules offline")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = commands.add_parser('record', help="Record items from the live subreddit")
+    record_parser.add_argument('source', choices=['submission', 'comment', 'modqueue'])
+    record_parser.add_argument('output')
+    record_parser.add_argument('--limit', type=int, default=100)
+
+    replay_parser = commands.add_parser('replay', help="Replay a recording through a set of rules")
+    replay_parser.add_argument('recording')
+    replay_parser.add_argument('rules', help="A file in the same format as the better_auto_moderator/rules wiki page")
+    replay_parser.add_argument('config', nargs='?', help="A file in the same format as the better_auto_moderator wiki page")
+
+    args = parser.parse_args()
+    if args.command == 'record':
+        from better_auto_moderator.reddit import subreddit
+        listings = {
+            'submission': subreddit.new,
+            'comment': subreddit.comments,
+            'modqueue': subreddit.mod.modqueue
+        }
+        count = record_items(listings[args.source](limit=args.limit), args.output, args.source)
+        print("Recorded %d items to %s" % (count, args.output))
+    else:
+        from better_auto_moderator.config import parse_configs
+        with open(args.rules) as rules_file:
+            yaml_rules = rules_file.read()
+        yaml_config = ""
+        if args.config:
+            with open(args.config) as config_file:
+                yaml_config = config_file.read()
+
+        rules, config = parse_configs(yaml_rules, yaml_config)
+        print(json.dumps(replay(load_recording(args.recording), rules), indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+from itertools import zip_longest
+from better_auto_moderator.listing import subreddit_name
+
+# Streams read every subreddit we moderate at once, and each subreddit has its own rules. A stream's
+# `rules` are keyed by subreddit name, and items are routed to the rules for the subreddit they're in
+
+def rules_for(stream, item, key='rules'):
+    rules = stream.get(key) or []
+    # A stream over a single subreddit can just have a list of rules
+    if isinstance(rules, list):
+        return rules
+
+    return rules.get(subreddit_name(item), [])
+
+# Every rule a stream might run, across all of its subreddits
+def all_rules(stream_rules):
+    if isinstance(stream_rules, list):
+        return stream_rules
+
+    return [rule for rules in stream_rules.values() for rule in rules]
+
+# Interleave a batch of items by subreddit, taking one from each in turn, so a burst of activity in
+# one subreddit can't hold up moderation in the others
+def fair_order(items):
+    queues = {}
+    for item in items:
+        queues.setdefault(subreddit_name(item), []).append(item)
+
+    if len(queues) < 2:
+        return list(items)
+
+    return [item for turn in zip_longest(*queues.values()) for item in turn if item is not None]
@@ -1,31 +1,55 @@
+from types import MappingProxyType
 from better_auto_moderator.util import to_yaml_string
+from better_auto_moderator.template import compile_value
+from better_auto_moderator.threshold import parse_threshold, parse_time_threshold
+
+# Checks that take a threshold value, like `comment_karma: '> 100'`. These can be
+# combined with `satisfy_any_threshold`
+threshold_checks = [
+    'comment_karma',
+    'post_karma',
+    'combined_karma',
+    'account_age',
+    'satisfy_any_threshold']
 
 class Rule:
-    # We'll flip this to True whenever a rule uses options that are not supported
-    # by Automoderator. This flag is used for BAM to know which rules it should implement
-    requires_bam = False
+    # Large rule sets (and their groups, which are rules too) keep a lot of these around, so they
+    # only have room for what's set here. `__weakref__` lets time budgets track rules without keeping them alive
+    __slots__ = ('config', 'type', 'priority', 'requires_bam', 'index', 'templates', 'values', 'sub_rules', '__weakref__')
 
     def __init__(self, config, global_config={}):
-        self.raw = config
         self.config = {}
         self.type = 'any'
         self.priority = 0
+        # We'll flip this to True whenever a rule uses options that are not supported
+        # by Automoderator. This flag is used for BAM to know which rules it should implement
+        self.requires_bam = False
+        # Where this rule sits on the rules wiki page, set when the page is parsed
+        self.index = None
+        # Compiled placeholder templates, built once at load so evaluation doesn't re-scan strings.
+        # `templates` holds each config value as a whole (used by actions), `values` holds each
+        # value normalized to a list (used by checks)
+        self.templates = {}
+        self.values = {}
+        # Groups like `author: {...}` compiled into rules of their own, keyed by the id of the group's config
+        self.sub_rules = {}
 
         if not isinstance(config, dict):
+            self.config = MappingProxyType(self.config)
             return
 
-        # Create one-off methods for rules that require bam, but don't need anything else special
-        basic_bam_rules = ['log', 'is_banned']
-        for rule in basic_bam_rules:
-            setattr(self, "parse_"+rule, self.basic_bam_rule(rule))
+        self.parse(config, self.config, global_config)
+        # Rules are shared between threads (and compiled below), so their config is read-only once parsed
+        self.config = MappingProxyType(self.config)
+        self.compile()
 
-        self.parse(self.raw, self.config, global_config)
+    # How the rule is identified in metrics and logs: its position on the wiki page, and its name if it has one
+    def label(self):
+        name = self.config.get('name')
+        if self.index is None:
+            return name or 'unnamed'
 
-    def basic_bam_rule(self, key):
-        def parse(val, stored_configs):
-            stored_configs[key] = val
-            self.requires_bam = True
-        return parse
+        return "%d: %s" % (self.index, name) if name else str(self.index)
 
     @staticmethod
     def sort_rules(rules):
@@ -39,6 +63,36 @@ class Rule:
 
         return to_yaml_string(config)
 
+    def compile(self):
+        for key, value in self.config.items():
+            self.templates[key] = compile_value(value)
+            if isinstance(value, dict):
+                self.sub_rules[id(value)] = Rule(value)
+
+            values = value if isinstance(value, list) else [value]
+            self.values[key] = [compile_value(val) for val in values]
+
+            # Parse thresholds up front, so evaluating them is just a cached lookup. Bad values
+            # are left alone here, and will fail the same way they always have once evaluated
+            check_name = key.lstrip('~').split(' ')[0]
+            if check_name in threshold_checks and check_name != 'satisfy_any_threshold':
+                parse = parse_time_threshold if check_name == 'account_age' else parse_threshold
+                for val in values:
+                    try:
+                        parse(val)
+                    except (AttributeError, ValueError, TypeError):
+                        pass
+
+    # The compiled rule for a group's config, as passed to its check or action. Groups are compiled
+    # along with the rule they're in, so checking one is no more work than checking any other value
+    def sub_rule(self, value):
+        # Groups are kept alive by the rule's config, so their ids can't be reused while it's around
+        sub_rule = self.sub_rules.get(id(value))
+        if sub_rule is None:
+            return Rule(value)
+
+        return sub_rule
+
     def is_priority(self):
         if 'action' in self.config and self.config['action'] in ['remove', 'spam', 'filter']:
             return True
@@ -46,13 +100,12 @@ class Rule:
 
     def parse(self, config, stored_configs, global_config):
         for key in config.keys():
-            # This class has a bunch of parse_* methods that will be used to parse the rule
-            # For instance, if a rule has `type: submission`, that will be parsed by
-            # the `parse_type` function.
+            # Keys that need special handling have a parser in `parsers`. For instance, if a
+            # rule has `type: submission`, that will be parsed by the `parse_type` function.
             # If a parser doesn't exist, just add the line straight into the config
-            parser_name = "parse_%s" % key
-            if hasattr(self, parser_name):
-                getattr(self, parser_name)(config.get(key), stored_configs)
+            parser = self.parsers.get(key)
+            if parser is not None:
+                parser(self, key, config.get(key), stored_configs)
             elif isinstance(config.get(key), dict):
                 # Dictionaries are usually sub groups, and may include bam keys. Parse separately
                 stored_configs[key] = {}
@@ -93,20 +146,35 @@ class Rule:
 
             elif standard == 'crowdfunding sites':
                 config['domain'] = ['crowdrise.com', 'kickstarter.com', 'kck.st', 'giveforward.com', 'gogetfunding.com', 'indiegogo.com', 'igg.me', 'generosity.com', 'gofundme.com', 'patreon.com', 'prefundia.com', 'razoo.com', 'totalgiving.co.uk', 'youcaring.com', 'youcaring.net', 'youcaring.org', 'petcaring.com', 'walacea.com']
-    def parse_type(self, type, config):
+    def parse_type(self, key, type, config):
         self.type = type
 
         if type in ['modmail', 'report']:
             self.requires_bam = True
 
-    def parse_ignore_reports(self, val, configs):
+    def parse_ignore_reports(self, key, val, configs):
         if val:
             configs['ignore_reports'] = True
             self.requires_bam = True
 
-    def parse_priority(self, priority, config):
+    def parse_priority(self, key, priority, config):
         self.priority = priority
 
     # `bam: true` can be set in a rule to force it to be run by BAM. This is good for testing.
-    def parse_bam(self, value, config):
+    def parse_bam(self, key, value, config):
         self.requires_bam = value
+
+    # For rules that require bam, but don't need anything else special
+    def parse_bam_only(self, key, val, config):
+        config[key] = val
+        self.requires_bam = True
+
+# The parser for each key that needs one, looked up once per key rather than by name
+Rule.parsers = {
+    'type': Rule.parse_type,
+    'ignore_reports': Rule.parse_ignore_reports,
+    'priority': Rule.parse_priority,
+    'bam': Rule.parse_bam,
+    'log': Rule.parse_bam_only,
+    'is_banned': Rule.parse_bam_only
+}
@@ -0,0 +1,162 @@
+import json
+import sqlite3
+from collections import Counter, deque
+from time import time
+from better_auto_moderator.log import logger
+
+# Before big changes go live on `better_auto_moderator/rules`, they can be drafted on the
+# `better_auto_moderator/rules_draft` wiki page. With `shadow_rules` on, every item the live rules
+# evaluate is run through the draft rules too, as a dry run: the same (already prefetched) item,
+# with nothing done to it. What each set of rules would have done, and how long each rule took,
+# is compared in a report.
+
+# What a rule does, for comparing decisions: its `action`, or its other actions by name
+def decision(moderator, rule):
+    if rule is None:
+        return 'nothing'
+    if 'action' in rule.config:
+        return str(rule.config['action'])
+
+    return ', '.join(key for key in rule.config if hasattr(moderator.actions, key)) or 'nothing'
+
+class Timing:
+    def __init__(self):
+        self.items = 0
+        self.seconds = 0.0
+
+    def add(self, seconds):
+        self.items += 1
+        self.seconds += seconds
+
+    def average_ms(self):
+        return self.seconds * 1000 / self.items if self.items > 0 else 0
+
+class Shadow:
+    # Live and draft decisions for one subreddit's items, since the draft was last loaded
+    def __init__(self, samples=25):
+        self.started_at = time()
+        self.items = 0
+        self.agreed = 0
+        # How often each (live decision, draft decision) pair came up
+        self.decisions = Counter()
+        # The most recent items the two sets of rules disagreed on, as (item, live rule, draft rule)
+        self.differences = deque(maxlen=samples)
+        # Per-rule timings, keyed by rule label
+        self.timings = {'live': {}, 'draft': {}}
+
+    def record_timings(self, which, timings):
+        for label, seconds in timings.items():
+            self.timings[which].setdefault(label, Timing()).add(seconds)
+
+    # Run the draft rules over an item the live rules (`live`, a moderator that's already run) just
+    # evaluated. `live_rule` is the rule that took action, if any. Returns the draft rule that would have acted
+    def compare(self, moderator_class, item, rules, live, live_rule):
+        draft = moderator_class(item, dry_run=True)
+        draft_rule = draft.moderate_all(rules)
+
+        self.items += 1
+        self.record_timings('live', live.timings)
+        self.record_timings('draft', draft.timings)
+
+        decisions = (decision(live, live_rule), decision(draft, draft_rule))
+        self.decisions[decisions] += 1
+        if decisions[0] == decisions[1]:
+            self.agreed += 1
+        else:
+            self.differences.append((live.item_name(),
+                live_rule.label() if live_rule is not None else 'none',
+                draft_rule.label() if draft_rule is not None else 'none'))
+
+        return draft_rule
+
+    # What's been compared so far, as plain data, so each evaluator can hand in its share
+    def state(self):
+        return {
+            'started_at': self.started_at,
+            'items': self.items,
+            'agreed': self.agreed,
+            'decisions': [[live, draft, count] for (live, draft), count in self.decisions.items()],
+            'differences': [list(difference) for difference in self.differences],
+            'timings': dict((which, dict((label, [timing.items, timing.seconds]) for label, timing in timings.items()))
+                for which, timings in self.timings.items())
+        }
+
+    # Add another comparison's `state` into this one
+    def merge(self, state):
+        self.started_at = min(self.started_at, state['started_at'])
+        self.items += state['items']
+        self.agreed += state['agreed']
+        for live, draft, count in state['decisions']:
+            self.decisions[(live, draft)] += count
+        self.differences.extend(tuple(difference) for difference in state['differences'])
+        for which, timings in state['timings'].items():
+            for label, (items, seconds) in timings.items():
+                timing = self.timings[which].setdefault(label, Timing())
+                timing.items += items
+                timing.seconds += seconds
+
+    def log(self, subreddit=None):
+        logger.info("Draft rules agreed with the live rules on %d of %d items", self.agreed, self.items,
+            extra={'subreddit': subreddit, 'items': self.items, 'agreed': self.agreed})
+
+    # A markdown report, for the wiki
+    def report(self):
+        lines = ["# BAM shadow report", "",
+            "The draft rules on `better_auto_moderator/rules_draft`, run against the same items as the live rules, since %d minutes ago." %
+                ((time() - self.started_at) / 60), "",
+            "The draft rules made the same decision as the live rules on %d of %d items." % (self.agreed, self.items), "",
+            "## Decisions", "", "Live rules | Draft rules | Items", "---|---|---"]
+        for (live, draft), count in self.decisions.most_common():
+            lines.append("%s | %s | %d" % (live, draft, count))
+
+        lines += ["", "## Recent differences", "", "Item | Live rule | Draft rule", "---|---|---"]
+        for item, live, draft in reversed(self.differences):
+            lines.append("%s | %s | %s" % (item, live, draft))
+
+        for which in ('live', 'draft'):
+            lines += ["", "## Time spent by the %s rules" % which, "", "Rule | Items | Average (ms) | Total (s)", "---|---|---|---"]
+            for label, timing in sorted(self.timings[which].items(), key=lambda entry: -entry[1].seconds):
+                lines.append("%s | %d | %.2f | %.2f" % (label, timing.items, timing.average_ms(), timing.seconds))
+
+        return '\n'.join(lines) + '\n'
+
+class ShadowStore:
+    # With a fetcher and evaluators, each evaluator only sees its own partition's items. They save
+    # their comparisons here (in the work queue's file), and the fetcher reports on them all together.
+    # `generation` says which live and draft rules a comparison was for, so old ones aren't mixed in
+    def __init__(self, path):
+        self.path = path
+        self._db = None
+
+    @property
+    def db(self):
+        # Connect lazily, so importing BAM doesn't create a state file
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, timeout=30)
+            self._db.execute("""CREATE TABLE IF NOT EXISTS shadows (
+                subreddit TEXT NOT NULL,
+                partition INTEGER NOT NULL,
+                generation TEXT NOT NULL,
+                state TEXT NOT NULL,
+                PRIMARY KEY (subreddit, partition)
+            )""")
+            self._db.commit()
+        return self._db
+
+    def save(self, subreddit, partition, generation, shadow):
+        self.db.execute("INSERT OR REPLACE INTO shadows (subreddit, partition, generation, state) VALUES (?, ?, ?, ?)",
+            (subreddit, partition, generation, json.dumps(shadow.state())))
+        self.db.commit()
+
+    # Every partition's comparison of this generation, merged into one
+    def load(self, subreddit, generation):
+        shadow = Shadow()
+        rows = self.db.execute("SELECT state FROM shadows WHERE subreddit = ? AND generation = ?", (subreddit, generation)).fetchall()
+        for (state,) in rows:
+            shadow.merge(json.loads(state))
+        return shadow
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,168 @@
+import os
+import sys
+import socket
+import sqlite3
+import threading
+import subprocess
+from hashlib import blake2b
+from time import time, sleep
+from better_auto_moderator.log import logger
+
+# Rendezvous hashing: each subreddit goes to whichever worker scores highest for it. When a worker
+# joins or leaves, only the subreddits it wins (or held) move, and everyone else keeps theirs
+def score(worker, subreddit):
+    return blake2b(("%s/%s" % (worker, subreddit)).encode('utf-8'), digest_size=8).digest()
+
+def owner(subreddit, workers):
+    if len(workers) == 0:
+        return None
+
+    return max(workers, key=lambda worker: score(worker, subreddit))
+
+def default_worker_id():
+    return "%s:%d" % (socket.gethostname(), os.getpid())
+
+class LeaseTable:
+    # Splits subreddits between workers that share a SQLite file: processes on one machine, or nodes
+    # sharing a volume. Workers heartbeat into `workers`, and hold a lease in `leases` for each
+    # subreddit they moderate. A lease is only taken over once its holder releases it or stops
+    # renewing it, so a subreddit is never moderated by two workers at once while they rebalance.
+    def __init__(self, path, worker_id=None, ttl=120):
+        self.path = path
+        self.worker_id = worker_id or default_worker_id()
+        self.ttl = ttl
+        self._db = None
+        # The subreddits we held leases on when they were last claimed or renewed, and when that was
+        self.held = set()
+        self.renewed_at = 0
+        # Catching up checks (and renews) our leases from several threads
+        self.lock = threading.RLock()
+
+    @property
+    def db(self):
+        # Transactions are managed by hand (see `claim`), so they can lock the table up front
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._db.execute("""CREATE TABLE IF NOT EXISTS workers (
+                worker TEXT PRIMARY KEY,
+                heartbeat REAL NOT NULL
+            )""")
+            self._db.execute("""CREATE TABLE IF NOT EXISTS leases (
+                subreddit TEXT PRIMARY KEY,
+                worker TEXT NOT NULL,
+                expires REAL NOT NULL
+            )""")
+        return self._db
+
+    # Every worker that has heartbeated recently, including us
+    def workers(self):
+        rows = self.db.execute("SELECT worker FROM workers WHERE heartbeat >= ?", (time() - self.ttl,)).fetchall()
+        return sorted(row[0] for row in rows)
+
+    # Heartbeat, and work out which of `subreddits` are ours. Leases on subreddits that have moved
+    # to another worker are released, and leases on subreddits that have moved to us are taken (or
+    # renewed) when they're free. Returns the subreddits we hold leases on.
+    def claim(self, subreddits):
+        with self.lock:
+            now = time()
+            db = self.db
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.execute("INSERT OR REPLACE INTO workers (worker, heartbeat) VALUES (?, ?)", (self.worker_id, now))
+                db.execute("DELETE FROM workers WHERE heartbeat < ?", (now - self.ttl,))
+                workers = [row[0] for row in db.execute("SELECT worker FROM workers").fetchall()]
+                leases = dict((row[0], (row[1], row[2])) for row in db.execute("SELECT subreddit, worker, expires FROM leases").fetchall())
+
+                owned = set()
+                for subreddit in subreddits:
+                    holder, expires = leases.get(subreddit, (None, 0))
+                    if owner(subreddit, workers) != self.worker_id:
+                        if holder == self.worker_id:
+                            db.execute("DELETE FROM leases WHERE subreddit = ?", (subreddit,))
+                    elif holder in (None, self.worker_id) or expires < now:
+                        db.execute("INSERT OR REPLACE INTO leases (subreddit, worker, expires) VALUES (?, ?, ?)",
+                            (subreddit, self.worker_id, now + self.ttl))
+                        owned.add(subreddit)
+                db.execute("COMMIT")
+            except:
+                db.execute("ROLLBACK")
+                raise
+
+            self.held = owned
+            self.renewed_at = now
+            return owned
+
+    # Heartbeat and extend the leases we hold, without taking or handing back any. Returns the
+    # subreddits we still hold: a lease that lapsed may have been taken over in the meantime
+    def renew(self):
+        with self.lock:
+            now = time()
+            db = self.db
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.execute("INSERT OR REPLACE INTO workers (worker, heartbeat) VALUES (?, ?)", (self.worker_id, now))
+                db.execute("UPDATE leases SET expires = ? WHERE worker = ?", (now + self.ttl, self.worker_id))
+                held = set(row[0] for row in db.execute("SELECT subreddit FROM leases WHERE worker = ?", (self.worker_id,)).fetchall())
+                db.execute("COMMIT")
+            except:
+                db.execute("ROLLBACK")
+                raise
+
+            self.held = held
+            self.renewed_at = now
+            return held
+
+    # Whether we still hold `subreddit`'s lease, checked before acting on its items. Our leases are
+    # renewed whenever a third of their time has gone, so work that outlasts them (a long catch up,
+    # a slow batch) keeps them as it goes, instead of only between rounds of the main loop
+    def holds(self, subreddit):
+        with self.lock:
+            if time() - self.renewed_at >= self.ttl / 3:
+                self.renew()
+            return subreddit in self.held
+
+    # Hand back all of our leases and leave, so the other workers can pick them up straight away
+    def release(self):
+        with self.lock:
+            db = self.db
+            db.execute("BEGIN IMMEDIATE")
+            db.execute("DELETE FROM leases WHERE worker = ?", (self.worker_id,))
+            db.execute("DELETE FROM workers WHERE worker = ?", (self.worker_id,))
+            db.execute("COMMIT")
+            self.held = set()
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+# Run a copy of BAM for each of `envs` (environment variables on top of our own), and restart any
+# that exit. Stopping this stops them all
+def supervise(envs, script, restart_delay=5):
+    processes = {}
+
+    def start(index):
+        logger.info("Starting worker %s", envs[index].get('BAM_WORKER_ID', index))
+        processes[index] = subprocess.Popen([sys.executable, script], env=dict(os.environ, **envs[index]))
+
+    for index in range(len(envs)):
+        start(index)
+
+    try:
+        while True:
+            sleep(restart_delay)
+            for index, process in list(processes.items()):
+                if process.poll() is not None:
+                    logger.warning("Worker %d exited with %d, restarting", index, process.returncode)
+                    start(index)
+    finally:
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.wait()
+
+# Run `count` copies of BAM side by side, each moderating its share of the subreddits
+def run_workers(count, script):
+    hostname = socket.gethostname()
+    supervise([{'BAM_WORKERS': '1', 'BAM_SHARDING': '1', 'BAM_WORKER_ID': "%s:%d" % (hostname, index)}
+        for index in range(count)], script)
@@ -0,0 +1,198 @@
+# The fields BAM's checks, actions and placeholders read from items. Recording reads these
+# straight out of the listing data, so it doesn't trigger any extra fetches for the item itself.
+item_fields = ['id', 'name', 'created_utc', 'edited', 'approved', 'removed', 'permalink', 'user_reports',
+    'mod_reports', 'num_reports', 'crosspost_parent', 'is_original_content', 'stickied', 'locked', 'distinguished',
+    'banned_by', 'approved_by', 'author_fullname', 'author_premium', 'author_flair_text', 'author_flair_css_class',
+    'author_flair_template_id']
+submission_fields = ['title', 'selftext', 'url', 'domain', 'media', 'link_flair_text', 'link_flair_css_class',
+    'link_flair_template_id', 'is_gallery', 'over_18', 'spoiler', 'is_self']
+comment_fields = ['body', 'depth', 'link_id', 'parent_id', 'link_author', 'is_submitter']
+author_fields = ['name', 'id', 'comment_karma', 'link_karma', 'created_utc', 'is_gold']
+
+def item_kind(item):
+    return 'comment' if item.fullname.startswith('t1_') else 'submission'
+
+# Serialize the fields BAM reads from an item (and its author, subreddit relations, parent comment
+# and submission) into a plain dict. Unlike the item's own fields, the author profile, flair and
+# relations do cost API calls to record.
+def record(item, relations=True, parents=True):
+    kind = item_kind(item)
+    raw = vars(item)
+    data = {'kind': kind}
+    fields = item_fields + (comment_fields if kind == 'comment' else submission_fields)
+    for field in fields:
+        if field in raw:
+            data[field] = raw[field]
+
+    if 'poll_data' in raw:
+        data['poll_data'] = {'options': [str(option) for option in raw['poll_data'].options]}
+
+    subreddit = item.subreddit
+    data['subreddit'] = {'name': subreddit.display_name, 'users': {}}
+
+    author = raw.get('author')
+    if author is not None:
+        data['author'] = dict([(field, getattr(author, field, None)) for field in author_fields])
+        if relations:
+            data['subreddit']['users'][author.name] = record_relations(subreddit, author.name)
+
+    if parents and kind == 'comment':
+        data['submission'] = record(item.submission, relations=False, parents=False)
+        if not item.parent_id.startswith('t3_'):
+            data['parent'] = record(item.parent(), relations=False, parents=False)
+
+    if parents and 'crosspost_parent' in raw:
+        data['crosspost'] = record(item._reddit.submission(raw['crosspost_parent'].split('_')[1]), relations=False, parents=False)
+
+    return data
+
+def record_relations(subreddit, name):
+    flair = next(subreddit.flair(name))
+    selected = subreddit._reddit.post("r/%s/api/flairselector?name=%s" % (subreddit.display_name, name))['current']
+    return {
+        'flair_text': flair.get('flair_text'),
+        'flair_css_class': flair.get('flair_css_class'),
+        'flair_template_id': selected.get('flair_template_id', ''),
+        'is_banned': any(subreddit.banned(redditor=name)),
+        'is_contributor': any(subreddit.contributor(redditor=name)),
+        'is_moderator': any(subreddit.moderator(redditor=name)),
+    }
+
+class Snapshot:
+    # A recorded item that reads like a praw object. Missing fields raise AttributeError, just like
+    # praw attributes that aren't in the listing, so `hasattr` checks behave the same way.
+    # Anything the item does (moderation actions, replies, reports) is logged to `client.actions`.
+    def __init__(self, data, client):
+        self.data = data
+        self.client = client
+        self.mod = SnapshotActions(self, 'mod')
+        self.subreddit = SnapshotSubreddit(data.get('subreddit', {}), client)
+        self.author = SnapshotRedditor(data['author'], self.subreddit) if data.get('author') else None
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__['data'][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __str__(self):
+        return self.data.get('id', '')
+
+    # Where praw items keep their client, for checks that look things up on it (like crosspost parents)
+    @property
+    def _reddit(self):
+        return self.client
+
+    @property
+    def kind(self):
+        return self.data['kind']
+
+    @property
+    def fullname(self):
+        return self.data['name']
+
+    def report(self, reason=None):
+        self.client.log(self, 'report', reason)
+
+    def reply(self, body):
+        self.client.log(self, 'reply', body)
+        return Snapshot({'kind': 'comment', 'id': '', 'name': 't1_'}, self.client)
+
+class SnapshotSubmission(Snapshot):
+    pass
+
+class SnapshotComment(Snapshot):
+    @property
+    def submission(self):
+        return snapshot(self.data['submission'], self.client)
+
+    def parent(self):
+        if 'parent' in self.data:
+            return snapshot(self.data['parent'], self.client)
+
+        return self.submission
+
+def snapshot(data, client):
+    if data['kind'] == 'comment':
+        return SnapshotComment(data, client)
+
+    return SnapshotSubmission(data, client)
+
+class SnapshotActions:
+    # Stands in for `item.mod` and friends: any method called on it is logged as an action
+    def __init__(self, item, prefix):
+        self.item = item
+        self.prefix = prefix
+
+    def __getattr__(self, name):
+        def action(*args, **kwargs):
+            self.item.client.log(self.item, "%s.%s" % (self.prefix, name), *args, **kwargs)
+            return True
+        return action
+
+class SnapshotRedditor:
+    def __init__(self, data, subreddit):
+        self.__dict__.update(data)
+        self.subreddit = subreddit
+
+    def __str__(self):
+        return self.name
+
+    def moderated(self):
+        if self.subreddit.relations(self.name).get('is_moderator'):
+            return [self.subreddit]
+
+        return []
+
+class SnapshotFlair:
+    def __init__(self, subreddit):
+        self.subreddit = subreddit
+
+    def __call__(self, name):
+        relations = self.subreddit.relations(name)
+        return iter([{
+            'user': name,
+            'flair_text': relations.get('flair_text'),
+            'flair_css_class': relations.get('flair_css_class')
+        }])
+
+    def set(self, redditor, **kwargs):
+        self.subreddit.client.log(self.subreddit, 'flair.set', str(redditor), **kwargs)
+
+class SnapshotSubreddit:
+    def __init__(self, data, client):
+        self.data = data
+        self.client = client
+        self.name = data.get('name')
+        self.display_name = self.name
+        self.over18 = data.get('over18', False)
+        self.flair = SnapshotFlair(self)
+        self.modmail = SnapshotActions(self, 'modmail')
+
+    def __eq__(self, other):
+        return isinstance(other, SnapshotSubreddit) and other.name == self.name
+
+    def __hash__(self):
+        return hash(self.name)
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def fullname(self):
+        return self.name
+
+    def relations(self, name):
+        return self.data.get('users', {}).get(name, {})
+
+    def banned(self, redditor=None):
+        return [redditor] if self.relations(redditor).get('is_banned') else []
+
+    def contributor(self, redditor=None):
+        return [redditor] if self.relations(redditor).get('is_contributor') else []
+
+    def moderator(self, redditor=None):
+        return [redditor] if self.relations(redditor).get('is_moderator') else []
+
+    def message(self, subject, message):
+        self.client.log(self, 'message', subject, message)
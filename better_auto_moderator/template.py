@@ -0,0 +1,87 @@
+import re
+from functools import lru_cache
+
+placeholder_re = re.compile(r'{{(.*?)}}')
+
+class Template:
+    # A config value compiled once at rule load. Values without any {{placeholders}} are
+    # constants and render to themselves; everything else is split into literal strings and
+    # (name, key) placeholder segments, so rendering is a single join.
+    __slots__ = ('raw', 'segments', 'constant', 'bound')
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.segments = []
+        self.bound = {}
+
+        last = 0
+        for match in placeholder_re.finditer(raw):
+            if match.start() > last:
+                self.segments.append(raw[last:match.start()])
+
+            group = match.group(1)
+            key = None
+            if group[:5] == 'match':
+                key = group[6:] or None
+                group = 'match'
+            self.segments.append((group, key, match.group(0)))
+            last = match.end()
+
+        if last < len(raw):
+            self.segments.append(raw[last:])
+
+        self.constant = last == 0
+
+    # Look up the resolver for every placeholder segment once per placeholder class,
+    # instead of doing hasattr/getattr dispatch on every render
+    def resolvers(self, placeholders):
+        bound = self.bound.get(placeholders)
+        if bound is not None:
+            return bound
+
+        bound = []
+        for segment in self.segments:
+            if isinstance(segment, str):
+                bound.append(segment)
+                continue
+
+            name, key, literal = segment
+            if name == 'match':
+                bound.append((placeholders.match_resolver(key), literal))
+            elif hasattr(placeholders, name):
+                bound.append((placeholders.item_resolver(getattr(placeholders, name)), literal))
+            else:
+                # Unknown placeholders are left in the text untouched
+                bound.append(literal)
+
+        self.bound[placeholders] = bound
+        return bound
+
+    def render(self, placeholders, item, mod):
+        if self.constant:
+            return self.raw
+
+        parts = []
+        for segment in self.resolvers(placeholders):
+            if isinstance(segment, str):
+                parts.append(segment)
+                continue
+
+            resolver, literal = segment
+            inject = resolver(item, mod)
+            parts.append(literal if inject is None else str(inject))
+
+        return ''.join(parts)
+
+# Identical strings show up across many rules (and in nested sub-groups, which are rebuilt
+# per evaluation), so share compiled templates between them
+@lru_cache(maxsize=4096)
+def compile_template(raw):
+    return Template(raw)
+
+# Strings become Templates; everything else (numbers, bools, sub-group dicts) is passed through as-is
+def compile_value(value):
+    if isinstance(value, str):
+        return compile_template(value)
+
+    return value
@@ -0,0 +1,72 @@
+import re
+import operator
+from functools import lru_cache
+from dateutil.relativedelta import relativedelta
+
+number_re = re.compile(r'[0-9\-.]+')
+
+# Order matters: `>=` has to be found before `>`, and the comparator options (like `greater-than`,
+# added by checks such as `reports`) are weighed at the same level as the operator in the value
+operators = [
+    ('>=', 'greater-than-equal', operator.ge),
+    ('<=', 'less-than-equal', operator.le),
+    ('>', 'greater-than', operator.gt),
+    ('<', 'less-than', operator.lt),
+]
+
+time_units = ['minutes', 'hours', 'weeks', 'years', 'months']
+
+class Threshold:
+    # A value like `> 100` parsed once into its operator and number
+    __slots__ = ('symbol', 'number', 'compare')
+
+    def __init__(self, test):
+        test = str(test)
+        # Pull the numeric value out of the test string
+        self.number = float(number_re.search(test).group(0))
+        self.symbol = None
+        self.compare = operator.eq
+        for symbol, option, compare in operators:
+            if symbol in test:
+                self.symbol = symbol
+                self.compare = compare
+                break
+
+    def comparison(self, options):
+        if not options:
+            return self.compare
+
+        for symbol, option, compare in operators:
+            if symbol == self.symbol or option in options:
+                return compare
+
+        return operator.eq
+
+    def matches(self, value, options):
+        return self.comparison(options)(value, self.number)
+
+class TimeThreshold(Threshold):
+    # A value like `< 30 days`, with its relativedelta built once
+    __slots__ = ('delta',)
+
+    def __init__(self, test):
+        super().__init__(test)
+
+        unit = 'days' # Default is days
+        for name in time_units:
+            if name in test:
+                unit = name
+                break
+        self.delta = relativedelta(**{unit: self.number})
+
+    # `now` is the evaluation clock, captured once per item
+    def matches(self, value, now, options):
+        return self.comparison(options)(now, value + self.delta)
+
+@lru_cache(maxsize=4096)
+def parse_threshold(test):
+    return Threshold(test)
+
+@lru_cache(maxsize=4096)
+def parse_time_threshold(test):
+    return TimeThreshold(test)
@@ -0,0 +1,120 @@
+import threading
+from contextlib import contextmanager
+from time import time, perf_counter
+from weakref import WeakKeyDictionary
+from better_auto_moderator.metrics import budget_overruns, rules_quarantined
+from better_auto_moderator.log import logger
+
+# When the check running on this thread has to be done by, if it has a budget. Checks that can be
+# abandoned part way through (like regexes matched in the pool) read it through `remaining`
+local = threading.local()
+
+def remaining():
+    deadline = getattr(local, 'deadline', None)
+    if deadline is None:
+        return None
+
+    return max(0, deadline - perf_counter())
+
+class OverBudget(Exception):
+    # `kind` is the budget that ran out: check or rule
+    def __init__(self, kind, name, seconds):
+        super().__init__("%s %s took %dms" % (kind, name, seconds * 1000))
+        self.kind = kind
+        self.name = name
+        self.seconds = seconds
+
+class TimeBudgets:
+    # Limits on how long a single check, a rule's checks, and all of the rules on an item can take.
+    # Python can't stop a running check, so budgets are enforced between checks: a rule that runs
+    # over is abandoned as a non-match, and an item that runs over has its remaining rules skipped.
+    # Rules that run over their budgets `quarantine_after` times within `quarantine_window` seconds
+    # are skipped entirely for `quarantine_for` seconds, so one bad rule can't keep the bot lagging.
+    def __init__(self, check=None, rule=None, item=None, quarantine_after=3, quarantine_window=600, quarantine_for=3600):
+        self.check = check
+        self.rule = rule
+        self.item = item
+        self.quarantine_after = quarantine_after
+        self.quarantine_window = quarantine_window
+        self.quarantine_for = quarantine_for
+        # Keyed by the rule itself, so reloaded rules (even with the same name) start afresh
+        self.overruns = WeakKeyDictionary()
+        self.quarantined = WeakKeyDictionary()
+        self.lock = threading.Lock()
+
+    # Budgets come from the global config, in milliseconds. Leaving one out (or 0) means no budget
+    def configure(self, config):
+        def seconds(key):
+            value = config.get(key)
+            return value / 1000.0 if value else None
+
+        self.check = seconds('check_time_budget')
+        self.rule = seconds('rule_time_budget')
+        self.item = seconds('item_time_budget')
+        self.quarantine_after = config.get('quarantine_after', 3)
+        self.quarantine_window = config.get('quarantine_window', 600)
+        self.quarantine_for = config.get('quarantine_for', 3600)
+
+    def deadline(self, seconds):
+        return None if seconds is None else perf_counter() + seconds
+
+    def rule_deadline(self):
+        return self.deadline(self.rule)
+
+    def item_deadline(self):
+        return self.deadline(self.item)
+
+    # While a check runs, its deadline is whichever of its own budget and its rule's deadline runs out first
+    @contextmanager
+    def checking(self, rule_deadline):
+        previous = getattr(local, 'deadline', None)
+        deadlines = [deadline for deadline in [self.deadline(self.check), rule_deadline] if deadline is not None]
+        local.deadline = min(deadlines) if len(deadlines) > 0 else None
+        try:
+            yield
+        finally:
+            local.deadline = previous
+
+    # Once a check is done, make sure it (and its rule) are still within budget
+    def enforce(self, name, started_at, rule_deadline):
+        now = perf_counter()
+        if self.check is not None and now - started_at > self.check:
+            raise OverBudget('check', name, now - started_at)
+        if rule_deadline is not None and now > rule_deadline:
+            raise OverBudget('rule', name, now - started_at)
+
+    def is_quarantined(self, rule):
+        with self.lock:
+            until = self.quarantined.get(rule)
+            if until is None:
+                return False
+            if until > time():
+                return True
+
+            del self.quarantined[rule]
+
+        logger.info("Rule %s is out of quarantine", rule.label(), extra={'rule': rule.label()})
+        return False
+
+    # Record a rule running over budget, and quarantine it if it keeps doing so
+    def overrun(self, rule, exceeded):
+        label = rule.label()
+        budget_overruns.inc(budget=exceeded.kind, rule=label)
+        logger.warning("Rule %s went over its %s time budget (%s took %dms), and was abandoned", label, exceeded.kind,
+            exceeded.name, exceeded.seconds * 1000, extra={'rule': label, 'budget': exceeded.kind, 'ms': exceeded.seconds * 1000})
+
+        now = time()
+        with self.lock:
+            recent = [at for at in self.overruns.get(rule, []) if at > now - self.quarantine_window] + [now]
+            self.overruns[rule] = recent
+            if len(recent) < self.quarantine_after:
+                return
+
+            self.quarantined[rule] = now + self.quarantine_for
+            self.overruns[rule] = []
+
+        rules_quarantined.inc(rule=label)
+        logger.warning("Rule %s went over budget %d times in %ds, and is quarantined for %ds", label, len(recent),
+            self.quarantine_window, self.quarantine_for, extra={'rule': label})
+
+budgets = TimeBudgets()
@@ -0,0 +1,168 @@
+import json
+import random
+import argparse
+import threading
+from os import environ
+from time import time, perf_counter
+
+# Per-item tracing. A sampled item gets a trace with a span for each rule, each check and each
+# request to reddit, and every request span is tagged with the rule and check that caused it. praw
+# fetches lazily, so this is how to find out which check is actually spending our rate limit.
+# Finished traces are appended to a JSON lines file, one span per line.
+
+class NullSpan:
+    # Stands in for a span when the item isn't being traced, so untraced items cost next to nothing
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, key, value):
+        pass
+
+null_span = NullSpan()
+
+class Span:
+    __slots__ = ('tracer', 'name', 'attributes', 'id', 'parent', 'started_at', 'start', 'duration')
+
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.id = None
+        self.parent = None
+        self.started_at = None
+        self.start = None
+        self.duration = None
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        local = self.tracer.local
+        self.id = local.next_id
+        local.next_id += 1
+        self.parent = local.stack[-1].id if local.stack else None
+        self.start = time()
+        self.started_at = perf_counter()
+        local.stack.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.duration = perf_counter() - self.started_at
+        if exc_type is not None:
+            self.attributes['error'] = exc_type.__name__
+
+        local = self.tracer.local
+        local.stack.pop()
+        local.spans.append(self)
+        if len(local.stack) == 0:
+            self.tracer.finish()
+
+        return False
+
+    def to_dict(self, trace):
+        data = {
+            'trace': trace,
+            'span': self.id,
+            'parent': self.parent,
+            'name': self.name,
+            'start': self.start,
+            'ms': self.duration * 1000
+        }
+        data.update(self.attributes)
+        return data
+
+class Tracer:
+    def __init__(self, path=None, sample_rate=0.01):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.out = None
+
+    @property
+    def active(self):
+        return len(getattr(self.local, 'stack', ())) > 0
+
+    # Start a trace for an item, if tracing is on and the item is sampled
+    def item(self, item, **attributes):
+        if self.path is None or self.active or random.random() >= self.sample_rate:
+            return null_span
+
+        self.local.stack = []
+        self.local.spans = []
+        self.local.next_id = 0
+        self.local.trace = "%s-%x" % (getattr(item, 'fullname', item), random.getrandbits(32))
+        attributes['item'] = str(getattr(item, 'fullname', item))
+        return Span(self, 'item', attributes)
+
+    # A span inside the current trace. Does nothing if the current item isn't being traced
+    def span(self, name, **attributes):
+        if not self.active:
+            return null_span
+
+        return Span(self, name, attributes)
+
+    # The closest enclosing value of an attribute, like the rule a request was made for
+    def context(self, key):
+        for span in reversed(self.local.stack):
+            if key in span.attributes:
+                return span.attributes[key]
+
+        return None
+
+    def request(self, method, endpoint):
+        if not self.active:
+            return null_span
+
+        return Span(self, 'request', {
+            'method': method,
+            'endpoint': endpoint,
+            'rule': self.context('rule'),
+            'check': self.context('check')
+        })
+
+    def finish(self):
+        lines = [json.dumps(span.to_dict(self.local.trace)) for span in self.local.spans]
+        self.local.spans = []
+        with self.lock:
+            if self.out is None:
+                self.out = open(self.path, 'a')
+            self.out.write('\n'.join(lines) + '\n')
+            self.out.flush()
+
+tracer = Tracer(environ.get('BAM_TRACE_PATH'), float(environ.get('BAM_TRACE_SAMPLE_RATE', 0.01)))
+
+def load_spans(path):
+    with open(path) as traces:
+        return [json.loads(line) for line in traces if line.strip()]
+
+# Which rules and checks made the requests in a trace file, most expensive first
+def summarize(spans):
+    requests = [span for span in spans if span['name'] == 'request']
+    counts = {}
+    for span in requests:
+        key = (span.get('rule'), span.get('check'), span['endpoint'])
+        counts[key] = counts.get(key, 0) + 1
+
+    total = len(requests)
+    return [{
+        'rule': rule,
+        'check': check,
+        'endpoint': endpoint,
+        'requests': count,
+        'share': count / total
+    } for (rule, check, endpoint), count in sorted(counts.items(), key=lambda entry: -entry[1])]
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize which rules and checks made requests to reddit, from a trace file")
+    parser.add_argument('traces')
+    args = parser.parse_args()
+
+    for row in summarize(load_spans(args.traces)):
+        print("%5.1f%%  %6d  rule %-20s check %-24s %s" % (row['share'] * 100, row['requests'], row['rule'], row['check'], row['endpoint']))
+
+if __name__ == '__main__':
+    main()
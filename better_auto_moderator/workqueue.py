@@ -0,0 +1,116 @@
+import json
+import sqlite3
+from zlib import crc32
+from better_auto_moderator.listing import listing_data
+from better_auto_moderator.compact import from_data
+from better_auto_moderator.sharding import supervise
+
+# For one very busy subreddit, a single fetcher process reads the streams and pushes each item onto
+# a durable queue, and evaluator processes take them off and run the rules. Items are split between
+# evaluators by submission, so comments on a thread are always evaluated in order, by one evaluator.
+
+# The submission an item belongs to: itself for submissions, the submission it's on for comments.
+# Modmail messages belong to their conversation
+def thread_of(data):
+    return data.get('link_id') or data.get('conversation_id') or data.get('name') or ''
+
+def partition(data, partitions):
+    return crc32(thread_of(data).encode('utf-8')) % partitions
+
+# Only plain values survive the trip through the queue. Anything else is left for praw to fetch
+def plain(value):
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return True
+    if isinstance(value, list):
+        return all(plain(entry) for entry in value)
+    if isinstance(value, dict):
+        return all(isinstance(key, str) and plain(entry) for key, entry in value.items())
+
+    return False
+
+# An item's listing data, as a compact JSON string. The author and subreddit are kept by name,
+# which is how they come in listings (deleted authors included)
+def pack(item):
+    data = {}
+    for key, value in listing_data(item).items():
+        if key.startswith('_'):
+            continue
+        if key in ('author', 'subreddit'):
+            data[key] = '[deleted]' if value is None else str(value)
+        elif plain(value):
+            data[key] = value
+
+    return json.dumps(data, separators=(',', ':'))
+
+# Turn packed listing data back into a (compact) item, as if it had just come from a listing
+def unpack(packed, client):
+    return from_data(json.loads(packed), client)
+
+class WorkQueue:
+    # A queue of packed items in a local SQLite file, one FIFO per partition. Items stay on the queue
+    # until they're acknowledged, so an evaluator that dies part way through a batch picks the
+    # unacknowledged items up again when it restarts.
+    def __init__(self, path, partitions=1):
+        self.path = path
+        self.partitions = partitions
+        self._db = None
+
+    @property
+    def db(self):
+        # Connect lazily, so importing BAM doesn't create a state file
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, timeout=30)
+            # Lets evaluators read while the fetcher writes
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""CREATE TABLE IF NOT EXISTS queue (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                partition INTEGER NOT NULL,
+                stream TEXT NOT NULL,
+                item TEXT NOT NULL
+            )""")
+            self._db.execute("CREATE INDEX IF NOT EXISTS queue_partition ON queue (partition, id)")
+            self._db.commit()
+        return self._db
+
+    def push(self, stream, items):
+        if len(items) == 0:
+            return
+
+        rows = []
+        for item in items:
+            rows.append((partition(listing_data(item), self.partitions), stream, pack(item)))
+        self.db.executemany("INSERT INTO queue (partition, stream, item) VALUES (?, ?, ?)", rows)
+        self.db.commit()
+
+    # The oldest items in a partition, as (id, stream, packed item). They stay on the queue until acked
+    def peek(self, partition, limit=100):
+        return self.db.execute("SELECT id, stream, item FROM queue WHERE partition = ? ORDER BY id LIMIT ?",
+            (partition, limit)).fetchall()
+
+    def ack(self, ids):
+        if len(ids) == 0:
+            return
+
+        self.db.executemany("DELETE FROM queue WHERE id = ?", [(id,) for id in ids])
+        self.db.commit()
+
+    # How many items are waiting, in total or in one partition
+    def depth(self, partition=None):
+        if partition is None:
+            return self.db.execute("SELECT COUNT(*) FROM queue").fetchone()[0]
+
+        return self.db.execute("SELECT COUNT(*) FROM queue WHERE partition = ?", (partition,)).fetchone()[0]
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+# Run one fetcher and `evaluators` evaluators, each evaluating its own partition of the queue
+def run_pipeline(evaluators, script):
+    envs = [{'BAM_EVALUATORS': '1', 'BAM_ROLE': 'fetcher', 'BAM_PARTITIONS': str(evaluators), 'BAM_WORKER_ID': 'fetcher'}]
+    for index in range(evaluators):
+        envs.append({'BAM_EVALUATORS': '1', 'BAM_ROLE': 'evaluator', 'BAM_PARTITIONS': str(evaluators),
+            'BAM_PARTITION': str(index), 'BAM_WORKER_ID': 'evaluator:%d' % index})
+
+    supervise(envs, script)
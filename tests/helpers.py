@@ -1,12 +1,19 @@
 import praw
 from unittest.mock import patch, PropertyMock, MagicMock
 
+# Properties are mocked on a subclass made for each object, so they don't leak into praw's own
+# classes, and from there into every other test's praw objects
+def isolated(thing):
+    thing.__class__ = type(type(thing).__name__, (type(thing),), {})
+    return thing
+
 def comment():
-    comment = praw.models.Comment({}, None, None, {
+    comment = isolated(praw.models.Comment({}, None, None, {
         'id': 'abcde',
-        'body': 'Hello, world!',
-        'author': redditor()
-    })
+        'body': 'Hello, world!'
+    }))
+    # Set directly, since praw would wrap it in another Redditor without the mocks
+    vars(comment)['author'] = redditor()
     sub = PropertyMock(return_value=subreddit())
     submission = PropertyMock(return_value=post())
     type(comment).subreddit = sub
@@ -23,9 +30,9 @@ def comment():
     return comment
 
 def redditor():
-    user = praw.models.Redditor({}, None, None, {
+    user = isolated(praw.models.Redditor({}, None, None, {
         'name': 'test_user'
-    })
+    }))
     karma = PropertyMock(return_value=10)
     type(user).link_karma = karma
     type(user).comment_karma = karma
@@ -33,15 +40,15 @@ def redditor():
     return user
 
 def post():
-    post = praw.models.Submission({}, None, None, {
+    post = isolated(praw.models.Submission({}, None, None, {
         'id': 'fghij',
         'title': 'A Post',
         'selftext': 'This is a post',
-        'author': redditor(),
         'domain': "self.%s" % subreddit().name,
         'subreddit': subreddit().name,
         'media': None
-    })
+    }))
+    vars(post)['author'] = redditor()
     post.approved = False
     post.removed = False
     sub = PropertyMock(return_value=subreddit())
@@ -1,9 +1,9 @@
 import unittest
+from types import SimpleNamespace
 from mock import patch, MagicMock, PropertyMock
 from tests import helpers
 from better_auto_moderator.moderators.moderator import Moderator, ModeratorAuthorChecks
 from better_auto_moderator.rule import Rule
-from better_auto_moderator.reddit import reddit
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
 
@@ -234,16 +234,13 @@ class ModeratorTestCase(unittest.TestCase):
         mod = Moderator(post)
 
         flair_mock = MagicMock(return_value= { 'current': { 'flair_template_id': 'test' } })
-        old_post = reddit.post
-        reddit.post = flair_mock
+        post._reddit = SimpleNamespace(post=flair_mock)
 
         assert mod.moderate(rule), "Author flair_template_id not matching"
 
         flair_mock.return_value = { 'current': { 'flair_template_id': 'nomatch' } }
         self.assertFalse(mod.moderate(rule), "Author flair_template_id matching as a false positive")
 
-        reddit.post = old_post
-
     def test_regex_match(self):
         comment = helpers.comment()
         comment.body = 'Hello, foo! How are you?'
@@ -0,0 +1,55 @@
+import unittest
+from mock import MagicMock
+from tests import helpers
+from better_auto_moderator.reddit import reddit
+from better_auto_moderator.compact import CompactModmailMessage
+from better_auto_moderator.moderators.modmail_moderator import ModmailModerator
+from better_auto_moderator.rule import Rule
+
+def message(**fields):
+    data = {'id': 'm1', 'name': 'modmail_m1', 'body': 'Why was my post removed?', 'subject': 'Removed post',
+        'author': helpers.redditor(), 'subreddit': helpers.subreddit(), 'created_utc': 0.0, 'is_internal': False,
+        'conversation_id': 'c1'}
+    data.update(fields)
+    return CompactModmailMessage(reddit, data, MagicMock())
+
+class ModmailModeratorTestCase(unittest.TestCase):
+
+    def test_checks(self):
+        rule = Rule({
+            'subject': 'removed',
+            'body (includes)': 'my post',
+            'comment': 'Thanks, we will take a look.'
+        })
+
+        item = message()
+        assert ModmailModerator(item).moderate(rule), "Subject and body checks not passing on a matching message"
+        item.conversation.reply.assert_called_once_with(body='Thanks, we will take a look.', internal=False)
+
+        item = message(subject='Question')
+        self.assertFalse(ModmailModerator(item).moderate(rule), "Subject check passing on a message with a different subject")
+        item.conversation.reply.assert_not_called()
+
+        rule = Rule({'is_internal': True, 'comment': 'A note'})
+        self.assertFalse(ModmailModerator(message()).moderate(rule), "is_internal passing on a message from a user")
+
+    def test_actions(self):
+        rule = Rule({
+            'body (includes)': 'removed',
+            'comment': 'Noted',
+            'comment_internal': True,
+            'archive': True,
+            'highlight': True,
+            'mute': 7
+        })
+
+        item = message()
+        assert ModmailModerator(item).moderate(rule), "Actions not taken on a matching message"
+        item.conversation.reply.assert_called_once_with(body='Noted', internal=True)
+        item.conversation.archive.assert_called_once_with()
+        item.conversation.highlight.assert_called_once_with()
+        item.conversation.mute.assert_called_once_with(num_days=7)
+
+        item = message()
+        ModmailModerator(item).moderate(Rule({'mute': True}))
+        item.conversation.mute.assert_called_once_with(num_days=3)
@@ -1,9 +1,9 @@
 import unittest
+from types import SimpleNamespace
 from mock import patch, MagicMock, PropertyMock
 from tests import helpers
 from better_auto_moderator.moderators.post_moderator import PostModerator
 from better_auto_moderator.rule import Rule
-from better_auto_moderator.reddit import reddit
 
 class ModeratorTestCase(unittest.TestCase):
     def test_title_check(self):
@@ -148,14 +148,13 @@ class ModeratorTestCase(unittest.TestCase):
         type(post).poll_data = None
 
     def test_crosspost_base_fields(self):
-        old_submission = reddit.submission
         og_post = helpers.post()
-        reddit.submission = MagicMock(return_value=og_post)
         og_post.selftext = "This is a crosspost"
         og_post.domain = "self.NotMySub"
         og_post.url = "www.notmypost.com"
 
         post = helpers.post()
+        post._reddit = SimpleNamespace(submission=MagicMock(return_value=og_post))
         post.crosspost_parent = 't3_abcde'
         rule = Rule({})
         mod = PostModerator(post)
@@ -164,8 +163,6 @@ class ModeratorTestCase(unittest.TestCase):
         self.assertEqual(mod.checks.domain.__wrapped__(mod.checks, rule, []), "self.NotMySub", "Crosspost domain not being retrieved")
         self.assertEqual(mod.checks.url.__wrapped__(mod.checks, rule, []), "www.notmypost.com", "Crosspost url not being retrieved")
 
-        reddit.submission = old_submission
-
     def test_crosspost_id_check(self):
         post = helpers.post()
         rule = Rule({
@@ -184,11 +181,10 @@ class ModeratorTestCase(unittest.TestCase):
         self.assertFalse(mod.moderate(rule), "Post crosspost_id matching as false positive")
 
     def test_crosspost_title_check(self):
-        old_submission = reddit.submission
         og_post = helpers.post()
-        reddit.submission = MagicMock(return_value=og_post)
 
         post = helpers.post()
+        post._reddit = SimpleNamespace(submission=MagicMock(return_value=og_post))
         rule = Rule({
             'crosspost_title': 'Post',
             'action': 'approve'
@@ -204,8 +200,6 @@ class ModeratorTestCase(unittest.TestCase):
         og_post.title = "Test Title"
         self.assertFalse(mod.moderate(rule), "Post crosspost_title matching as false positive")
 
-        reddit.submission = old_submission
-
     def test_media_author_check(self):
         post = helpers.post()
         rule = Rule({
@@ -508,11 +502,10 @@ class ModeratorTestCase(unittest.TestCase):
         self.assertEqual(len(mod.checks.body.__wrapped__(mod, rule, [])), 10)
 
     def test_crosspost_name_check(self):
-        old_submission = reddit.submission
         og_post = helpers.post()
-        reddit.submission = MagicMock(return_value=og_post)
 
         post = helpers.post()
+        post._reddit = SimpleNamespace(submission=MagicMock(return_value=og_post))
         rule = Rule({
             'crosspost_subreddit': {
                 'name': 'Cross'
@@ -530,14 +523,11 @@ class ModeratorTestCase(unittest.TestCase):
         og_post.subreddit.name = "TestSub"
         self.assertFalse(mod.moderate(rule), "crosspost_subreddit name matching as false positive")
 
-        reddit.submission = old_submission
-
     def test_crosspost_is_nsfw_check(self):
-        old_submission = reddit.submission
         og_post = helpers.post()
-        reddit.submission = MagicMock(return_value=og_post)
 
         post = helpers.post()
+        post._reddit = SimpleNamespace(submission=MagicMock(return_value=og_post))
         rule = Rule({
             'crosspost_subreddit': {
                 'is_nsfw': True
@@ -554,5 +544,3 @@ class ModeratorTestCase(unittest.TestCase):
 
         og_post.subreddit.over18 = False
         self.assertFalse(mod.moderate(rule), "crosspost_subreddit is_nsfw matching as false positive")
-
-        reddit.submission = old_submission
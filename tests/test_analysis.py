@@ -0,0 +1,61 @@
+import unittest
+from better_auto_moderator.rule import Rule
+from better_auto_moderator.analysis import analyze, backtracking, parse_key, report
+
+def problems(analysis):
+    return [finding.problem for finding in analysis.findings]
+
+class AnalysisTestCase(unittest.TestCase):
+    def test_parse_key(self):
+        self.assertEqual(parse_key('~body+title (regex, case-sensitive)'), (['body', 'title'], ['regex', 'case-sensitive'], True))
+        self.assertEqual(parse_key('domain'), (['domain'], [], False))
+
+    def test_unknown_checks(self):
+        analysis = analyze([Rule({'type': 'comment', 'bodyy': 'typo', 'author': {'is_moderatr': True}, 'action': 'approve'})])[0]
+        self.assertIn("`bodyy` isn't a check BAM has for comment rules, so it's ignored", problems(analysis))
+        self.assertIn("`author.is_moderatr` isn't a check BAM has for comment rules, so it's ignored", problems(analysis))
+
+        analysis = analyze([Rule({'type': 'submission', 'title': 'a', 'action': 'approve', 'action_reason': 'b', 'set_locked': True})])[0]
+        self.assertEqual(problems(analysis), [], "Actions and modifiers are reported as unknown checks")
+
+    def test_types(self):
+        analysis = analyze([Rule({'title': 'x', 'action': 'remove'})])[0]
+        self.assertEqual(problems(analysis), ["BAM only runs rules with a `type` (submission, comment, modqueue, modmail), so this rule never runs"])
+
+        analysis = analyze([Rule({'type': 'inbox', 'body': 'x', 'action': 'remove'})])[0]
+        self.assertEqual(problems(analysis), ["BAM doesn't read `inbox` items, so this rule never runs"])
+
+    def test_shadowed(self):
+        general = Rule({'name': 'general', 'type': 'submission', 'title': ['spam'], 'action': 'approve'})
+        specific = Rule({'name': 'specific', 'type': 'submission', 'title': ['spam'], 'domain': 'example.com', 'action': 'approve'})
+        other = Rule({'name': 'other', 'type': 'submission', 'title': ['eggs'], 'domain': 'example.com', 'action': 'approve'})
+        analyses = analyze([general, specific, other])
+        self.assertEqual(problems(analyses[0]), [])
+        self.assertIn("it's shadowed by rule general, which checks for less and acts first, so it will likely never take action", problems(analyses[1]))
+        self.assertEqual(problems(analyses[2]), [], "Rules with different checks are reported as shadowed")
+
+    def test_backtracking(self):
+        self.assertIsNotNone(backtracking(r'(\w+\s?)+!'))
+        self.assertIsNotNone(backtracking(r'(a|aa)+b'))
+        self.assertIsNone(backtracking(r'\.(jpe?g|png|gifv?)(\?\S*)?$'), "A safe regex is reported")
+        self.assertIsNone(backtracking(r'(ab)+c'), "A safe regex is reported")
+        self.assertIsNone(backtracking(r'(unclosed'), "Bad regexes aren't left to fail when they run")
+
+        analysis = analyze([Rule({'type': 'comment', 'body (regex)': r'(\w+\s?)+!', 'action': 'approve'})])[0]
+        self.assertEqual(len(problems(analysis)), 1)
+
+    def test_cost(self):
+        cheap, network = analyze([
+            Rule({'type': 'comment', 'body': 'hello', 'action': 'approve'}),
+            Rule({'type': 'comment', 'author': {'is_banned': True}, 'action': 'approve'})
+        ])
+        self.assertLess(cheap.cost, 1)
+        self.assertGreater(network.cost, 100)
+        self.assertIn("`author.is_banned` makes a request for every item, before any cheaper check can rule the item out", problems(network))
+
+        # Removals check whether the author is a moderator first
+        removal = analyze([Rule({'type': 'comment', 'body': 'hello', 'action': 'remove'})])[0]
+        self.assertEqual(removal.checks[0], ('moderators_exempt', 'request'))
+        self.assertEqual(problems(removal), [], "Looking up moderators is reported, though it can't be moved")
+
+        self.assertIn('author.is_banned (request)', report([network]))
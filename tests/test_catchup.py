@@ -0,0 +1,90 @@
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from mock import patch, MagicMock
+from better_auto_moderator import catchup
+from better_auto_moderator.checkpoint import CheckpointStore
+from better_auto_moderator.dedup import SeenItems
+from better_auto_moderator.reddit import created_at
+
+def listing(count):
+    items = [SimpleNamespace(name='t3_%d' % i, fullname='t3_%d' % i, created_utc=float(i)) for i in range(1, count + 1)]
+    return lambda limit=None: list(reversed(items))
+
+class CatchUpTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.store = CheckpointStore(os.path.join(self.dir.name, 'state.sqlite3'))
+        self.patch = patch.object(catchup, 'checkpoints', self.store)
+        self.patch.start()
+
+    def tearDown(self):
+        self.patch.stop()
+        self.store.close()
+        self.dir.cleanup()
+
+    def test_page_back(self):
+        items = catchup.page_back(listing(10), 7.0, created_at)
+        self.assertEqual([item.fullname for item in items], ['t3_7', 't3_8', 't3_9', 't3_10'], "Paging back doesn't stop at the timestamp, oldest first")
+
+        items = catchup.page_back(listing(10), None, None, stop_at='t3_8')
+        self.assertEqual([item.fullname for item in items], ['t3_9', 't3_10'], "Paging back doesn't stop at the checkpointed item")
+
+    def test_catch_up(self):
+        self.store.update('submissions', 't3_5', 5.0)
+        self.store.flush()
+        moderator = MagicMock()
+        stream = {
+            'checkpoint': 'submissions',
+            'listing': listing(20),
+            'timestamp': created_at,
+            'type': 'submission',
+            'rules': [],
+            'moderator': moderator
+        }
+
+        self.assertEqual(catchup.catch_up([stream], SeenItems(), catch_up_after=3600), 0, "Catching up when the checkpoint is recent")
+
+        with patch('better_auto_moderator.checkpoint.time', return_value=1e12):
+            caught_up = catchup.catch_up([stream], SeenItems(), batch_size=4, catch_up_after=3600)
+
+        self.assertEqual(caught_up, 15)
+        self.assertEqual(moderator.call_count, 15, "Not every item in the backlog was moderated")
+        self.assertEqual(self.store.get('submissions'), ('t3_20', 20.0), "Checkpoint isn't moved to the newest item")
+
+        # Items on a subreddit that's moved to another worker part way through are left to it
+        self.store.update('submissions', 't3_5', 5.0)
+        self.store.flush()
+        moderator.reset_mock()
+        with patch('better_auto_moderator.checkpoint.time', return_value=1e12):
+            catchup.catch_up([stream], SeenItems(), batch_size=4, catch_up_after=3600, owns=lambda item: item.created_utc < 10)
+        self.assertEqual(moderator.call_count, 4, "Items were moderated after their lease was lost")
+
+    def test_clients(self):
+        self.store.update('submissions', 't3_5', 5.0)
+        self.store.flush()
+        clients = []
+        def client():
+            clients.append(SimpleNamespace(name='client %d' % len(clients)))
+            return clients[-1]
+        evaluated = {}
+        def moderator(item, budget=None):
+            evaluated[item.fullname] = item._reddit
+            return MagicMock()
+        stream = {'checkpoint': 'submissions', 'listing': listing(20), 'timestamp': created_at, 'type': 'submission', 'rules': [], 'moderator': moderator}
+
+        with patch('better_auto_moderator.checkpoint.time', return_value=1e12):
+            catchup.catch_up([stream], SeenItems(), workers=3, batch_size=6, catch_up_after=3600, client=client)
+
+        self.assertEqual(len(clients), 3, "Each worker doesn't have a client of its own")
+        self.assertEqual(len(evaluated), 15)
+        self.assertTrue(all(item_client in clients for item_client in evaluated.values()), "Items were evaluated on the shared client")
+        self.assertEqual(set(map(id, evaluated.values())), set(map(id, clients)), "A worker was left without items")
+
+    def test_budget(self):
+        budget = catchup.ActionBudget(60, burst=2)
+        with patch.object(catchup, 'sleep') as sleep:
+            budget.acquire()
+            budget.acquire()
+            sleep.assert_not_called()
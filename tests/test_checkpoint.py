@@ -0,0 +1,80 @@
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from mock import patch
+from better_auto_moderator import reddit
+from better_auto_moderator.checkpoint import CheckpointStore
+
+def listing(items):
+    # Listings come back newest first, like reddit's
+    def function(limit=None, params=None, **kwargs):
+        return list(reversed(items))[:limit]
+    return function
+
+def item(number):
+    return SimpleNamespace(fullname='t3_%d' % number, created_utc=float(number))
+
+class CheckpointTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.store = CheckpointStore(os.path.join(self.dir.name, 'state.sqlite3'))
+        self.patch = patch.object(reddit, 'checkpoints', self.store)
+        self.patch.start()
+
+    def tearDown(self):
+        self.patch.stop()
+        self.store.close()
+        self.dir.cleanup()
+
+    def drain(self, stream):
+        items = []
+        for entry in stream:
+            if entry is None:
+                break
+            items.append(entry)
+        return items
+
+    def test_store_persists(self):
+        self.store.update('submissions', 't3_1', 1.0)
+        self.assertEqual(self.store.get('submissions'), ('t3_1', 1.0), "Pending checkpoints aren't readable")
+        self.store.flush()
+
+        reopened = CheckpointStore(self.store.path)
+        self.assertEqual(reopened.get('submissions'), ('t3_1', 1.0), "Checkpoints aren't persisted")
+        self.assertIsNone(reopened.get('comments'))
+        reopened.close()
+
+    def test_first_run_skips_existing(self):
+        stream = reddit.checkpointed_stream('submissions', listing([item(1), item(2)]))
+        self.assertEqual(self.drain(stream), [], "First run processes existing items")
+
+    def test_resumes_from_checkpoint(self):
+        items = [item(1), item(2), item(3), item(4)]
+        self.store.update('submissions', 't3_2', 2.0)
+
+        stream = reddit.checkpointed_stream('submissions', listing(items))
+        caught_up = self.drain(stream)
+        self.assertEqual([entry.fullname for entry in caught_up], ['t3_3', 't3_4'], "Stream doesn't catch up from the checkpoint")
+        self.assertEqual(self.store.get('submissions'), ('t3_4', 4.0), "Checkpoint isn't advanced")
+        self.assertEqual(self.drain(stream), [], "Live stream repeats caught up items")
+
+    def test_flushed_after_pause(self):
+        items = [item(1), item(2), item(3), item(4)]
+        self.store.update('submissions', 't3_2', 2.0)
+        self.store.flush()
+
+        # The caller batches items up until the stream pauses, and only then evaluates them
+        stream = reddit.checkpointed_stream('submissions', listing(items))
+        self.assertEqual(len(self.drain(stream)), 2)
+        self.assertEqual(CheckpointStore(self.store.path).get('submissions'), ('t3_2', 2.0), "The backlog was checkpointed before it was evaluated")
+        next(stream)
+        self.assertEqual(CheckpointStore(self.store.path).get('submissions'), ('t3_4', 4.0), "The backlog isn't checkpointed once it's evaluated")
+
+    def test_backfill_is_bounded(self):
+        items = [item(number) for number in range(1, 11)]
+        self.store.update('submissions', 't3_1', 1.0)
+
+        with patch.object(reddit, 'backfill_limit', 3):
+            stream = reddit.checkpointed_stream('submissions', listing(items))
+            self.assertEqual([entry.fullname for entry in self.drain(stream)], ['t3_8', 't3_9', 't3_10'])
@@ -0,0 +1,60 @@
+import unittest
+import praw
+from better_auto_moderator.reddit import reddit
+from better_auto_moderator.compact import compact, from_data, CompactComment, CompactSubmission
+from better_auto_moderator.listing import listing_data
+from better_auto_moderator.dedup import SeenItems
+from better_auto_moderator.moderators.moderator import ModeratorPlaceholders
+
+def comment(**fields):
+    data = {'id': 'c1', 'name': 't1_c1', 'link_id': 't3_s1', 'parent_id': 't1_c0', 'body': 'Hello, world!',
+        'author': 'test_user', 'subreddit': 'BAMTest', 'user_reports': [], 'mod_reports': [], 'edited': False,
+        'score': 5, 'all_awardings': [], 'body_html': '<p>Hello, world!</p>'}
+    data.update(fields)
+    return praw.models.Comment(reddit, _data=data)
+
+class CompactTestCase(unittest.TestCase):
+    def test_compact(self):
+        item = compact(comment())
+        self.assertIsInstance(item, CompactComment)
+        self.assertEqual(item.body, 'Hello, world!')
+        self.assertEqual(item.fullname, 't1_c1')
+        self.assertEqual(str(item.author), 'test_user')
+        self.assertEqual(item.subreddit.display_name, 'BAMTest')
+        self.assertEqual(ModeratorPlaceholders.kind(item), 'comment')
+        self.assertNotIn('body_html', item, "Fields rules don't read are kept")
+        self.assertFalse(hasattr(item, 'crosspost_parent'), "Fields missing from the listing don't raise AttributeError")
+        self.assertIsNone(item._live, "Reading listing fields made a praw object")
+
+        # Reads like its listing data
+        data = listing_data(item)
+        self.assertEqual(data['body'], 'Hello, world!')
+        self.assertEqual(data.get('depth', 0), 0)
+        self.assertIn(('link_id', 't3_s1'), data.items())
+
+        # Dedup reads it without fetching anything
+        seen_items = SeenItems()
+        self.assertFalse(seen_items.seen('comment', item))
+        self.assertTrue(seen_items.seen('comment', compact(comment())))
+
+        self.assertIsInstance(compact(praw.models.Redditor(reddit, name='test_user')), praw.models.Redditor, "Only submissions and comments are compacted")
+
+    def test_live(self):
+        item = compact(comment())
+        # Actions go to a lazy praw object for the same item
+        self.assertEqual(item.mod.thing.fullname, 't1_c1')
+        self.assertIsInstance(item._live, praw.models.Comment)
+        self.assertFalse(item._live._fetched, "Taking an action fetched the item")
+
+        self.assertEqual(item.submission.id, 's1')
+        self.assertEqual(item.parent().id, 'c0')
+        prefetched = praw.models.Comment(reddit, _data={'id': 'c0', 'name': 't1_c0', 'body': 'Parent'})
+        item.submission._comments_by_id['t1_c0'] = prefetched
+        self.assertIs(item.parent(), prefetched, "Prefetched parents aren't used")
+
+    def test_from_data(self):
+        item = from_data({'id': 's1', 'name': 't3_s1', 'title': 'A Post', 'author': '[deleted]', 'subreddit': 'BAMTest'}, reddit)
+        self.assertIsInstance(item, CompactSubmission)
+        self.assertIsNone(item.author)
+        self.assertEqual(item.subreddit, praw.models.Subreddit(reddit, display_name='BAMTest'))
+        self.assertEqual(item.title, 'A Post')
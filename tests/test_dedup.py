@@ -0,0 +1,43 @@
+import unittest
+from types import SimpleNamespace
+from better_auto_moderator.dedup import SeenItems, BloomFilter
+
+def item(fullname, edited=False, reports=0):
+    return SimpleNamespace(name=fullname, fullname=fullname, edited=edited, user_reports=[['spam', 1]] * reports, mod_reports=[])
+
+class DedupTestCase(unittest.TestCase):
+    def test_seen(self):
+        seen = SeenItems()
+        self.assertFalse(seen.seen('submission', item('t3_a')), "New items are marked as seen")
+        assert seen.seen('submission', item('t3_a')), "Repeated items aren't marked as seen"
+        self.assertFalse(seen.seen('modqueue', item('t3_a')), "Items are deduped across different rule groups")
+
+    def test_changes_are_not_seen(self):
+        seen = SeenItems()
+        seen.seen('submission', item('t3_a'))
+        self.assertFalse(seen.seen('submission', item('t3_a', edited=1595932445.0)), "Edited items are marked as seen")
+        self.assertFalse(seen.seen('submission', item('t3_a', reports=1)), "Newly reported items are marked as seen")
+
+        reported = item('t3_a', reports=1)
+        reported.user_reports = [['rude', 1]]
+        self.assertFalse(seen.seen('submission', reported), "Items reported for another reason are marked as seen")
+
+    def test_lru_eviction(self):
+        seen = SeenItems(size=2)
+        seen.seen('submission', item('t3_a'))
+        seen.seen('submission', item('t3_b'))
+        seen.seen('submission', item('t3_c'))
+        self.assertFalse(seen.seen('submission', item('t3_a')), "Evicted items are still marked as seen")
+
+    def test_bloom_remembers_evicted(self):
+        seen = SeenItems(size=2, bloom_size=4096)
+        seen.seen('submission', item('t3_a'))
+        seen.seen('submission', item('t3_b'))
+        seen.seen('submission', item('t3_c'))
+        assert seen.seen('submission', item('t3_a')), "Bloom filter doesn't remember evicted items"
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter(1024)
+        bloom.add(('submission', 't3_a', False, 0))
+        assert ('submission', 't3_a', False, 0) in bloom
+        self.assertNotIn(('submission', 't3_b', False, 0), bloom)
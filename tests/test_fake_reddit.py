@@ -0,0 +1,78 @@
+import os
+import sys
+import praw
+import tempfile
+import unittest
+import threading
+import subprocess
+from time import time, sleep
+from prawcore.exceptions import ResponseException
+from benchmarks.fake_reddit import FakeReddit, serve
+
+class FakeRedditTestCase(unittest.TestCase):
+    def setUp(self):
+        self.fake = FakeReddit(ratelimit=10000)
+        for i in range(30):
+            self.fake.generate()
+        self.server = serve(self.fake, port=0, generate=False)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+        self.reddit = praw.Reddit(client_id='id', client_secret='secret', username='bam_bot', password='password',
+            user_agent='BAM tests', oauth_url=url, reddit_url=url)
+        self.subreddit = self.reddit.subreddit('BAMTest')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_listings(self):
+        generated = [item['name'] for item in self.fake.items]
+        listed = [item.fullname for item in self.subreddit.new(limit=None)] + [item.fullname for item in self.subreddit.comments(limit=None)]
+        self.assertEqual(sorted(listed), sorted(generated), "Listings don't page through every generated item")
+
+        newest = next(iter(self.subreddit.new(limit=1)))
+        self.assertEqual(newest.fullname, [item['name'] for item in self.fake.items if item['kind'] == 't3'][-1], "Listings aren't newest first")
+
+    def test_wiki(self):
+        content = self.subreddit.wiki['better_auto_moderator/rules'].content_md
+        self.assertIn('action: remove', content)
+
+    def test_actions(self):
+        comment = next(iter(self.subreddit.comments(limit=1)))
+        comment.mod.remove()
+        self.assertTrue(self.fake.by_fullname[comment.fullname]['removed'], "Removing didn't mark the item removed")
+
+        stats = self.fake.stats()
+        self.assertEqual(stats['actions'], {'remove': 1})
+        self.assertEqual(stats['requests']['comments'], 1)
+        self.assertIsNotNone(stats['lag_p50'], "Ingest to action lag isn't tracked")
+
+    def test_ratelimit(self):
+        self.fake.window_used = self.fake.ratelimit
+        with self.assertRaises(ResponseException) as context:
+            next(iter(self.subreddit.new(limit=1)))
+        self.assertEqual(context.exception.response.status_code, 429)
+        self.assertEqual(context.exception.response.headers['x-ratelimit-remaining'], '0')
+
+    def test_app(self):
+        # The whole of BAM, pointed at the stand-in the way the README says, until it takes action
+        self.fake.rate = 50
+        threading.Thread(target=self.fake.run_generator, daemon=True).start()
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        with tempfile.TemporaryDirectory() as cwd:
+            env = dict(os.environ, BAM_REDDIT_URL='http://127.0.0.1:%d' % self.server.server_address[1], REDDIT_SUBREDDIT='BAMTest',
+                REDDIT_CLIENT_ID='id', REDDIT_CLIENT_SECRET='secret', REDDIT_USERNAME='bam_bot', REDDIT_PASSWORD='password',
+                BAM_STATE_PATH=os.path.join(cwd, 'state.sqlite3'), PYTHONPATH=root)
+            process = subprocess.Popen([sys.executable, os.path.join(root, 'app.py')], cwd=cwd, env=env,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                started_at = time()
+                while len(self.fake.stats()['actions']) == 0 and process.poll() is None and time() - started_at < 30:
+                    sleep(0.2)
+            finally:
+                process.terminate()
+                process.wait()
+
+        self.assertGreater(self.fake.stats()['requests'].get('wiki', 0), 0, "BAM didn't read its rules from the stand-in")
+        self.assertGreater(sum(self.fake.stats()['actions'].values()), 0, "BAM didn't take any actions on the stand-in")
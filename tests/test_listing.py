@@ -0,0 +1,42 @@
+import praw
+import unittest
+from better_auto_moderator.listing import resolve, author_id, author_is_gold, author_flair, is_submitter, missing
+from better_auto_moderator.metrics import fetches_avoided
+
+# Listing data only: there's no reddit client, so anything that tries to fetch will blow up
+def comment(**fields):
+    data = {'id': 'abcde', 'name': 't1_abcde', 'body': 'Hello, world!', 'author': 'test_user'}
+    data.update(fields)
+    return praw.models.Comment({}, _data=data)
+
+class ListingTestCase(unittest.TestCase):
+    def test_author(self):
+        item = comment(author_fullname='t2_u1', author_premium=True)
+        self.assertEqual(author_id(item), 'u1')
+        self.assertTrue(author_is_gold(item))
+
+    def test_author_already_fetched(self):
+        item = comment(author_fullname='t2_u1')
+        item.author.id = 'fetched'
+        self.assertEqual(author_id(item), 'fetched', "Fetched author data isn't preferred")
+
+    def test_author_flair(self):
+        item = comment(author_flair_text='Regular', author_flair_template_id=None)
+        self.assertEqual(author_flair(item, 'flair_text'), 'Regular')
+        self.assertIsNone(author_flair(item, 'flair_template_id'))
+        self.assertIs(author_flair(item, 'flair_css_class'), missing, "Missing flair isn't reported as missing")
+
+    def test_is_submitter(self):
+        self.assertTrue(is_submitter(comment(is_submitter=True)))
+        self.assertTrue(is_submitter(comment(link_author='test_user')))
+        self.assertFalse(is_submitter(comment(link_author='someone_else')))
+
+    def test_resolve(self):
+        self.assertTrue(resolve(comment(removed=True, banned_by=None), 'removed', 'banned_by'), "Direct fields aren't preferred")
+        self.assertTrue(resolve(comment(banned_by='a_mod'), 'removed', 'banned_by'))
+        self.assertFalse(resolve(comment(approved_by=None), 'approved', 'approved_by'))
+
+    def test_counts_avoided_fetches(self):
+        avoided = fetches_avoided.get(attribute='author.id')
+        author_id(comment(author_fullname='t2_u1'))
+        self.assertEqual(fetches_avoided.get(attribute='author.id'), avoided + 1)
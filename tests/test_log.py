@@ -0,0 +1,47 @@
+import io
+import json
+import unittest
+from better_auto_moderator.log import logger, setup_logging
+from better_auto_moderator.replay import ReplayClient
+from better_auto_moderator.snapshot import snapshot
+from better_auto_moderator.moderators.comment_moderator import CommentModerator
+from better_auto_moderator.config import parse_configs
+from tests.test_replay import recorded_comment
+
+class LogTestCase(unittest.TestCase):
+    def setUp(self):
+        self.handlers = logger.handlers
+        self.level = logger.level
+        self.propagate = logger.propagate
+
+    def tearDown(self):
+        logger.handlers = self.handlers
+        logger.setLevel(self.level)
+        logger.propagate = self.propagate
+
+    def test_json_lines(self):
+        out = io.StringIO()
+        listener = setup_logging('INFO', 'json', out)
+        logger.info("Removing %s", 't1_abcde', extra={'rule': '3: spam', 'ms': 1.5})
+        logger.debug("Processing t1_abcde")
+        listener.stop()
+
+        lines = out.getvalue().strip().split('\n')
+        self.assertEqual(len(lines), 1, "Debug lines are logged at the info level")
+        record = json.loads(lines[0])
+        self.assertEqual(record['message'], 'Removing t1_abcde')
+        self.assertEqual(record['level'], 'info')
+        self.assertEqual(record['rule'], '3: spam', "Extra fields aren't included")
+        self.assertEqual(record['ms'], 1.5)
+
+    def test_actions_are_logged(self):
+        rules, config = parse_configs("type: comment\nname: greeting\nbody: hello\naction: remove", "")
+        client = ReplayClient([])
+        with self.assertLogs('bam', 'INFO') as logs:
+            item = snapshot(recorded_comment('abcde', 'Hello, world!'), client)
+            CommentModerator(item).moderate_all(rules)
+
+        self.assertEqual(len(logs.records), 1)
+        self.assertEqual(logs.records[0].rule, '0: greeting')
+        self.assertEqual(logs.records[0].item, 't1_abcde')
+        self.assertTrue(logs.records[0].ms >= 0, "Actions aren't timed")
@@ -0,0 +1,71 @@
+import unittest
+from better_auto_moderator.metrics import Metrics, endpoint, rule_seconds, actions_taken
+from better_auto_moderator.replay import ReplayClient
+from better_auto_moderator.snapshot import snapshot
+from better_auto_moderator.moderators.comment_moderator import CommentModerator
+from better_auto_moderator.config import parse_configs
+from tests.test_replay import recorded_comment
+
+class MetricsTestCase(unittest.TestCase):
+    def test_render(self):
+        metrics = Metrics()
+        counter = metrics.counter('bam_test_total', "A test counter")
+        histogram = metrics.histogram('bam_test_seconds', "A test histogram", [0.1, 1])
+        counter.inc(stream='comments')
+        counter.inc(2, stream='comments')
+        histogram.observe(0.5, rule='0')
+
+        rendered = metrics.render()
+        self.assertIn('# TYPE bam_test_total counter', rendered)
+        self.assertIn('bam_test_total{stream="comments"} 3', rendered)
+        self.assertIn('bam_test_seconds_bucket{rule="0",le="0.1"} 0', rendered)
+        self.assertIn('bam_test_seconds_bucket{rule="0",le="1"} 1', rendered)
+        self.assertIn('bam_test_seconds_bucket{rule="0",le="+Inf"} 1', rendered)
+        self.assertIn('bam_test_seconds_count{rule="0"} 1', rendered)
+
+    def test_collectors(self):
+        metrics = Metrics()
+        gauge = metrics.counter('bam_test_hits_total', "Hits")
+        metrics.collect(lambda: gauge.set(7, cache='test'))
+        self.assertIn('bam_test_hits_total{cache="test"} 7', metrics.render(), "Collectors aren't run before rendering")
+
+    def test_dump_every(self):
+        metrics = Metrics()
+        counter = metrics.counter('bam_test_total', "A test counter")
+        counter.inc()
+        metrics.dumped_at -= 60
+        with self.assertLogs('bam', 'INFO') as logs:
+            metrics.dump_every(60)
+            metrics.dump_every(60)
+        self.assertEqual(len(logs.records), 1, "Metrics are logged before the interval is up")
+        self.assertIn('bam_test_total 1', logs.output[0], "Metrics aren't sent to the log")
+
+    def test_endpoint(self):
+        self.assertEqual(endpoint('https://oauth.reddit.com/r/BAMTest/new'), '/r/{subreddit}/new')
+        self.assertEqual(endpoint('https://oauth.reddit.com/r/BAMTest/wiki/better_auto_moderator/rules'), '/r/{subreddit}/wiki/{page}')
+        self.assertEqual(endpoint('https://oauth.reddit.com/r/BAMTest/wiki/pages/'), '/r/{subreddit}/wiki/pages')
+        self.assertEqual(endpoint('https://oauth.reddit.com/user/test_user/about/'), '/user/{name}/about')
+        self.assertEqual(endpoint('https://oauth.reddit.com/comments/abcde/'), '/comments/{id}')
+        self.assertEqual(endpoint('https://oauth.reddit.com/api/remove/'), '/api/remove')
+
+    def test_moderation_is_measured(self):
+        rules, config = parse_configs("""
+type: comment
+body: cheap
+action: remove
+---
+type: comment
+name: greeting
+body: hello
+action: remove
+""", "")
+        self.assertEqual([rule.label() for rule in rules], ['0', '1: greeting'])
+
+        client = ReplayClient([])
+        removed = actions_taken.get(action='remove')
+        evaluations = (rule_seconds.get(rule='1: greeting') or {}).get('count', 0)
+        item = snapshot(recorded_comment('abcde', 'Hello, world!'), client)
+        CommentModerator(item).moderate_all(rules)
+
+        self.assertEqual(actions_taken.get(action='remove'), removed + 1, "Actions aren't counted")
+        self.assertEqual(rule_seconds.get(rule='1: greeting')['count'], evaluations + 1, "Rule latency isn't recorded")
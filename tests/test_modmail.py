@@ -0,0 +1,132 @@
+import copy
+import os
+import tempfile
+import unittest
+from mock import patch
+from praw.models import ModmailConversation
+from better_auto_moderator.reddit import reddit
+from better_auto_moderator.checkpoint import CheckpointStore
+from better_auto_moderator.compact import CompactModmailMessage, from_data
+from better_auto_moderator.modmail import ModmailStream, timestamp
+from better_auto_moderator.workqueue import pack, unpack, thread_of
+
+def author(name):
+    return {'id': 1, 'name': name, 'isMod': False, 'isAdmin': False, 'isOp': True, 'isParticipant': True, 'isHidden': False, 'isDeleted': False}
+
+def date(minute):
+    return '2026-10-19T10:%02d:00.000000+00:00' % minute
+
+# `messages` are (id, minute, author). Only conversations with all of their message ids come with them
+def conversations(*conversations):
+    response = {'conversationIds': [], 'conversations': {}, 'messages': {}}
+    for id, messages, listed in conversations:
+        response['conversationIds'].append(id)
+        response['conversations'][id] = {'id': id, 'subject': 'Help with %s' % id, 'lastUpdated': date(messages[-1][1]),
+            'numMessages': len(messages), 'objIds': [{'id': message[0], 'key': 'messages'} for message in messages[:listed]],
+            'owner': {'id': 't5_1', 'displayName': 'BAMTest', 'type': 'subreddit'}, 'authors': [author(message[2]) for message in messages],
+            'participant': author(messages[0][2]), 'state': 1, 'legacyFirstMessageId': None, 'isInternal': False}
+        for message_id, minute, name in messages:
+            response['messages'][message_id] = {'id': message_id, 'date': date(minute), 'bodyMarkdown': 'Message %s' % message_id,
+                'body': '<p>Message %s</p>' % message_id, 'isInternal': False, 'author': author(name), 'participatingAs': 'participant_user'}
+
+    return response
+
+class Modmail(ModmailStream):
+    # Modmail from a canned response, newest first, instead of reddit. praw parses responses in place.
+    # Like praw's listings, only the first `limit` are read
+    response = None
+
+    def conversations(self):
+        return reddit._objector.objectify(data=copy.deepcopy(self.response)).conversations[:self.limit]
+
+class ModmailTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.store = CheckpointStore(os.path.join(self.dir.name, 'state.sqlite3'))
+        self.stream = Modmail('modmail', reddit, ['BAMTest'], self.store, interval=0, ignore_author='bam_bot')
+
+    def tearDown(self):
+        self.store.close()
+        self.dir.cleanup()
+
+    def test_poll(self):
+        self.stream.response = conversations(('a', [('a1', 1, 'user')], 1))
+        self.assertEqual(self.stream.poll(), [], "Messages already in modmail the first time it's read are yielded")
+        self.assertEqual(self.store.get('modmail'), ('a', timestamp(date(1))))
+
+        self.stream.response = conversations(
+            ('b', [('b1', 2, 'user'), ('b2', 4, 'bam_bot')], 2),
+            ('a', [('a1', 1, 'user'), ('a2', 3, 'user')], 2))
+        changes = self.stream.poll()
+        self.assertEqual([(id, updated_at) for id, updated_at, items in changes], [('a', timestamp(date(3))), ('b', timestamp(date(4)))],
+            "Updated conversations aren't read oldest first")
+        self.assertEqual([[item.id for item in items] for id, updated_at, items in changes], [['a2'], ['b1']],
+            "Only the new messages from others are yielded")
+
+        message = changes[0][2][0]
+        self.assertIsInstance(message, CompactModmailMessage)
+        self.assertEqual(message.body, 'Message a2')
+        self.assertEqual(message.subject, 'Help with a')
+        self.assertEqual(str(message.author), 'user')
+        self.assertEqual(str(message.subreddit), 'BAMTest')
+        self.assertEqual(message.conversation.id, 'a')
+
+    def test_behind(self):
+        self.store.update('modmail', 'a', timestamp(date(1)))
+        # praw pages through modmail up to the limit, and only fetches pages as they're read
+        listing = ModmailStream('modmail', reddit, ['BAMTest', 'Other'], self.store, limit=500).conversations()
+        self.assertEqual(listing.limit, 500)
+        self.assertIsNone(listing._listing, "Modmail was read before it was asked for")
+
+        # More conversations have been updated than a page holds, and they're all read
+        self.stream.response = conversations(*[('c%d' % minute, [('m%d' % minute, minute, 'user')], 1) for minute in range(59, 1, -1)])
+        self.stream.limit = 200
+        self.assertEqual(len(self.stream.poll()), 58, "Conversations past the first page were skipped")
+
+        # But past the limit, older ones are skipped, and we say so
+        self.store.update('modmail', 'a', timestamp(date(1)))
+        self.stream.limit = 10
+        with self.assertLogs('bam', 'INFO') as logs:
+            changes = self.stream.poll()
+        self.assertEqual([id for id, updated_at, items in changes], ['c%d' % minute for minute in range(50, 60)])
+        self.assertIn("more than 10 conversations behind", '\n'.join(logs.output))
+
+    def test_fetch(self):
+        self.store.update('modmail', 'a', timestamp(date(1)))
+        # `a` came with its messages and `b` didn't, so only `b` is fetched
+        self.stream.response = conversations(
+            ('b', [('b1', 2, 'user'), ('b2', 3, 'user')], 1),
+            ('a', [('a1', 1, 'user'), ('a2', 2, 'user')], 2))
+        fetched = []
+        def fetch(conversation):
+            fetched.append(conversation.id)
+            vars(conversation)['messages'] = [reddit._objector.objectify(data=self.stream.response['messages'][id]) for id in ('b1', 'b2')]
+            conversation._fetched = True
+
+        with patch.object(ModmailConversation, '_fetch', fetch):
+            changes = self.stream.poll()
+        self.assertEqual(fetched, ['b'])
+        self.assertEqual([[item.id for item in items] for id, updated_at, items in changes], [['a2'], ['b1', 'b2']])
+
+    def test_stream(self):
+        self.store.update('modmail', 'a', timestamp(date(1)))
+        self.stream.response = conversations(('a', [('a1', 1, 'user'), ('a2', 2, 'user')], 2))
+        stream = self.stream.stream()
+        self.assertEqual(next(stream).id, 'a2')
+        self.assertIsNone(next(stream))
+        self.assertEqual(self.store.get('modmail'), ('a', timestamp(date(2))), "The cursor doesn't move past the conversation")
+        self.assertIsNone(next(stream), "Messages are yielded again once they've been checkpointed")
+        self.assertEqual(CheckpointStore(self.store.path).get('modmail'), ('a', timestamp(date(2))), "The cursor isn't saved after a pause")
+
+    def test_work_queue(self):
+        self.store.update('modmail', 'a', timestamp(date(1)))
+        self.stream.response = conversations(('a', [('a1', 1, 'user'), ('a2', 2, 'user')], 2))
+        message = self.stream.poll()[0][2][0]
+        self.assertEqual(thread_of(message), 'a', "Messages aren't kept with their conversation")
+
+        unpacked = unpack(pack(message), reddit)
+        self.assertIsInstance(unpacked, CompactModmailMessage)
+        self.assertEqual(unpacked.body, 'Message a2')
+        self.assertEqual(str(unpacked.author), 'user')
+        self.assertEqual(unpacked.conversation.id, 'a')
+        self.assertIsInstance(from_data({'name': 'modmail_a2', 'conversation_id': 'a'}, reddit).conversation, ModmailConversation)
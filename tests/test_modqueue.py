@@ -0,0 +1,80 @@
+import os
+import tempfile
+import unittest
+from better_auto_moderator.modqueue import ModqueueState, ModqueueTracker, report_state
+from better_auto_moderator.snapshot import snapshot
+
+def item(id, user_reports=(), mod_reports=()):
+    return snapshot({'kind': 'submission', 'id': id, 'name': 't3_%s' % id, 'num_reports': len(user_reports) + len(mod_reports),
+        'user_reports': [list(report) for report in user_reports], 'mod_reports': [list(report) for report in mod_reports]}, None)
+
+class Queue:
+    # A modqueue listing, newest first, that counts how often it's scanned
+    def __init__(self, items=()):
+        self.items = list(items)
+        self.scans = 0
+
+    def __call__(self, limit=None):
+        self.scans += 1
+        return list(reversed(self.items))
+
+class ModqueueTestCase(unittest.TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        self.state = ModqueueState(self.path)
+
+    def tearDown(self):
+        self.state.close()
+        os.remove(self.path)
+
+    def test_report_state(self):
+        self.assertEqual(report_state(item('a', [('Spam', 1), ('Rude', 2)])), report_state(item('a', [('Rude', 2), ('Spam', 1)])))
+        self.assertNotEqual(report_state(item('a', [('Spam', 1)])), report_state(item('a', [('Spam', 2)])))
+        self.assertNotEqual(report_state(item('a', [('Spam', 1)])), report_state(item('a', [('Rude', 1)])), "Changed reasons aren't noticed")
+
+    def test_scan(self):
+        queue = Queue([item('a', [('Spam', 1)]), item('b', [('Spam', 1)])])
+        tracker = ModqueueTracker('modqueue', queue, self.state, interval=0)
+        self.assertEqual(tracker.scan(), [], "Items already in the queue the first time it's scanned are yielded")
+
+        queue.items = [item('a', [('Spam', 1)]), item('b', [('Spam', 2)]), item('c', [('Rude', 1)])]
+        self.assertEqual([str(changed) for changed in tracker.scan()], ['b', 'c'])
+        self.assertEqual(tracker.scan(), [], "Unchanged items are yielded again")
+
+        # Items that leave the queue (approved, say) are forgotten, and come back in if they're reported again
+        queue.items = [item('b', [('Spam', 2)])]
+        self.assertEqual(tracker.scan(), [])
+        queue.items = [item('b', [('Spam', 2)]), item('a', [('Spam', 1)])]
+        self.assertEqual([str(changed) for changed in tracker.scan()], ['a'])
+
+        # After a restart, only what's changed since the last saved scan comes through
+        tracker.save()
+        queue.items = [item('b', [('Spam', 3)]), item('a', [('Spam', 1)])]
+        restarted = ModqueueTracker('modqueue', queue, ModqueueState(self.path), interval=0)
+        self.assertEqual([str(changed) for changed in restarted.scan()], ['b'])
+        self.assertEqual(ModqueueTracker('other', queue, self.state).scan(), [], "Queues share their state")
+
+        # Changes that weren't saved (because BAM stopped before evaluating them) come through again
+        restarted = ModqueueTracker('modqueue', queue, ModqueueState(self.path), interval=0)
+        self.assertEqual([str(changed) for changed in restarted.scan()], ['b'], "Unevaluated changes were lost")
+
+    def test_stream(self):
+        queue = Queue([item('a')])
+        stream = ModqueueTracker('modqueue', queue, self.state, interval=3600).stream()
+        self.assertIsNone(next(stream))
+        queue.items.append(item('b', [('Spam', 1)]))
+        self.assertIsNone(next(stream))
+        self.assertEqual(queue.scans, 1, "The queue is scanned more often than the interval")
+
+    def test_saved_after_pause(self):
+        queue = Queue([item('a')])
+        tracker = ModqueueTracker('modqueue', queue, self.state, interval=0)
+        stream = tracker.stream()
+        self.assertIsNone(next(stream))
+        queue.items.append(item('b', [('Spam', 1)]))
+        self.assertEqual(str(next(stream)), 'b')
+        self.assertIsNone(next(stream))
+        self.assertNotIn('t3_b', ModqueueState(self.path).load('modqueue'), "The scan was saved before its items were evaluated")
+        next(stream)
+        self.assertIn('t3_b', ModqueueState(self.path).load('modqueue'), "The scan isn't saved after a pause")
@@ -0,0 +1,53 @@
+import praw
+import unittest
+import threading
+from benchmarks.fake_reddit import FakeReddit, serve
+from better_auto_moderator.prefetch import Prefetcher, plan
+from better_auto_moderator.rule import Rule
+
+class PrefetchTestCase(unittest.TestCase):
+    def test_plan(self):
+        self.assertEqual(plan([Rule({'type': 'comment', 'body': 'hello', 'action': 'remove'})]), set())
+        self.assertEqual(plan([Rule({'type': 'comment', 'author': {'name': 'test_user'}, 'action': 'remove'})]), set(),
+            "Author checks that can be answered from the listing need a profile")
+        self.assertEqual(plan([
+            Rule({'type': 'comment', 'author': {'~comment_karma (greater-than)': 10}, 'action': 'remove'}),
+            Rule({'type': 'comment', 'parent_submission': {'title': 'hello'}, 'action': 'remove'}),
+            Rule({'type': 'comment', 'parent_comment': {'body': 'hello'}, 'action': 'remove'})
+        ]), {'author', 'submission', 'parent'})
+
+    def test_prefetch(self):
+        fake = FakeReddit(ratelimit=10000)
+        for i in range(40):
+            fake.generate()
+        server = serve(fake, port=0, generate=False)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        url = 'http://127.0.0.1:%d' % server.server_address[1]
+        reddit = praw.Reddit(client_id='id', client_secret='secret', username='bam_bot', password='password',
+            user_agent='BAM tests', oauth_url=url, reddit_url=url)
+        comments = list(reddit.subreddit('BAMTest').comments(limit=None))
+
+        # praw isn't thread-safe, so the client is only used from the thread it was handed to
+        threads = set()
+        for name in ('get', 'info'):
+            method = getattr(reddit, name)
+            def recorded(*args, method=method, **kwargs):
+                threads.add(threading.current_thread())
+                return method(*args, **kwargs)
+            setattr(reddit, name, recorded)
+
+        Prefetcher({'author', 'submission'}, client=reddit).prefetch(comments)
+        self.assertEqual(threads, {threading.current_thread()}, "The client was used from another thread")
+        self.assertEqual(fake.requests.get('user_data'), 1, "Authors aren't fetched in one batch")
+        self.assertEqual(fake.requests.get('info'), 1, "Submissions aren't fetched in one batch")
+
+        requests = dict(fake.requests)
+        for comment in comments:
+            # Read around the properties that the moderator test helpers patch onto praw's classes
+            self.assertEqual(vars(comment.author)['comment_karma'], fake.users[comment.author.name]['comment_karma'])
+            self.assertEqual(comment.author.created_utc, fake.users[comment.author.name]['created_utc'])
+            self.assertEqual(comment._submission.title, fake.by_fullname[comment.link_id]['title'])
+        self.assertEqual(fake.requests, requests, "Prefetched fields are fetched again")
@@ -0,0 +1,89 @@
+import threading
+import unittest
+from time import sleep
+from better_auto_moderator.regex_pool import RegexPool, compile_pattern
+from better_auto_moderator.metrics import regex_offloaded
+from better_auto_moderator.time_budget import TimeBudgets, OverBudget
+
+class RegexPoolTestCase(unittest.TestCase):
+    def test_inline(self):
+        pool = RegexPool(workers=0)
+        self.assertTrue(pool.match('wor+ld', ['Hello, world!']))
+        self.assertFalse(pool.match('wor+ld', ['Hello, world!'], full=True))
+        self.assertTrue(pool.match('Hello, wor+ld!', ['nope', 'Hello, world!'], full=True))
+        self.assertIsNone(pool._pool, "A pool was started with no workers")
+
+    def test_offload(self):
+        pool = RegexPool(workers=1, min_length=100)
+        try:
+            offloaded = regex_offloaded.get()
+            self.assertFalse(pool.match('needle', ['short haystack']))
+            self.assertEqual(regex_offloaded.get(), offloaded, "Short text was sent to the pool")
+
+            long = 'hay ' * 1000
+            self.assertTrue(pool.match('needle', [long + 'needle']))
+            self.assertFalse(pool.match('needle', [long]))
+            self.assertTrue(pool.match('(hay )+', [long], full=True))
+            self.assertEqual(regex_offloaded.get(), offloaded + 3, "Long text wasn't sent to the pool")
+        finally:
+            pool.close()
+
+    def test_compiled_once(self):
+        self.assertIs(compile_pattern('a+b'), compile_pattern('a+b'))
+
+    def test_timeout(self):
+        pool = RegexPool(workers=1, min_length=10)
+        try:
+            with TimeBudgets(check=0.2).checking(None):
+                # Backtracks for far longer than the check's budget
+                self.assertRaises(OverBudget, pool.match, '(a|aa)+b', ['a' * 60])
+            self.assertIsNone(pool._pool, "The stuck pool wasn't stopped")
+            self.assertTrue(pool.match('needle', ['haystack needle']), "The pool isn't started again")
+        finally:
+            pool.close()
+
+    def test_shared(self):
+        pool = RegexPool(workers=2, min_length=10)
+        results = {}
+        def slow():
+            with TimeBudgets(check=0.3).checking(None):
+                try:
+                    pool.match('(a|aa)+b', ['a' * 60])
+                except OverBudget as exceeded:
+                    results['slow'] = exceeded
+        def other():
+            # Still running in the pool when the slow regex is given up on
+            results['other'] = pool.match('(a|aa)+b', ['a' * 31])
+
+        try:
+            threads = [threading.Thread(target=other), threading.Thread(target=slow)]
+            threads[0].start()
+            sleep(0.1)
+            threads[1].start()
+            for thread in threads:
+                thread.join()
+            self.assertIsInstance(results.get('slow'), OverBudget)
+            self.assertIs(results.get('other'), False, "Stopping one thread's regex broke another's")
+        finally:
+            pool.close()
+
+    def test_kill_queued(self):
+        pool = RegexPool(workers=1, min_length=10)
+        results = []
+        def match():
+            results.append(pool.match('(a|aa)+b', ['a' * 28]))
+
+        try:
+            # One regex runs in the pool while the rest wait their turn
+            threads = [threading.Thread(target=match) for i in range(4)]
+            for thread in threads:
+                thread.start()
+            sleep(0.1)
+            stopped = pool._pool
+            pool.kill()
+            self.assertNotIn(stopped, pool.processes, "The stopped pool's processes were kept")
+            for thread in threads:
+                thread.join(10)
+            self.assertEqual(results, [False] * 4, "Regexes waiting on a stopped pool weren't run again")
+        finally:
+            pool.close()
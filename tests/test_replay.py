@@ -0,0 +1,59 @@
+import unittest
+from better_auto_moderator.replay import replay, ReplayClient
+from better_auto_moderator.snapshot import snapshot
+from better_auto_moderator.rule import Rule
+
+def recorded_comment(id, body, karma=10, moderator=False):
+    return {
+        'kind': 'comment',
+        'source': 'comment',
+        'id': id,
+        'name': 't1_%s' % id,
+        'body': body,
+        'depth': 0,
+        'parent_id': 't3_fghij',
+        'permalink': '/r/BAMTest/comments/fghij/a_post/%s/' % id,
+        'user_reports': [],
+        'mod_reports': [],
+        'approved': False,
+        'removed': False,
+        'author': {'name': 'test_user', 'id': 'u1', 'comment_karma': karma, 'link_karma': karma, 'created_utc': 0, 'is_gold': False},
+        'subreddit': {'name': 'BAMTest', 'users': {'test_user': {'is_moderator': moderator, 'flair_text': 'test'}}},
+        'submission': {
+            'kind': 'submission',
+            'id': 'fghij',
+            'name': 't3_fghij',
+            'title': 'A Post',
+            'selftext': 'This is a post',
+            'author': {'name': 'op', 'id': 'u2'},
+            'subreddit': {'name': 'BAMTest'}
+        }
+    }
+
+class ReplayTestCase(unittest.TestCase):
+    def test_snapshot_reads_like_praw(self):
+        client = ReplayClient([])
+        comment = snapshot(recorded_comment('abcde', 'Hello, world!'), client)
+        self.assertEqual(comment.body, 'Hello, world!')
+        self.assertEqual(comment.author.comment_karma, 10)
+        self.assertEqual(comment.submission.title, 'A Post')
+        self.assertEqual(next(comment.subreddit.flair('test_user'))['flair_text'], 'test')
+        self.assertFalse(hasattr(comment, 'crosspost_parent'), "Missing fields don't raise AttributeError")
+
+    def test_replay(self):
+        recordings = [
+            recorded_comment('abcde', 'buy cheap stuff', karma=1),
+            recorded_comment('fghij', 'Hello, world!'),
+            recorded_comment('klmno', 'buy cheap stuff', moderator=True)
+        ]
+        rules = [
+            Rule({'type': 'comment', 'name': 'spam', 'body': 'cheap', 'action': 'remove'}),
+            Rule({'type': 'comment', 'author': {'comment_karma': '> 5'}, 'action': 'approve'})
+        ]
+
+        report = replay(recordings, rules)
+        self.assertEqual(report['items'], 3)
+        self.assertIn('0: spam', report['rules'])
+        actions = [(action['item'], action['action']) for action in report['actions']]
+        self.assertEqual(actions, [('t1_abcde', 'mod.remove'), ('t1_fghij', 'mod.approve'), ('t1_klmno', 'mod.approve')],
+            "Replay doesn't report the actions that would have been taken")
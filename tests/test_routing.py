@@ -0,0 +1,25 @@
+import unittest
+from better_auto_moderator.routing import rules_for, all_rules, fair_order
+from better_auto_moderator.listing import subreddit_name
+from better_auto_moderator.snapshot import snapshot
+
+# A recorded comment in the given subreddit
+def comment(id, subreddit):
+    return snapshot({'kind': 'comment', 'id': id, 'name': 't1_%s' % id, 'subreddit': {'name': subreddit}, 'author': None}, None)
+
+class RoutingTestCase(unittest.TestCase):
+    def test_subreddit_name(self):
+        self.assertEqual(subreddit_name(comment('a', 'AskScience')), 'askscience', "Subreddit names aren't lowercased")
+
+    def test_rules_for(self):
+        stream = {'rules': {'one': ['rule 1'], 'two': ['rule 2', 'rule 3']}}
+        self.assertEqual(rules_for(stream, comment('a', 'One')), ['rule 1'])
+        self.assertEqual(rules_for(stream, comment('b', 'two')), ['rule 2', 'rule 3'])
+        self.assertEqual(rules_for(stream, comment('c', 'three')), [], "Items from other subreddits get rules")
+        self.assertEqual(rules_for({'rules': ['rule 1']}, comment('d', 'three')), ['rule 1'], "Plain rule lists aren't used as is")
+        self.assertEqual(sorted(all_rules(stream['rules'])), ['rule 1', 'rule 2', 'rule 3'])
+
+    def test_fair_order(self):
+        items = [comment('a1', 'a'), comment('a2', 'a'), comment('a3', 'a'), comment('b1', 'b'), comment('c1', 'c'), comment('b2', 'b')]
+        self.assertEqual([item.id for item in fair_order(items)], ['a1', 'b1', 'c1', 'a2', 'b2', 'a3'], "Busy subreddits aren't interleaved with the others")
+        self.assertEqual(fair_order([]), [])
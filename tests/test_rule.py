@@ -53,3 +53,38 @@ class ModeratorTestCase(unittest.TestCase):
         })
 
         self.assertIn('imgur.com', rule.config['domain'])
+
+    def test_sub_rules(self):
+        rule = Rule({
+            'author': {
+                'comment_karma': '> 10',
+                'set_flair': 'regular'
+            },
+            'parent_submission': {
+                'author': {'is_banned': True}
+            },
+            'action': 'approve'
+        })
+
+        author = rule.sub_rule(rule.values['author'][0])
+        self.assertIs(author, rule.sub_rule(rule.templates['author']), "Checks and actions get different sub-rules")
+        self.assertIs(author, rule.sub_rule(rule.values['author'][0]), "Sub-rules are rebuilt every time they're used")
+        self.assertEqual(author.config['set_flair'], 'regular')
+
+        # Groups within groups are compiled along with their own group
+        parent = rule.sub_rule(rule.values['parent_submission'][0])
+        self.assertIs(parent.sub_rule(parent.values['author'][0]), parent.sub_rule(parent.values['author'][0]))
+
+        # Anything that wasn't compiled with the rule still works, it's just built on the spot
+        self.assertEqual(rule.sub_rule({'is_gold': True}).config, {'is_gold': True})
+
+    def test_frozen(self):
+        rule = Rule({'type': 'comment', 'body': 'spam', 'log': 'found spam', 'author': {'is_banned': True}, 'action': 'remove'})
+        self.assertTrue(rule.requires_bam)
+        self.assertEqual(rule.type, 'comment')
+        self.assertNotIn('type', rule.config)
+        with self.assertRaises(TypeError, msg="Rule config can be changed after it's parsed"):
+            rule.config['body'] = 'eggs'
+        with self.assertRaises(AttributeError, msg="Rules have room for attributes they don't use"):
+            rule.extra = True
+        self.assertIn('action: remove', rule.to_reddit())
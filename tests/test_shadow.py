@@ -0,0 +1,100 @@
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+import better_auto_moderator.config as config
+from better_auto_moderator.shadow import Shadow, ShadowStore, decision
+from better_auto_moderator.replay import ReplayClient
+from better_auto_moderator.snapshot import snapshot
+from better_auto_moderator.rule import Rule
+from better_auto_moderator.moderators.comment_moderator import CommentModerator
+from tests.test_replay import recorded_comment
+
+class ShadowTestCase(unittest.TestCase):
+    def test_compare(self):
+        recordings = [
+            recorded_comment('abcde', 'buy cheap stuff'),
+            recorded_comment('fghij', 'Hello, world!'),
+            recorded_comment('klmno', 'buy cheap stuff and more')
+        ]
+        live_rules = [Rule({'type': 'comment', 'name': 'spam', 'body (includes)': 'cheap', 'action': 'remove', 'moderators_exempt': False})]
+        draft_rules = [
+            Rule({'type': 'comment', 'name': 'spam', 'body (includes)': 'more', 'action': 'remove', 'moderators_exempt': False}),
+            Rule({'type': 'comment', 'name': 'greeting', 'body (includes)': 'hello', 'set_locked': True})
+        ]
+
+        client = ReplayClient(recordings)
+        shadow = Shadow()
+        for data in recordings:
+            item = snapshot(data, client)
+            client.current = item.fullname
+            live = CommentModerator(item)
+            shadow.compare(CommentModerator, item, draft_rules, live, live.moderate_all(live_rules))
+
+        self.assertEqual([action['item'] for action in client.actions], ['t1_abcde', 't1_klmno'],
+            "The draft rules took action, or the live rules didn't")
+        self.assertEqual(shadow.items, 3)
+        self.assertEqual(shadow.agreed, 1)
+        self.assertEqual(shadow.decisions[('remove', 'nothing')], 1)
+        self.assertEqual(shadow.decisions[('nothing', 'set_locked')], 1)
+        self.assertEqual(list(shadow.differences), [('t1_abcde', 'spam', 'none'), ('t1_fghij', 'none', 'greeting')])
+        self.assertEqual(shadow.timings['live']['spam'].items, 3)
+        self.assertEqual(shadow.timings['draft']['greeting'].items, 2, "Draft rules kept running after one matched")
+
+        report = shadow.report()
+        self.assertIn("same decision as the live rules on 1 of 3 items", report)
+        self.assertIn("t1_fghij | none | greeting", report)
+        self.assertIn("## Time spent by the draft rules", report)
+
+    def test_decision(self):
+        mod = CommentModerator(None)
+        self.assertEqual(decision(mod, None), 'nothing')
+        self.assertEqual(decision(mod, Rule({'type': 'comment', 'action': 'approve', 'comment': 'hi'})), 'approve')
+        self.assertEqual(decision(mod, Rule({'type': 'comment', 'body': 'a', 'log': 'b'})), 'log')
+
+    def test_broken_draft(self):
+        class Page:
+            def __init__(self, name, content_md, revision_date=1):
+                self.name = name
+                self.content_md = content_md
+                self.revision_date = revision_date
+
+        class Wiki(list):
+            def __getitem__(self, name):
+                return [page for page in self if page.name == name][0]
+
+        sub = SimpleNamespace(display_name='BAMTest', wiki=Wiki([Page('better_auto_moderator', 'shadow_rules: true'),
+            Page('better_auto_moderator/rules_draft', 'type: comment\nbody: [unclosed')]))
+        self.assertIsNone(config.get_draft_rules(sub), "A draft that doesn't parse was used")
+
+        sub.wiki[1] = Page('better_auto_moderator/rules_draft', 'type: comment\nbody: hello\naction: remove', revision_date=2)
+        self.assertEqual(len(config.get_draft_rules(sub)), 1, "The draft isn't read again once it's fixed")
+
+    def test_partitions(self):
+        # Two evaluators, each comparing its own partition's items
+        shadows = [Shadow(), Shadow()]
+        for shadow, (live, draft) in zip(shadows, [('remove', 'nothing'), ('nothing', 'nothing')]):
+            shadow.items += 2
+            shadow.agreed += 1 if live == draft else 0
+            shadow.decisions[(live, draft)] += 2
+            shadow.differences.append(('t1_%s' % live, live, draft))
+            shadow.record_timings('live', {'spam': 0.5})
+
+        handle, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        store = ShadowStore(path)
+        try:
+            store.save('bamtest', 0, 'a', shadows[0])
+            store.save('bamtest', 1, 'a', shadows[1])
+            store.save('bamtest', 2, 'b', shadows[1])
+            merged = ShadowStore(path).load('bamtest', 'a')
+        finally:
+            store.close()
+            os.remove(path)
+
+        self.assertEqual(merged.items, 4, "Partitions aren't added up, or other generations are mixed in")
+        self.assertEqual(merged.agreed, 1)
+        self.assertEqual(merged.decisions[('remove', 'nothing')], 2)
+        self.assertEqual(len(merged.differences), 2)
+        self.assertEqual(merged.timings['live']['spam'].items, 2)
+        self.assertEqual(merged.timings['live']['spam'].seconds, 1.0)
@@ -0,0 +1,90 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from better_auto_moderator.sharding import LeaseTable, owner
+
+subreddits = ['sub%d' % i for i in range(20)]
+
+class ShardingTestCase(unittest.TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        self.tables = []
+
+    def tearDown(self):
+        for table in self.tables:
+            table.close()
+        os.remove(self.path)
+
+    def worker(self, worker_id):
+        table = LeaseTable(self.path, worker_id=worker_id, ttl=60)
+        self.tables.append(table)
+        return table
+
+    def test_owner(self):
+        self.assertIsNone(owner('sub0', []))
+        self.assertEqual(owner('sub0', ['a', 'b']), owner('sub0', ['b', 'a']), "Owners depend on the order of workers")
+
+        # Adding a worker only moves subreddits to the new worker
+        before = dict((sub, owner(sub, ['a', 'b'])) for sub in subreddits)
+        after = dict((sub, owner(sub, ['a', 'b', 'c'])) for sub in subreddits)
+        moved = [sub for sub in subreddits if before[sub] != after[sub]]
+        self.assertTrue(all(after[sub] == 'c' for sub in moved), "Subreddits moved between workers that stayed")
+        self.assertTrue(len(moved) > 0, "The new worker got nothing")
+
+    def test_single_worker(self):
+        a = self.worker('a')
+        self.assertEqual(a.claim(subreddits), set(subreddits))
+        self.assertEqual(a.workers(), ['a'])
+
+    def test_rebalance(self):
+        a = self.worker('a')
+        b = self.worker('b')
+        a.claim(subreddits)
+
+        # b joins, but a still holds the leases until it next claims
+        self.assertEqual(b.claim(subreddits), set(), "Leases were taken while still held")
+        owned_a = a.claim(subreddits)
+        owned_b = b.claim(subreddits)
+        self.assertEqual(owned_a & owned_b, set(), "Subreddits are moderated by two workers")
+        self.assertEqual(owned_a | owned_b, set(subreddits), "Subreddits aren't moderated by anyone")
+        self.assertTrue(len(owned_a) > 0 and len(owned_b) > 0, "Subreddits weren't split")
+
+        # a leaves, and b picks up everything
+        a.release()
+        self.assertEqual(b.workers(), ['b'])
+        self.assertEqual(b.claim(subreddits), set(subreddits))
+
+    def test_expired_worker(self):
+        a = self.worker('a')
+        b = self.worker('b')
+        a.claim(subreddits)
+        b.claim(subreddits)
+        owned_a = a.claim(subreddits)
+
+        # a stops renewing, so its leases (and its place) lapse
+        with patch('better_auto_moderator.sharding.time', return_value=1e12):
+            self.assertEqual(b.claim(subreddits), set(subreddits), "Expired leases weren't taken over")
+            self.assertEqual(b.workers(), ['b'])
+        self.assertTrue(len(owned_a) > 0)
+
+    def test_renew(self):
+        a = self.worker('a')
+        b = self.worker('b')
+        a.claim(subreddits)
+        b.claim(subreddits)
+        owned_a = a.claim(subreddits)
+        claimed_at = a.renewed_at
+        self.assertTrue(all(a.holds(sub) for sub in owned_a))
+
+        # a renews its leases part way through a long stretch of work, so b can't take them when they'd have expired
+        with patch('better_auto_moderator.sharding.time', return_value=claimed_at + 50):
+            self.assertTrue(all(a.holds(sub) for sub in owned_a))
+        with patch('better_auto_moderator.sharding.time', return_value=claimed_at + 100):
+            self.assertEqual(b.claim(subreddits) & owned_a, set(), "Renewed leases were taken over")
+
+        # Once a's leases lapse and b takes them over, a no longer holds them
+        with patch('better_auto_moderator.sharding.time', return_value=1e12):
+            self.assertEqual(b.claim(subreddits), set(subreddits))
+            self.assertFalse(any(a.holds(sub) for sub in owned_a), "Leases taken over are still held")
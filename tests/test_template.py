@@ -0,0 +1,56 @@
+import unittest
+from mock import MagicMock
+from better_auto_moderator.template import Template, compile_template
+from better_auto_moderator.rule import Rule
+
+class Placeholders:
+    @classmethod
+    def match_resolver(cls, key):
+        return lambda item, mod: mod.matches.get(key)
+
+    @staticmethod
+    def item_resolver(placeholder):
+        return lambda item, mod: placeholder(item)
+
+    @staticmethod
+    def author(item):
+        return item.author
+
+class TemplateTestCase(unittest.TestCase):
+    def test_constant(self):
+        template = Template('Hello, world')
+        assert template.constant, "Placeholder-free values are not constants"
+        self.assertEqual(template.render(Placeholders, None, None), 'Hello, world')
+
+    def test_render(self):
+        item = MagicMock(author='test_user')
+        template = Template('Hello, {{author}}, how are you {{author}}?')
+        self.assertFalse(template.constant, "Templated values are treated as constants")
+        self.assertEqual(template.render(Placeholders, item, None), 'Hello, test_user, how are you test_user?')
+
+    def test_match(self):
+        mod = MagicMock(matches={'id': 'abcde'})
+        template = Template('id is {{match-id}}')
+        self.assertEqual(template.render(Placeholders, None, mod), 'id is abcde')
+
+    def test_unknown_placeholders_kept(self):
+        template = Template('{{nothing}} here')
+        self.assertEqual(template.render(Placeholders, None, None), '{{nothing}} here')
+
+    def test_resolvers_bound_once(self):
+        template = Template('{{author}}')
+        self.assertIs(template.resolvers(Placeholders), template.resolvers(Placeholders), "Resolvers are rebuilt on every render")
+
+    def test_compile_template_cached(self):
+        self.assertIs(compile_template('{{author}}'), compile_template('{{author}}'))
+
+    def test_rule_compiles_values(self):
+        rule = Rule({
+            'body': ['Hello, {{author}}', 'plain'],
+            'reports': 2,
+            'comment': 'Hi {{author}}'
+        })
+        self.assertEqual(len(rule.values['body']), 2)
+        assert rule.values['body'][1].constant, "Plain list values are not compiled as constants"
+        self.assertEqual(rule.values['reports'], [2])
+        self.assertIsInstance(rule.templates['comment'], Template)
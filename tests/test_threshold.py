@@ -0,0 +1,27 @@
+import unittest
+from datetime import datetime
+from dateutil.relativedelta import relativedelta
+from better_auto_moderator.threshold import Threshold, TimeThreshold, parse_threshold
+
+class ThresholdTestCase(unittest.TestCase):
+    def test_operators(self):
+        assert Threshold('> 5').matches(6, []), "> threshold not matching"
+        self.assertFalse(Threshold('> 5').matches(5, []), "> threshold matching when equal")
+        assert Threshold('>= 5').matches(5, []), ">= threshold not matching when equal"
+        assert Threshold('<= 5').matches(5, []), "<= threshold not matching when equal"
+        assert Threshold('< 5').matches(4, []), "< threshold not matching"
+        assert Threshold(5).matches(5, []), "Plain numbers are not compared for equality"
+
+    def test_options(self):
+        assert Threshold(2).matches(3, ['greater-than-equal']), "Comparator options are ignored"
+        assert Threshold('> 2').matches(2, ['greater-than-equal']), "greater-than-equal option doesn't win over >"
+
+    def test_time(self):
+        now = datetime(2020, 6, 1)
+        threshold = TimeThreshold('> 10 days')
+        assert threshold.matches(now + relativedelta(days=-11), now, []), "time threshold not matching"
+        self.assertFalse(threshold.matches(now + relativedelta(days=-9), now, []), "time threshold matching as false positive")
+        self.assertEqual(TimeThreshold('< 3 months').delta, relativedelta(months=3))
+
+    def test_parse_cached(self):
+        self.assertIs(parse_threshold('> 100'), parse_threshold('> 100'))
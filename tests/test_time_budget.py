@@ -0,0 +1,70 @@
+import unittest
+from time import sleep
+from unittest.mock import patch
+from tests import helpers
+from better_auto_moderator.moderators.moderator import Moderator
+from better_auto_moderator.rule import Rule
+from better_auto_moderator.time_budget import budgets, TimeBudgets, OverBudget, remaining
+from better_auto_moderator.metrics import budget_overruns
+
+real_full_exact = Moderator.full_exact
+
+# A comparator that takes its time
+def slow_full_exact(values, test, options):
+    sleep(0.03)
+    return real_full_exact(values, test, options)
+
+def rule(name):
+    return Rule({'name': name, 'id': 'abcde', 'moderators_exempt': False, 'action': 'approve'})
+
+class TimeBudgetTestCase(unittest.TestCase):
+    def setUp(self):
+        budgets.configure({'check_time_budget': 10, 'quarantine_after': 2})
+
+    def tearDown(self):
+        budgets.configure({})
+
+    def test_configure(self):
+        self.assertEqual(budgets.check, 0.01)
+        self.assertIsNone(budgets.rule, "Missing budgets aren't left unlimited")
+        self.assertIsNone(TimeBudgets().item_deadline())
+
+    def test_within_budget(self):
+        mod = Moderator(helpers.comment())
+        self.assertIsNotNone(mod.moderate_all([rule('fast')]), "A quick rule was abandoned")
+
+    def test_over_budget(self):
+        slow = rule('slow')
+        mod = Moderator(helpers.comment())
+        overruns = budget_overruns.get(budget='check', rule='slow')
+        with patch.object(Moderator, 'full_exact', side_effect=slow_full_exact):
+            self.assertIsNone(mod.moderate_all([slow]), "A rule over budget still took action")
+            self.assertEqual(budget_overruns.get(budget='check', rule='slow'), overruns + 1)
+            self.assertFalse(budgets.is_quarantined(slow), "A rule was quarantined after one overrun")
+
+            # The second time in the window, it's quarantined, and isn't run at all
+            mod.moderate_all([slow])
+            self.assertTrue(budgets.is_quarantined(slow), "A rule that keeps going over budget isn't quarantined")
+            with patch.object(Moderator, 'moderate') as moderate:
+                Moderator(helpers.comment()).moderate_all([slow])
+                moderate.assert_not_called()
+
+        # Rules are quarantined by identity, so a reloaded copy of the rule runs again
+        self.assertIsNotNone(Moderator(helpers.comment()).moderate_all([rule('slow')]))
+
+    def test_item_budget(self):
+        budgets.configure({'item_time_budget': 20})
+        with patch.object(Moderator, 'full_exact', side_effect=slow_full_exact):
+            with patch.object(Moderator, 'action', return_value=False) as action:
+                Moderator(helpers.comment()).moderate_all([rule('first'), rule('second')])
+        self.assertEqual(action.call_count, 1, "Rules kept running after the item ran out of time")
+
+    def test_remaining(self):
+        self.assertIsNone(remaining())
+        with budgets.checking(None):
+            self.assertLessEqual(remaining(), 0.01)
+            with budgets.checking(None):
+                pass
+            self.assertIsNotNone(remaining(), "Nested checks don't restore the deadline")
+        self.assertIsNone(remaining())
+        self.assertRaises(OverBudget, budgets.enforce, 'body', 0, None)
@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from better_auto_moderator.tracing import Tracer, load_spans, summarize
+from better_auto_moderator.replay import ReplayClient
+from better_auto_moderator.snapshot import snapshot
+from better_auto_moderator.moderators.comment_moderator import CommentModerator
+from better_auto_moderator.config import parse_configs
+from tests.test_replay import recorded_comment
+
+class TracedClient(ReplayClient):
+    # Makes a traced "request" whenever a check asks for flair, like the real requestor does
+    def __init__(self, recordings, tracer):
+        super().__init__(recordings)
+        self.tracer = tracer
+
+    def post(self, url):
+        with self.tracer.request('POST', '/r/{subreddit}/api/flairselector'):
+            return super().post(url)
+
+class TracingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'traces.jsonl')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def trace(self, tracer, rules):
+        client = TracedClient([], tracer)
+        with patch('better_auto_moderator.moderators.moderator.tracer', tracer):
+            item = snapshot(recorded_comment('abcde', 'Hello, world!'), client)
+            with tracer.item(item, stream='comments'):
+                CommentModerator(item).moderate_all(rules)
+        if tracer.out is not None:
+            tracer.out.close()
+
+    def test_requests_are_attributed(self):
+        rules, config = parse_configs("""
+type: comment
+body: cheap
+action: remove
+---
+type: comment
+author:
+    flair_template_id: abc
+action: remove
+""", "")
+        self.trace(Tracer(self.path, sample_rate=1), rules)
+
+        spans = load_spans(self.path)
+        names = [span['name'] for span in spans]
+        self.assertEqual(names.count('item'), 1)
+        self.assertEqual(names.count('rule'), 2, "Each rule doesn't get a span")
+
+        requests = [span for span in spans if span['name'] == 'request']
+        self.assertEqual(len(requests), 1)
+        self.assertEqual(requests[0]['rule'], '1')
+        self.assertEqual(requests[0]['check'], 'flair_template_id', "Requests aren't tagged with the check that made them")
+
+        item = next(span for span in spans if span['name'] == 'item')
+        self.assertEqual(item['item'], 't1_abcde')
+        self.assertTrue(all(span['trace'] == item['trace'] for span in spans), "Spans from one item are split across traces")
+
+        summary = summarize(spans)
+        self.assertEqual(summary[0]['share'], 1.0)
+
+    def test_unsampled(self):
+        rules, config = parse_configs("type: comment\nbody: cheap\naction: remove", "")
+        self.trace(Tracer(self.path, sample_rate=0), rules)
+        self.assertFalse(os.path.exists(self.path), "Unsampled items are traced")
@@ -0,0 +1,65 @@
+import os
+import tempfile
+import unittest
+import praw
+from better_auto_moderator.reddit import reddit
+from better_auto_moderator.workqueue import WorkQueue, pack, unpack, partition, thread_of
+from better_auto_moderator.compact import CompactComment, CompactSubmission
+from better_auto_moderator.listing import listing_data
+
+# Listing data only. praw turns the author and subreddit names into (lazy) objects
+def comment(id, link_id, **fields):
+    data = {'id': id, 'name': 't1_%s' % id, 'link_id': link_id, 'body': 'Hello, world!', 'author': 'test_user',
+        'subreddit': 'BAMTest', 'user_reports': [['Spam', 1]], 'edited': False}
+    data.update(fields)
+    return praw.models.Comment(reddit, _data=data)
+
+def submission(id):
+    return praw.models.Submission(reddit, _data={'id': id, 'name': 't3_%s' % id, 'title': 'A Post', 'author': '[deleted]'})
+
+class WorkQueueTestCase(unittest.TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        self.queue = WorkQueue(self.path, partitions=4)
+
+    def tearDown(self):
+        self.queue.close()
+        for suffix in ['', '-wal', '-shm']:
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+
+    def test_pack(self):
+        item = unpack(pack(comment('c1', 't3_s1')), reddit)
+        self.assertIsInstance(item, CompactComment)
+        data = listing_data(item)
+        self.assertEqual(data['body'], 'Hello, world!')
+        self.assertEqual(data['user_reports'], [['Spam', 1]])
+        self.assertEqual(str(data['author']), 'test_user', "Authors aren't kept by name")
+        self.assertIsNone(listing_data(unpack(pack(submission('s1')), reddit))['author'], "Deleted authors come back")
+        self.assertIsInstance(unpack(pack(submission('s1')), reddit), CompactSubmission)
+
+    def test_partition(self):
+        self.assertEqual(thread_of({'name': 't3_s1'}), 't3_s1')
+        self.assertEqual(thread_of({'name': 't1_c1', 'link_id': 't3_s1'}), 't3_s1')
+        self.assertEqual(partition({'name': 't3_s1'}, 4), partition({'name': 't1_c1', 'link_id': 't3_s1'}, 4),
+            "Comments aren't evaluated alongside their submission")
+
+    def test_queue(self):
+        items = [comment('c%d' % i, 't3_s1') for i in range(5)] + [submission('s%d' % i) for i in range(20)]
+        self.queue.push('comments', items[:5])
+        self.queue.push('submissions', items[5:])
+        self.assertEqual(self.queue.depth(), 25)
+
+        thread = partition({'name': 't3_s1'}, 4)
+        rows = self.queue.peek(thread)
+        comments = [row for row in rows if row[1] == 'comments']
+        self.assertEqual([unpack(row[2], reddit).id for row in comments], ['c%d' % i for i in range(5)],
+            "Comments on a thread aren't kept in order")
+
+        # Nothing leaves the queue until it's acked
+        self.assertEqual(self.queue.peek(thread), rows)
+        self.queue.ack([row[0] for row in rows])
+        self.assertEqual(self.queue.depth(thread), 0)
+        self.assertEqual(self.queue.depth(), 25 - len(rows))
+        self.assertEqual(sum(len(self.queue.peek(index)) for index in range(4)), 25 - len(rows), "Items went missing")